@@ -1,8 +1,14 @@
 import os
-import tempfile
-import threading
+import json
+import asyncio
+import base64
+import logging
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from flask import Flask, request, abort
+from flask import Flask, request, abort, jsonify
 from dotenv import load_dotenv
 from openai import OpenAI
 from notion_client import Client
@@ -24,9 +30,31 @@ from linebot.v3.webhooks import (
     ImageMessageContent
 )
 
-# 載入 .env 檔案
+# 載入 .env 檔案（需在匯入會讀取環境變數的模組之前）
 load_dotenv()
 
+import audio
+import cache
+import chunking
+import cpu_pool
+import metrics
+import http_client
+import images
+import scrapers
+import transcription
+import webhook_intake
+from dispatcher import JobDispatcher, parse_pool_workers
+from job_store import JobStore
+from async_runner import AsyncJobRunner
+from batcher import AggregationWindow
+import notion_schema
+import notion_writer
+
+logging.basicConfig(level=logging.INFO)
+
+# CPU 工作 process pool（CPU_POOL_WORKERS > 0 時）：worker 以 fork 建立，必須在建立任何 thread 之前啟動
+cpu_pool.start()
+
 app = Flask(__name__)
 
 # 從環境變數取得設定
@@ -40,8 +68,50 @@ NOTION_IMAGE_DATABASE_ID = os.getenv('NOTION_IMAGE_DATABASE_ID')
 GOOGLE_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json')
 GOOGLE_TOKEN_PATH = os.getenv('GOOGLE_TOKEN_PATH', 'token.json')
 GOOGLE_DRIVE_FOLDER_ID = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
+# Google Drive 保存原始圖片（false 時改存送給 Vision 的縮小版本）
+DRIVE_UPLOAD_ORIGINAL = os.getenv('DRIVE_UPLOAD_ORIGINAL', 'true').lower() == 'true'
 APIFY_API_KEY = os.getenv('APIFY_API_KEY')
 
+# 背景工作 pool 設定（各類型的 worker 數量、佇列長度、滿載時的處理策略）
+DEFAULT_POOL_WORKERS = {'audio': 2, 'image': 2, 'web': 4, 'social': 2, 'text': 4}
+JOB_POOL_WORKERS = parse_pool_workers(os.getenv('JOB_POOL_WORKERS'), DEFAULT_POOL_WORKERS)
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 20))
+JOB_OVERFLOW_POLICY = os.getenv('JOB_OVERFLOW_POLICY', 'reject')
+JOB_MAX_DEFERRED = int(os.getenv('JOB_MAX_DEFERRED', 200))
+# 背景工作執行模式：threads（worker pool）或 asyncio（單一 event loop + 非同步 client）
+EXECUTION_MODE = os.getenv('EXECUTION_MODE', 'threads')
+DEFAULT_ASYNC_CONCURRENCY = {'audio': 20, 'image': 20, 'web': 50, 'social': 20, 'text': 50}
+ASYNC_CONCURRENCY = parse_pool_workers(os.getenv('ASYNC_CONCURRENCY'), DEFAULT_ASYNC_CONCURRENCY)
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', 'jobs.db')
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+# OpenAI 結果快取設定（相同內容或相同圖片直接使用先前的結果）
+OPENAI_CACHE_PATH = os.getenv('OPENAI_CACHE_PATH', '')  # SQLite 檔案路徑，空白表示只使用記憶體
+OPENAI_CACHE_MAX_ENTRIES = int(os.getenv('OPENAI_CACHE_MAX_ENTRIES', 5000))
+OPENAI_CACHE_TTL = int(os.getenv('OPENAI_CACHE_TTL', 30 * 86400))
+
+CHAT_MODEL = "gpt-4o-mini"
+# 修改 prompt 或回應格式時調高版本，讓舊的快取結果失效
+PROMPT_VERSIONS = {'enrich': 1, 'chunk': 1, 'vision': 1}
+
+# 長文摘要設定：超過 SUMMARY_CHUNK_TOKENS 的內容先分段摘要再彙整，
+# 每個工作送出的分段內容總量不超過 SUMMARY_TOKEN_BUDGET
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', 6000))
+SUMMARY_TOKEN_BUDGET = int(os.getenv('SUMMARY_TOKEN_BUDGET', 60000))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv('SUMMARY_MAP_CONCURRENCY', 4))
+
+# 多張圖片（相簿）批次處理設定：同一組圖片在 IMAGE_BATCH_WINDOW 秒內沒有新圖片或收齊後一起處理，0 表示停用
+IMAGE_BATCH_WINDOW = float(os.getenv('IMAGE_BATCH_WINDOW', 3))
+IMAGE_BATCH_MAX = int(os.getenv('IMAGE_BATCH_MAX', 20))  # 每批最多圖片數
+IMAGE_BATCH_VISION_MAX = int(os.getenv('IMAGE_BATCH_VISION_MAX', 10))  # 單一 Vision 請求最多圖片數
+IMAGE_BATCH_CONCURRENCY = int(os.getenv('IMAGE_BATCH_CONCURRENCY', 4))  # 每批同時進行的下載、上傳與 Notion 寫入數
+
+BUSY_REPLY_TEXT = "⏳ 目前處理的訊息較多，請稍後再傳送一次。"
+# 處理完成但內容未儲存（抓取失敗、Notion 寫入失敗等，已通知使用者）時記錄在工作上的錯誤訊息
+JOB_NOT_SAVED_ERROR = '內容未儲存'
+# reply token 的有效秒數（LINE 約為 1 分鐘，保留時鐘誤差），超過時改用 push 回覆
+REPLY_TOKEN_WINDOW = float(os.getenv('REPLY_TOKEN_WINDOW', 50))
+
 if not CHANNEL_ACCESS_TOKEN or not CHANNEL_SECRET:
     raise ValueError('請設定 LINE_CHANNEL_ACCESS_TOKEN 和 LINE_CHANNEL_SECRET 環境變數')
 
@@ -60,482 +130,608 @@ if not NOTION_IMAGE_DATABASE_ID:
 if not APIFY_API_KEY:
     raise ValueError('請設定 APIFY_API_KEY 環境變數')
 
+if EXECUTION_MODE not in ('threads', 'asyncio'):
+    raise ValueError('EXECUTION_MODE 只能設定為 threads 或 asyncio')
+
 configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
+configuration.connection_pool_maxsize = http_client.HTTP_POOL_MAXSIZE
+# 整個程序共用同一個 LINE API client（內部的 urllib3 連線池會被重複使用）
+line_api_client = ApiClient(configuration)
+http_client.instrument_pool_manager(line_api_client.rest_client.pool_manager)
 handler = WebhookHandler(CHANNEL_SECRET)
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# 語音轉文字後端（TRANSCRIPTION_BACKEND：openai 或 local）
+transcriber = transcription.create_backend(transcription.TRANSCRIPTION_BACKEND, openai_client)
 notion_client = Client(auth=NOTION_API_KEY)
-
-
-def generate_tags(text):
-    """使用 OpenAI 根據筆記內容生成標籤"""
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "你是一個筆記分類助手。請根據使用者的筆記內容，生成 1-3 個簡短的中文標籤（例如：工作、學習、生活、想法、待辦等）。只回傳標籤，用逗號分隔，不要有其他說明文字。"
-                },
-                {
-                    "role": "user",
-                    "content": f"請為以下筆記生成標籤：\n\n{text}"
-                }
-            ],
-            temperature=0.3,
-            max_tokens=50
-        )
-        tags_text = response.choices[0].message.content.strip()
-        # 將逗號分隔的標籤轉換成列表
-        tags = [tag.strip() for tag in tags_text.split(',') if tag.strip()]
-        return tags
-    except Exception as e:
-        app.logger.error(f"生成標籤時發生錯誤: {str(e)}")
-        return ["未分類"]
-
-
-def save_to_notion(content, duration_seconds, tags):
-    """將語音筆記儲存到 Notion database"""
-    try:
-        # 從內容中擷取前 50 個字元作為標題
-        title = content[:50] + "..." if len(content) > 50 else content
-
-        # 建立 Notion page
-        notion_client.pages.create(
-            parent={"database_id": NOTION_DATABASE_ID},
-            properties={
-                "Name": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": title
-                            }
-                        }
-                    ]
-                },
-                "Content": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": content
-                            }
-                        }
-                    ]
-                },
-                "Created": {
-                    "date": {
-                        "start": datetime.now().isoformat()
-                    }
-                },
-                "Duration": {
-                    "number": duration_seconds
-                },
-                "Tags": {
-                    "multi_select": [{"name": tag} for tag in tags]
-                }
-            }
-        )
-        return True
-    except Exception as e:
-        app.logger.error(f"儲存到 Notion 時發生錯誤: {str(e)}")
-        return False
-
-
-def generate_summary_and_category(text):
-    """使用 OpenAI 生成文字摘要和內容分類"""
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """你是一個文字摘要助手。請分析使用者提供的文字，並回傳 JSON 格式的結果，包含：
-1. category: 內容類別（單一類別，例如：工作、學習、新聞、生活、想法、技術、商業等）
-2. summary: 重點摘要（濃縮成 2-3 句話，保留關鍵資訊）
+# 所有 Notion 寫入共用的佇列（速率限制與重試），兩種執行模式共用
+notion_queue = notion_writer.NotionWriter(notion_writer.create_client(NOTION_API_KEY))
+# 各 database 的欄位與選項快取（寫入前在本地檢查屬性）
+notion_schemas = notion_schema.SchemaCache(notion_client)
+if EXECUTION_MODE == 'threads':
+    dispatcher = JobDispatcher(
+        JOB_POOL_WORKERS,
+        JOB_QUEUE_SIZE,
+        overflow_policy=JOB_OVERFLOW_POLICY,
+        max_deferred=JOB_MAX_DEFERRED
+    )
+else:
+    dispatcher = None
+job_store = JobStore(JOB_STORE_PATH, max_attempts=JOB_MAX_ATTEMPTS)
+metrics.register_gauge('jobs', job_store.stats)
+metrics.register_gauge('http', http_client.stats)
+metrics.register_gauge('url_cache', scrapers.url_cache.stats)
+metrics.register_gauge('notion_writer', notion_queue.stats)
+metrics.register_gauge('notion_schema', notion_schemas.stats)
+metrics.register_gauge('transcription', transcriber.stats)
+metrics.register_gauge('cpu_pool', cpu_pool.stats)
+openai_cache = cache.TTLCache(
+    'openai',
+    max_entries=OPENAI_CACHE_MAX_ENTRIES,
+    default_ttl=OPENAI_CACHE_TTL,
+    path=OPENAI_CACHE_PATH or None
+)
+metrics.register_gauge('openai_cache', openai_cache.stats)
+if EXECUTION_MODE == 'threads':
+    # 長文分段摘要共用的 thread pool（限制整個程序同時進行的分段摘要請求數）
+    summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_MAP_CONCURRENCY, thread_name_prefix='summary-map')
+    # 圖片工作與 Vision 分析同時進行的 Google Drive 上傳與權限設定（每個圖片工作同時最多一個）
+    drive_executor = ThreadPoolExecutor(max_workers=JOB_POOL_WORKERS.get('image', 2), thread_name_prefix='drive')
+    # 批次圖片工作的下載、Drive 上傳與 Notion 寫入
+    image_batch_executor = ThreadPoolExecutor(max_workers=IMAGE_BATCH_CONCURRENCY, thread_name_prefix='image-batch')
+    # 長錄音各段的轉錄（限制整個程序同時進行的分段轉錄請求數）
+    audio_segment_executor = ThreadPoolExecutor(
+        max_workers=audio.AUDIO_SEGMENT_CONCURRENCY, thread_name_prefix='audio-segment'
+    )
+else:
+    summary_executor = None
+    drive_executor = None
+    image_batch_executor = None
+    audio_segment_executor = None
+
+
+def openai_cache_key(task, payload):
+    """OpenAI 結果的快取鍵：工作類型 + 模型 + prompt 版本 + 正規化後的內容（文字或圖片 bytes）"""
+    if not isinstance(payload, bytes):
+        # 統一 Unicode 形式並合併空白，排版不同但內容相同的文字視為相同
+        payload = ' '.join(unicodedata.normalize('NFC', payload).split())
+    return cache.content_key(task, CHAT_MODEL, PROMPT_VERSIONS[task], payload)
+
+
+def _cache_lookup(task, key):
+    cached = openai_cache.get(key)
+    metrics.incr(f"openai.{task}.cache_{'miss' if cached is None else 'hit'}")
+    return cached
+
+
+def cached_openai_call(task, payload, call):
+    """
+    以內容雜湊快取 OpenAI 結果，未命中時才呼叫 call()
+    call() 發生例外時不寫入快取，交由呼叫端處理
+    """
+    key = openai_cache_key(task, payload)
+    cached = _cache_lookup(task, key)
+    if cached is not None:
+        return cached
+
+    result = call()
+    openai_cache.set(key, result)
+    return result
+
+
+async def cached_openai_call_async(task, payload, call):
+    """cached_openai_call 的非同步版本（雜湊計算與快取讀寫交給 thread），call 為 coroutine function"""
+    key = await asyncio.to_thread(openai_cache_key, task, payload)
+    cached = await asyncio.to_thread(_cache_lookup, task, key)
+    if cached is not None:
+        return cached
+
+    result = await call()
+    await asyncio.to_thread(openai_cache.set, key, result)
+    return result
+
+
+# 摘要、分類與標籤以單一 structured output 請求生成，所有流程共用相同格式
+ENRICH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "note_enrichment",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "category": {"type": "string"},
+                "tags": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["summary", "category", "tags"],
+            "additionalProperties": False
+        }
+    }
+}
+
+
+def build_enrich_request(text):
+    """建立生成摘要、分類和標籤的 OpenAI 請求參數"""
+    return {
+        'model': CHAT_MODEL,
+        'messages': [
+            {
+                "role": "system",
+                "content": """你是一個筆記整理助手。請分析使用者提供的文字，並回傳 JSON 格式的結果，包含：
+1. summary: 重點摘要（濃縮成 2-3 句話，保留關鍵資訊）
+2. category: 內容類別（單一類別，例如：工作、學習、新聞、生活、想法、技術、商業等）
+3. tags: 1-3 個簡短的中文標籤（例如：工作、學習、生活、想法、待辦等）
 
 請只回傳 JSON，不要有其他文字。"""
-                },
-                {
-                    "role": "user",
-                    "content": f"請分析以下文字：\n\n{text}"
-                }
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
+            },
+            {
+                "role": "user",
+                "content": f"請分析以下文字：\n\n{text}"
+            }
+        ],
+        'temperature': 0.3,
+        'response_format': ENRICH_RESPONSE_FORMAT
+    }
+
+
+def parse_enrich_response(response):
+    """解析生成摘要、分類和標籤的 OpenAI 回應，返回 (summary, category, tags)"""
+    result = json.loads(response.choices[0].message.content)
+    summary = result.get('summary', '')
+    category = result.get('category') or '未分類'
+    tags = result.get('tags') or []
+
+    # 確保 tags 是列表，並移除空白與重複的標籤
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    tags = list(dict.fromkeys(tag.strip() for tag in tags if tag and tag.strip()))
+
+    return summary, category, tags or ['未分類']
+
+
+def fallback_enrichment(text):
+    """摘要生成失敗時使用的簡單摘要"""
+    simple_summary = text[:200] + "..." if len(text) > 200 else text
+    return simple_summary, "未分類", ["未分類"]
+
+
+def build_chunk_summary_request(chunk, index, total):
+    """建立長文分段摘要的 OpenAI 請求參數"""
+    return {
+        'model': CHAT_MODEL,
+        'messages': [
+            {
+                "role": "system",
+                "content": "你是一個文字摘要助手。使用者會提供一篇長文中的其中一段，請用 3-5 句話摘要這一段的重點，保留關鍵事實、數字與結論。只回傳摘要內容，不要有其他說明文字。"
+            },
+            {
+                "role": "user",
+                "content": f"以下是長文的第 {index}/{total} 段：\n\n{chunk}"
+            }
+        ],
+        'temperature': 0.3,
+        'max_tokens': 400
+    }
 
-        import json
-        result = json.loads(response.choices[0].message.content)
-        return result.get('summary', ''), result.get('category', '未分類')
-    except Exception as e:
-        app.logger.error(f"生成摘要時發生錯誤: {str(e)}")
-        # 如果失敗，返回簡單的摘要
-        simple_summary = text[:200] + "..." if len(text) > 200 else text
-        return simple_summary, "未分類"
 
+def prepare_chunks(text):
+    """
+    判斷是否需要分段摘要
 
-def analyze_image_with_vision(image_bytes):
-    """使用 OpenAI Vision API 分析圖片內容"""
-    try:
-        import base64
-        import json
+    Returns:
+        list: 需要分段時返回預算內的區塊文字，內容不長時返回 None
+    """
+    if chunking.count_tokens(text) <= SUMMARY_CHUNK_TOKENS:
+        return None
 
-        # 將圖片編碼為 base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+    chunks, truncated = chunking.within_budget(
+        chunking.split_text(text, SUMMARY_CHUNK_TOKENS),
+        SUMMARY_TOKEN_BUDGET
+    )
+    metrics.incr('summary.chunked')
+    metrics.incr('summary.chunks', len(chunks))
+    if truncated:
+        metrics.incr('summary.budget_truncated')
+        app.logger.warning(f"內容超過摘要 token 預算（{SUMMARY_TOKEN_BUDGET}），只摘要前 {len(chunks)} 段")
+    return [chunk for chunk, _ in chunks]
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """你是一個圖片分析助手。請分析圖片並回傳 JSON 格式：
-1. description: 圖片的詳細描述（2-3 句話，描述主要內容、場景、物體等）
-2. tags: 內容標籤（3-5 個中文標籤，例如：風景、食物、人物、工作、生活等）
 
-請只回傳 JSON，不要有其他文字。"""
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": "請分析這張圖片"
-                        }
-                    ]
-                }
-            ],
-            temperature=0.3,
-            max_tokens=500,
-            response_format={"type": "json_object"}
-        )
+def combine_chunk_summaries(summaries):
+    """將各段摘要依原文順序組成彙整（reduce）用的文字，失敗的段落略過"""
+    parts = [f"[第 {index} 段] {summary}" for index, summary in enumerate(summaries, 1) if summary]
+    if not parts:
+        raise Exception("所有分段摘要都失敗")
+    return "以下是一篇長文依序分段的摘要：\n\n" + '\n\n'.join(parts)
 
-        result = json.loads(response.choices[0].message.content)
-        description = result.get('description', '圖片內容')
-        tags = result.get('tags', ['未分類'])
 
-        # 確保 tags 是列表
-        if isinstance(tags, str):
-            tags = [tags]
+def summarize_chunk(chunk, index, total):
+    """摘要長文的其中一段，失敗時返回 None"""
+    def call():
+        response = openai_client.chat.completions.create(**build_chunk_summary_request(chunk, index, total))
+        return response.choices[0].message.content.strip()
 
-        return description, tags
+    try:
+        return cached_openai_call('chunk', chunk, call)
     except Exception as e:
-        app.logger.error(f"分析圖片時發生錯誤: {str(e)}")
-        return "圖片內容", ["未分類"]
-
-
-def extract_url_from_text(text):
-    """從文字中提取第一個 URL"""
-    import re
-    from urllib.parse import urlparse
-
-    # 正則表達式匹配 HTTP/HTTPS URL
-    url_pattern = r'https?://[^\s]+'
-    urls = re.findall(url_pattern, text)
-
-    if not urls:
+        app.logger.error(f"摘要第 {index}/{total} 段時發生錯誤: {str(e)}")
         return None
 
-    # 驗證第一個 URL 格式
-    first_url = urls[0]
-    try:
-        result = urlparse(first_url)
-        if result.scheme and result.netloc:
-            return first_url
-    except:
-        pass
-
-    return None
-
-
-def is_facebook_url(url):
-    """檢測 URL 是否為 Facebook 連結"""
-    from urllib.parse import urlparse
-
-    try:
-        parsed = urlparse(url)
-        # 檢查域名是否為 Facebook 相關
-        facebook_domains = ['facebook.com', 'fb.com', 'm.facebook.com', 'www.facebook.com']
-        return any(domain in parsed.netloc.lower() for domain in facebook_domains)
-    except:
-        return False
-
-
-def is_instagram_url(url):
-    """檢測 URL 是否為 Instagram 連結"""
-    from urllib.parse import urlparse
-
-    try:
-        parsed = urlparse(url)
-        # 檢查域名是否為 Instagram 相關
-        instagram_domains = ['instagram.com', 'www.instagram.com', 'instagr.am']
-        return any(domain in parsed.netloc.lower() for domain in instagram_domains)
-    except:
-        return False
 
+def enrich_text(text):
+    """
+    使用 OpenAI 生成摘要、內容分類和標籤，返回 (summary, category, tags)
+    內容不長時以單一請求處理；長文先平行摘要各段（map），再以各段摘要生成最終結果（reduce）
+    """
+    def call(source_text):
+        response = openai_client.chat.completions.create(**build_enrich_request(source_text))
+        return parse_enrich_response(response)
 
-def scrape_instagram_content(url):
-    """使用 Apify API 爬取 Instagram 貼文內容"""
     try:
-        import requests
-        import time
-
-        # Apify API endpoint for Instagram scraper
-        # 使用 Apify 的 Instagram Scraper（更通用穩定）
-        apify_actor_id = "apify~instagram-scraper"
-
-        # 啟動 Actor
-        run_url = f"https://api.apify.com/v2/acts/{apify_actor_id}/runs?token={APIFY_API_KEY}"
-
-        # Actor input configuration
-        run_input = {
-            "directUrls": [url],
-            "resultsType": "posts",
-            "resultsLimit": 1,
-            "searchLimit": 1,
-            "addParentData": False
-        }
-
-        # 發送請求啟動 Actor
-        response = requests.post(run_url, json=run_input)
-        response.raise_for_status()
-
-        run_data = response.json()
-        run_id = run_data['data']['id']
-
-        # 等待 Actor 執行完成（最多等待 60 秒）
-        max_wait_time = 60
-        wait_interval = 2
-        elapsed_time = 0
-
-        while elapsed_time < max_wait_time:
-            # 檢查執行狀態
-            status_url = f"https://api.apify.com/v2/actor-runs/{run_id}?token={APIFY_API_KEY}"
-            status_response = requests.get(status_url)
-            status_data = status_response.json()
+        chunks = prepare_chunks(text)
+        if chunks is None:
+            return tuple(cached_openai_call('enrich', text, lambda: call(text)))
+
+        total = len(chunks)
+        with metrics.timer('summary.map'):
+            summaries = list(summary_executor.map(
+                summarize_chunk, chunks, range(1, total + 1), [total] * total
+            ))
+        combined = combine_chunk_summaries(summaries)
+        with metrics.timer('summary.reduce'):
+            return tuple(cached_openai_call('enrich', combined, lambda: call(combined)))
+    except Exception as e:
+        app.logger.error(f"生成摘要時發生錯誤: {str(e)}")
+        # 如果失敗，返回簡單的摘要
+        return fallback_enrichment(text)
 
-            status = status_data['data']['status']
 
-            if status == 'SUCCEEDED':
-                # 獲取結果
-                dataset_id = status_data['data']['defaultDatasetId']
-                results_url = f"https://api.apify.com/v2/datasets/{dataset_id}/items?token={APIFY_API_KEY}"
+NOTION_DATABASE_IDS = (NOTION_DATABASE_ID, NOTION_SUMMARY_DATABASE_ID, NOTION_IMAGE_DATABASE_ID)
 
-                results_response = requests.get(results_url)
-                results = results_response.json()
+# 各 database 的選用欄位：只有 database 中存在同名且同類型的欄位時才會寫入
+VOICE_OPTIONAL_PROPERTIES = ('Summary', 'Category')
+SUMMARY_OPTIONAL_PROPERTIES = ('Tags',)
 
-                if results and len(results) > 0:
-                    post = results[0]
+def create_notion_page(database_id, properties, optional=(), children=None):
+    """
+    依 database 結構檢查屬性（移除不存在的欄位、正規化標籤）後排入 Notion 寫入佇列
 
-                    # 提取 Instagram 貼文的主要內容
-                    text_parts = []
+    database 有 NOTION_REQUEST_ID_PROPERTY 欄位時一併寫入 request ID，
+    寫入佇列遇到可能已寫入的錯誤時以此查詢，確認尚未建立才重試
 
-                    # 嘗試不同的欄位名稱（不同 scraper 可能使用不同名稱）
-                    caption = post.get('caption') or post.get('text') or post.get('description')
-                    if caption:
-                        text_parts.append(f"貼文內容：\n{caption}")
+    Returns:
+        Future: 寫入完成（含內文 blocks）後完成
+    """
+    properties = {
+        **properties,
+        notion_writer.NOTION_REQUEST_ID_PROPERTY: {"rich_text": notion_writer.rich_text(uuid.uuid4().hex)}
+    }
+    return notion_queue.create_page(
+        database_id,
+        notion_schemas.prepare(database_id, properties, (*optional, notion_writer.NOTION_REQUEST_ID_PROPERTY)),
+        children,
+        parent=notion_schemas.parent(database_id)
+    )
+
+
+def build_voice_note_properties(content, duration_seconds, tags, summary=None, category=None):
+    """建立語音筆記 database 的 Notion page 屬性（Summary、Category 為選用欄位）"""
+    # 從內容中擷取前 50 個字元作為標題
+    title = content[:50] + "..." if len(content) > 50 else content
+
+    properties = {
+        "Name": {
+            "title": [
+                {
+                    "text": {
+                        "content": title
+                    }
+                }
+            ]
+        },
+        "Content": {
+            # 超過 NOTION_PROPERTY_MAX_CHARS 的內容截斷，完整內容另存到 page 內文
+            "rich_text": notion_writer.rich_text(content, notion_writer.NOTION_PROPERTY_MAX_CHARS)
+        },
+        "Created": {
+            "date": {
+                "start": datetime.now().isoformat()
+            }
+        },
+        "Duration": {
+            "number": duration_seconds
+        },
+        "Tags": {
+            "multi_select": [{"name": tag} for tag in tags]
+        }
+    }
+    if summary:
+        properties["Summary"] = {
+            "rich_text": notion_writer.rich_text(summary)
+        }
+    if category:
+        properties["Category"] = {
+            "multi_select": [
+                {
+                    "name": category
+                }
+            ]
+        }
+    return properties
 
-                    post_url = post.get('url') or post.get('postUrl') or post.get('displayUrl')
-                    if post_url:
-                        text_parts.append(f"\n原始連結：{post_url}")
 
-                    # 其他可能的欄位
-                    likes = post.get('likesCount') or post.get('likes')
-                    if likes:
-                        text_parts.append(f"\n按讚數：{likes}")
+def save_to_notion(content, duration_seconds, tags, summary=None, category=None):
+    """將語音筆記儲存到 Notion database"""
+    try:
+        properties = build_voice_note_properties(content, duration_seconds, tags, summary, category)
+        # 建立 Notion page（經由寫入佇列，遇到速率限制或暫時性錯誤會自動重試），長逐字稿完整存到內文
+        create_notion_page(
+            NOTION_DATABASE_ID,
+            properties,
+            VOICE_OPTIONAL_PROPERTIES,
+            notion_writer.overflow_blocks(content)
+        ).result()
+        return True
+    except Exception as e:
+        app.logger.error(f"儲存到 Notion 時發生錯誤: {str(e)}")
+        return False
 
-                    comments = post.get('commentsCount') or post.get('comments')
-                    if comments:
-                        text_parts.append(f"留言數：{comments}")
 
-                    owner = post.get('ownerUsername') or post.get('username') or post.get('owner')
-                    if owner:
-                        text_parts.append(f"發布者：@{owner}")
+def build_vision_request(image_bytes, mime_type='image/jpeg'):
+    """建立圖片分析的 OpenAI Vision 請求參數"""
+    # 將圖片編碼為 base64
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
 
-                    content = '\n'.join(text_parts) if text_parts else str(post)
+    return {
+        'model': CHAT_MODEL,
+        'messages': [
+            {
+                "role": "system",
+                "content": """你是一個圖片分析助手。請分析圖片並回傳 JSON 格式：
+1. description: 圖片的詳細描述（2-3 句話，描述主要內容、場景、物體等）
+2. tags: 內容標籤（3-5 個中文標籤，例如：風景、食物、人物、工作、生活等）
 
-                    # 限制長度
-                    if len(content) > 10000:
-                        content = content[:10000] + "\n\n[內容過長，已截斷...]"
+請只回傳 JSON，不要有其他文字。"""
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{mime_type};base64,{base64_image}",
+                            "detail": images.VISION_IMAGE_DETAIL
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": "請分析這張圖片"
+                    }
+                ]
+            }
+        ],
+        'temperature': 0.3,
+        'max_tokens': 500,
+        'response_format': {"type": "json_object"}
+    }
 
-                    return content
-                else:
-                    app.logger.error("Apify 未返回 Instagram 結果")
-                    return None
 
-            elif status in ['FAILED', 'ABORTED', 'TIMED-OUT']:
-                app.logger.error(f"Apify Actor 執行失敗，狀態：{status}")
-                return None
+def parse_vision_response(response):
+    """解析圖片分析的 OpenAI 回應，返回 (description, tags)"""
+    result = json.loads(response.choices[0].message.content)
+    description = result.get('description', '圖片內容')
+    tags = result.get('tags', ['未分類'])
 
-            # 繼續等待
-            time.sleep(wait_interval)
-            elapsed_time += wait_interval
+    # 確保 tags 是列表
+    if isinstance(tags, str):
+        tags = [tags]
 
-        # 超時
-        app.logger.error("等待 Apify Actor 執行超時")
-        return None
+    return description, tags
 
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"Apify API 請求錯誤: {str(e)}")
-        return None
-    except Exception as e:
-        app.logger.error(f"爬取 Instagram 內容時發生錯誤: {str(e)}")
-        return None
 
+def analyze_image_with_vision(image_bytes, mime_type='image/jpeg'):
+    """使用 OpenAI Vision API 分析圖片內容"""
+    def call():
+        response = openai_client.chat.completions.create(**build_vision_request(image_bytes, mime_type))
+        return parse_vision_response(response)
 
-def scrape_facebook_content(url):
-    """使用 Apify API 爬取 Facebook 貼文內容"""
     try:
-        import requests
-        import time
-
-        # Apify API endpoint for Facebook scraper
-        # 使用 Apify 的 Facebook Posts Scraper（注意：API 使用 ~ 而不是 /）
-        apify_actor_id = "apify~facebook-posts-scraper"
+        return tuple(cached_openai_call('vision', image_bytes, call))
+    except Exception as e:
+        app.logger.error(f"分析圖片時發生錯誤: {str(e)}")
+        return "圖片內容", ["未分類"]
 
-        # 啟動 Actor
-        run_url = f"https://api.apify.com/v2/acts/{apify_actor_id}/runs?token={APIFY_API_KEY}"
 
-        # Actor input configuration
-        run_input = {
-            "startUrls": [{"url": url}],
-            "maxPosts": 1,
-            "resultsLimit": 1
+# 多張圖片一次分析的回應格式：依圖片順序返回每張圖片的描述與標籤
+VISION_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "image_batch_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "images": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "description": {"type": "string"},
+                            "tags": {"type": "array", "items": {"type": "string"}}
+                        },
+                        "required": ["description", "tags"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["images"],
+            "additionalProperties": False
         }
+    }
+}
+
+
+def build_vision_batch_request(prepared_images):
+    """建立多張圖片一次分析的 OpenAI Vision 請求參數"""
+    content = []
+    for index, prepared in enumerate(prepared_images, start=1):
+        base64_image = base64.b64encode(prepared.vision_bytes).decode('utf-8')
+        content.append({"type": "text", "text": f"圖片 {index}"})
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{prepared.vision_mime_type};base64,{base64_image}",
+                "detail": images.VISION_IMAGE_DETAIL
+            }
+        })
+    content.append({"type": "text", "text": f"請依序分析這 {len(prepared_images)} 張圖片"})
+
+    return {
+        'model': CHAT_MODEL,
+        'messages': [
+            {
+                "role": "system",
+                "content": """你是一個圖片分析助手。使用者會依序傳送多張圖片，請分別分析每一張，並依圖片順序回傳 images 陣列，每個元素包含：
+1. description: 該圖片的詳細描述（2-3 句話，描述主要內容、場景、物體等）
+2. tags: 內容標籤（3-5 個中文標籤，例如：風景、食物、人物、工作、生活等）
 
-        # 發送請求啟動 Actor
-        response = requests.post(run_url, json=run_input)
-        response.raise_for_status()
-
-        run_data = response.json()
-        run_id = run_data['data']['id']
-
-        # 等待 Actor 執行完成（最多等待 60 秒）
-        max_wait_time = 60
-        wait_interval = 2
-        elapsed_time = 0
-
-        while elapsed_time < max_wait_time:
-            # 檢查執行狀態
-            status_url = f"https://api.apify.com/v2/actor-runs/{run_id}?token={APIFY_API_KEY}"
-            status_response = requests.get(status_url)
-            status_data = status_response.json()
-
-            status = status_data['data']['status']
-
-            if status == 'SUCCEEDED':
-                # 獲取結果
-                dataset_id = status_data['data']['defaultDatasetId']
-                results_url = f"https://api.apify.com/v2/datasets/{dataset_id}/items?token={APIFY_API_KEY}"
-
-                results_response = requests.get(results_url)
-                results = results_response.json()
-
-                if results and len(results) > 0:
-                    post = results[0]
+陣列長度必須與圖片數量相同。"""
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        'temperature': 0.3,
+        'max_tokens': 300 * len(prepared_images) + 100,
+        'response_format': VISION_BATCH_RESPONSE_FORMAT
+    }
 
-                    # 提取 Facebook 貼文的主要內容
-                    text_parts = []
 
-                    if 'text' in post and post['text']:
-                        text_parts.append(f"貼文內容：\n{post['text']}")
+def parse_vision_batch_response(response, count):
+    """解析多張圖片分析的回應，返回 [(description, tags), ...]；數量不符時拋出 ValueError"""
+    results = json.loads(response.choices[0].message.content).get('images', [])
+    if len(results) != count:
+        raise ValueError(f"Vision 回傳 {len(results)} 筆結果，預期 {count} 筆")
+    return [
+        (result.get('description') or '圖片內容', result.get('tags') or ['未分類'])
+        for result in results
+    ]
 
-                    if 'url' in post:
-                        text_parts.append(f"\n原始連結：{post['url']}")
 
-                    # 其他可能的欄位
-                    if 'likes' in post:
-                        text_parts.append(f"\n按讚數：{post['likes']}")
+def vision_batch_groups(prepared_images):
+    """
+    查詢單張圖片的快取，將未命中的圖片依 IMAGE_BATCH_VISION_MAX 分組
 
-                    if 'comments' in post:
-                        text_parts.append(f"留言數：{post['comments']}")
+    Returns:
+        tuple: (各圖片的快取鍵, 各圖片的結果（未命中為 None）, 未命中圖片索引的分組)
+    """
+    keys = [openai_cache_key('vision', prepared.vision_bytes) for prepared in prepared_images]
+    results = [_cache_lookup('vision', key) for key in keys]
+    missing = [index for index, result in enumerate(results) if result is None]
+    groups = [missing[start:start + IMAGE_BATCH_VISION_MAX] for start in range(0, len(missing), IMAGE_BATCH_VISION_MAX)]
+    return keys, results, groups
 
-                    if 'shares' in post:
-                        text_parts.append(f"分享數：{post['shares']}")
 
-                    content = '\n'.join(text_parts)
+def analyze_images_with_vision(prepared_images):
+    """
+    以單一 Vision 請求分析多張圖片（每個請求最多 IMAGE_BATCH_VISION_MAX 張）
 
-                    # 限制長度
-                    if len(content) > 10000:
-                        content = content[:10000] + "\n\n[內容過長，已截斷...]"
+    結果寫入單張圖片的快取，之後單獨傳送同一張圖片時直接使用；
+    批次請求失敗或結果數量不符時，改為逐張分析
 
-                    return content
-                else:
-                    app.logger.error("Apify 未返回結果")
-                    return None
+    Returns:
+        list: [(description, tags), ...]，順序與 prepared_images 相同
+    """
+    keys, results, groups = vision_batch_groups(prepared_images)
+    for group in groups:
+        try:
+            response = openai_client.chat.completions.create(
+                **build_vision_batch_request([prepared_images[index] for index in group])
+            )
+            for index, result in zip(group, parse_vision_batch_response(response, len(group)), strict=True):
+                results[index] = result
+                openai_cache.set(keys[index], result)
+            metrics.incr('openai.vision.batch_requests')
+        except Exception as e:
+            app.logger.warning(f"批次分析圖片失敗，改為逐張分析: {str(e)}")
+            for index in group:
+                prepared = prepared_images[index]
+                results[index] = analyze_image_with_vision(prepared.vision_bytes, prepared.vision_mime_type)
+    return [tuple(result) for result in results]
 
-            elif status in ['FAILED', 'ABORTED', 'TIMED-OUT']:
-                app.logger.error(f"Apify Actor 執行失敗，狀態：{status}")
-                return None
 
-            # 繼續等待
-            time.sleep(wait_interval)
-            elapsed_time += wait_interval
+def extract_url_from_text(text):
+    """從文字中提取第一個 URL"""
+    import re
+    from urllib.parse import urlparse
 
-        # 超時
-        app.logger.error("等待 Apify Actor 執行超時")
-        return None
+    # 正則表達式匹配 HTTP/HTTPS URL
+    url_pattern = r'https?://[^\s]+'
+    urls = re.findall(url_pattern, text)
 
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"Apify API 請求錯誤: {str(e)}")
-        return None
-    except Exception as e:
-        app.logger.error(f"爬取 Facebook 內容時發生錯誤: {str(e)}")
+    if not urls:
         return None
 
-
-def scrape_web_content(url):
-    """從 URL 抓取網頁內容並提取純文字"""
+    # 驗證第一個 URL 格式
+    first_url = urls[0]
     try:
-        import requests
-        from bs4 import BeautifulSoup
-
-        # 設定 User-Agent 避免被封鎖
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        # 發送請求（30 秒超時）
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding
-
-        # 解析 HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # 移除不需要的元素
-        for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form']):
-            element.decompose()
-
-        # 提取純文字
-        text = soup.get_text(separator='\n', strip=True)
+        result = urlparse(first_url)
+        if result.scheme and result.netloc:
+            return first_url
+    except:
+        pass
 
-        # 清理空白行
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        cleaned_text = '\n'.join(lines)
+    return None
 
-        # 限制長度（避免超過 OpenAI token 限制）
-        if len(cleaned_text) > 10000:
-            cleaned_text = cleaned_text[:10000] + "\n\n[內容過長，已截斷...]"
 
-        return cleaned_text
+def build_summary_properties(content, summary, category, source_type, tags=None):
+    """建立摘要 database 的 Notion page 屬性（Tags 為選用欄位）"""
+    # 從摘要中擷取前 50 個字元作為標題
+    title = summary[:50] + "..." if len(summary) > 50 else summary
 
-    except requests.exceptions.Timeout:
-        app.logger.error(f"抓取 URL 超時: {url}")
-        return None
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"抓取 URL 時發生錯誤: {str(e)}")
-        return None
-    except Exception as e:
-        app.logger.error(f"解析網頁內容時發生錯誤: {str(e)}")
-        return None
+    properties = {
+        "Name": {
+            "title": [
+                {
+                    "text": {
+                        "content": title
+                    }
+                }
+            ]
+        },
+        "Content": {
+            # 超過 NOTION_PROPERTY_MAX_CHARS 的內容截斷，完整內容另存到 page 內文
+            "rich_text": notion_writer.rich_text(content, notion_writer.NOTION_PROPERTY_MAX_CHARS)
+        },
+        "Category": {
+            "multi_select": [
+                {
+                    "name": category
+                }
+            ]
+        },
+        "Source": {
+            "select": {
+                "name": source_type
+            }
+        },
+        "Summary": {
+            "rich_text": notion_writer.rich_text(summary)
+        },
+        "Created": {
+            "date": {
+                "start": datetime.now().isoformat()
+            }
+        }
+    }
+    if tags:
+        properties["Tags"] = {
+            "multi_select": [{"name": tag} for tag in tags]
+        }
+    return properties
 
 
-def save_summary_to_notion(content, summary, category, source_type="文字"):
+def save_summary_to_notion(content, summary, category, source_type="文字", tags=None):
     """將文字摘要儲存到 Notion summary database
 
     Args:
@@ -543,104 +739,59 @@ def save_summary_to_notion(content, summary, category, source_type="文字"):
         summary: AI 生成的摘要
         category: 內容分類（工作、學習、新聞等）
         source_type: 來源類型（社群、網頁、文字）
+        tags: AI 生成的標籤（database 有 Tags 欄位時才會寫入）
     """
     try:
-        # 從摘要中擷取前 50 個字元作為標題
-        title = summary[:50] + "..." if len(summary) > 50 else summary
-
-        # 建立 Notion page
-        notion_client.pages.create(
-            parent={"database_id": NOTION_SUMMARY_DATABASE_ID},
-            properties={
-                "Name": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": title
-                            }
-                        }
-                    ]
-                },
-                "Content": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": content
-                            }
-                        }
-                    ]
-                },
-                "Category": {
-                    "multi_select": [
-                        {
-                            "name": category
-                        }
-                    ]
-                },
-                "Source": {
-                    "select": {
-                        "name": source_type
-                    }
-                },
-                "Summary": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": summary
-                            }
-                        }
-                    ]
-                },
-                "Created": {
-                    "date": {
-                        "start": datetime.now().isoformat()
-                    }
-                }
-            }
-        )
+        properties = build_summary_properties(content, summary, category, source_type, tags)
+        # 建立 Notion page（經由寫入佇列），長文完整存到內文
+        create_notion_page(
+            NOTION_SUMMARY_DATABASE_ID,
+            properties,
+            SUMMARY_OPTIONAL_PROPERTIES,
+            notion_writer.overflow_blocks(content)
+        ).result()
         return True
     except Exception as e:
         app.logger.error(f"儲存摘要到 Notion 時發生錯誤: {str(e)}")
         return False
 
 
-def save_image_to_notion(title, description, tags, drive_link):
-    """將圖片資訊儲存到 Notion image database"""
-    try:
-        notion_client.pages.create(
-            parent={"database_id": NOTION_IMAGE_DATABASE_ID},
-            properties={
-                "Name": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": title
-                            }
-                        }
-                    ]
-                },
-                "Description": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": description
-                            }
-                        }
-                    ]
-                },
-                "Drive_Link": {
-                    "url": drive_link
-                },
-                "Tags": {
-                    "multi_select": [{"name": tag} for tag in tags]
-                },
-                "Created": {
-                    "date": {
-                        "start": datetime.now().isoformat()
+def build_image_properties(title, description, tags, drive_link):
+    """建立圖片 database 的 Notion page 屬性"""
+    return {
+        "Name": {
+            "title": [
+                {
+                    "text": {
+                        "content": title
                     }
                 }
+            ]
+        },
+        "Description": {
+            "rich_text": notion_writer.rich_text(description)
+        },
+        "Drive_Link": {
+            "url": drive_link
+        },
+        "Tags": {
+            "multi_select": [{"name": tag} for tag in tags]
+        },
+        "Created": {
+            "date": {
+                "start": datetime.now().isoformat()
             }
-        )
+        }
+    }
+
+
+def save_image_to_notion(title, description, tags, drive_link):
+    """將圖片資訊儲存到 Notion image database"""
+    try:
+        create_notion_page(
+            NOTION_IMAGE_DATABASE_ID,
+            build_image_properties(title, description, tags, drive_link)
+        ).result()
         return True
     except Exception as e:
         app.logger.error(f"儲存圖片到 Notion 時發生錯誤: {str(e)}")
@@ -653,16 +804,25 @@ def webhook():
     # 取得 X-Line-Signature header
     signature = request.headers['X-Line-Signature']
 
-    # 取得 request body
+    # 取得 request body（只取樣記錄遮蔽後的摘要，不記錄訊息內容）
     body = request.get_data(as_text=True)
-    app.logger.info(f"Request body: {body}")
-
-    # 驗證 signature 並處理 webhook body
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        app.logger.error("Invalid signature. Please check your channel access token/channel secret.")
-        abort(400)
+    webhook_intake.log_body(body)
+
+    with metrics.timer('webhook.ack'):
+        if webhook_queue is not None:
+            # 只驗證簽章並排入佇列，事件由背景 thread 解析、分派與回覆
+            if not webhook_queue.verify(body, signature):
+                app.logger.error("Invalid signature. Please check your channel access token/channel secret.")
+                abort(400)
+            webhook_queue.submit(body, signature)
+            return 'OK'
+
+        # 驗證 signature 並處理 webhook body
+        try:
+            handler.handle(body, signature)
+        except InvalidSignatureError:
+            app.logger.error("Invalid signature. Please check your channel access token/channel secret.")
+            abort(400)
 
     return 'OK'
 
@@ -670,75 +830,80 @@ def webhook():
 def process_summary_background(text, user_id):
     """背景處理文字摘要的函數"""
     try:
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
+        line_bot_api = MessagingApi(line_api_client)
 
-            # 使用 AI 生成摘要和分類
-            summary, category = generate_summary_and_category(text)
+        # 使用 AI 生成摘要、分類和標籤
+        summary, category, tags = enrich_text(text)
 
-            # 儲存到 Notion（來源類型為「文字」）
-            saved = save_summary_to_notion(text, summary, category, source_type="文字")
+        # 儲存到 Notion（來源類型為「文字」）
+        saved = save_summary_to_notion(text, summary, category, source_type="文字", tags=tags)
 
-            # 準備推送訊息
-            if saved:
-                push_text = f"✅ 已儲存到 Notion\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n📄 來源：文字"
-            else:
-                push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
+        # 準備推送訊息
+        if saved:
+            push_text = f"✅ 已儲存到 Notion\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n📄 來源：文字"
+        else:
+            push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
 
-            # 使用 push message 發送結果
-            line_bot_api.push_message(
-                PushMessageRequest(
-                    to=user_id,
-                    messages=[TextMessage(text=push_text)]
-                )
+        # 使用 push message 發送結果
+        line_bot_api.push_message(
+            PushMessageRequest(
+                to=user_id,
+                messages=[TextMessage(text=push_text)]
             )
+        )
+        return saved
 
     except Exception as e:
         app.logger.error(f"背景處理文字摘要時發生錯誤: {str(e)}")
         try:
-            with ApiClient(configuration) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text="抱歉，處理文字摘要時發生錯誤。")]
-                    )
+            line_bot_api = MessagingApi(line_api_client)
+            line_bot_api.push_message(
+                PushMessageRequest(
+                    to=user_id,
+                    messages=[TextMessage(text="抱歉，處理文字摘要時發生錯誤。")]
                 )
+            )
         except:
             pass
+        raise
 
 
-def process_instagram_url_background(url, user_id):
-    """背景處理 Instagram URL 摘要的函數"""
+def process_link_background(url, user_id):
+    """背景處理 URL 摘要的函數（社群貼文與一般網頁共用）"""
+    source = scrapers.find_source(url)
     try:
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
+        line_bot_api = MessagingApi(line_api_client)
+        timer = metrics.StageTimer(f"link.{source.name}")
 
-            # 1. 使用 Apify 抓取 Instagram 內容
-            ig_content = scrape_instagram_content(url)
+        # 1. 依來源抓取內容（社群貼文使用 Apify，一般網頁直接抓取）
+        with timer.stage('scrape'):
+            content = scrapers.scrape(source, url)
 
-            if not ig_content:
-                # 抓取失敗
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text="⚠️ 無法抓取 Instagram 內容，請檢查 URL 是否正確或稍後再試。")]
-                    )
+        if not content:
+            # 抓取失敗
+            line_bot_api.push_message(
+                PushMessageRequest(
+                    to=user_id,
+                    messages=[TextMessage(text=source.failed_text)]
                 )
-                return
+            )
+            return False
 
-            # 2. 生成摘要和分類
-            summary, category = generate_summary_and_category(ig_content)
+        # 2. 生成摘要、分類和標籤
+        with timer.stage('summarize'):
+            summary, category, tags = enrich_text(content)
 
-            # 3. 儲存到 Notion（URL 存 Content，摘要存 Summary，來源類型為「社群」）
-            saved = save_summary_to_notion(url, summary, category, source_type="社群")
+        # 3. 儲存到 Notion（URL 存 Content，摘要存 Summary，來源類型依來源而定）
+        with timer.stage('notion'):
+            saved = save_summary_to_notion(url, summary, category, source_type=source.source_type, tags=tags)
 
-            # 4. 推送結果
-            if saved:
-                push_text = f"✅ Instagram 貼文已摘要並儲存到 Notion\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n📱 來源：社群"
-            else:
-                push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
+        # 4. 推送結果
+        if saved:
+            push_text = f"✅ {source.done_text}\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n{source.source_text}"
+        else:
+            push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
 
+        with timer.stage('push'):
             line_bot_api.push_message(
                 PushMessageRequest(
                     to=user_id,
@@ -746,452 +911,1015 @@ def process_instagram_url_background(url, user_id):
                 )
             )
 
+        app.logger.info(f"{source.name} 摘要完成，階段耗時：{timer.summary()}")
+        return saved
+
     except Exception as e:
-        app.logger.error(f"背景處理 Instagram URL 摘要時發生錯誤: {str(e)}")
+        app.logger.error(f"背景處理 {source.name} URL 摘要時發生錯誤: {str(e)}")
         try:
-            with ApiClient(configuration) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text="抱歉，處理 Instagram URL 摘要時發生錯誤。")]
-                    )
+            line_bot_api = MessagingApi(line_api_client)
+            line_bot_api.push_message(
+                PushMessageRequest(
+                    to=user_id,
+                    messages=[TextMessage(text=source.error_text)]
                 )
+            )
         except:
             pass
+        raise
 
 
-def process_facebook_url_background(url, user_id):
-    """背景處理 Facebook URL 摘要的函數"""
-    try:
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
+def drive_upload_payload(prepared, index=None):
+    """決定上傳到 Google Drive 的圖片內容，返回 (bytes, mime_type, filename)；批次上傳時檔名加上圖片序號"""
+    name = f"linebot_image_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if index is not None:
+        name = f"{name}_{index:02d}"
+    if DRIVE_UPLOAD_ORIGINAL:
+        return prepared.original, prepared.mime_type, f"{name}.{prepared.extension}"
+    extension = images.MIME_EXTENSIONS.get(prepared.vision_mime_type, 'jpg')
+    return prepared.vision_bytes, prepared.vision_mime_type, f"{name}.{extension}"
 
-            # 1. 使用 Apify 抓取 Facebook 內容
-            fb_content = scrape_facebook_content(url)
 
-            if not fb_content:
-                # 抓取失敗
-                line_bot_api.push_message(
+def image_title(description):
+    """圖片標題（使用描述的前 50 個字）"""
+    return description[:50] + "..." if len(description) > 50 else description
+
+
+def upload_drive_stage(timer, prepared, index=None):
+    """上傳圖片到 Google Drive（權限另外設定），失敗時拋出例外"""
+    from google_drive import upload_image_to_drive
+
+    upload_bytes, upload_mime_type, filename = drive_upload_payload(prepared, index)
+    with timer.stage('drive_upload'):
+        drive_result = upload_image_to_drive(
+            upload_bytes,
+            filename,
+            folder_id=GOOGLE_DRIVE_FOLDER_ID,
+            mime_type=upload_mime_type,
+            share=False
+        )
+    if not drive_result:
+        raise Exception("上傳到 Google Drive 失敗")
+    return drive_result
+
+
+def share_drive_stage(timer, file_id):
+    """將 Drive 檔案設定為公開可讀（失敗時連結仍然有效，只是需要權限才能檢視）"""
+    from google_drive import share_file, sharing_inherited
+
+    if sharing_inherited(GOOGLE_DRIVE_FOLDER_ID):
+        # 檔案沿用資料夾的分享設定，不需要另外設定權限
+        return True
+    with timer.stage('drive_share'):
+        shared = share_file(file_id)
+    if not shared:
+        app.logger.warning(f"Drive 檔案 {file_id} 權限設定失敗")
+    return shared
+
+
+def build_image_push_text(saved, description, tags, drive_link):
+    """圖片處理結果的推送訊息"""
+    if saved:
+        tags_str = ', '.join(tags)
+        return f"""✅ 圖片已儲存
+
+📝 描述：{description}
+
+🏷️ 標籤：{tags_str}
+
+🔗 Google Drive: {drive_link}"""
+    return f"⚠️ 儲存到 Notion 時發生錯誤\n\n圖片已上傳到 Drive: {drive_link}"
+
+
+def process_image_background(message_id, user_id):
+    """
+    背景處理圖片訊息的函數
+
+    Vision 分析與 Google Drive 上傳彼此獨立，同時進行；
+    Drive 權限設定與儲存到 Notion 也同時進行，推送結果前再等待權限設定完成
+    """
+    try:
+        line_bot_api = MessagingApi(line_api_client)
+        line_bot_blob_api = MessagingApiBlob(line_api_client)
+        timer = metrics.StageTimer('image')
+
+        with timer.stage('total'):
+            # 1. 下載圖片並判斷格式、產生送給 Vision 的縮小版本
+            with timer.stage('download'):
+                image_bytes = line_bot_blob_api.get_message_content(message_id)
+            with timer.stage('preprocess'):
+                prepared = images.prepare_image(image_bytes)
+
+            # 2. 上傳到 Google Drive（背景執行）的同時使用 Vision API 分析圖片
+            upload_future = drive_executor.submit(upload_drive_stage, timer, prepared)
+            with timer.stage('vision'):
+                description, tags = analyze_image_with_vision(prepared.vision_bytes, prepared.vision_mime_type)
+
+            # 3. 生成標題
+            title = image_title(description)
+
+            drive_result = upload_future.result()
+            drive_link = drive_result['web_view_link']
+
+            # 4. 設定 Drive 權限（背景執行）的同時儲存到 Notion
+            share_future = drive_executor.submit(share_drive_stage, timer, drive_result['file_id'])
+            with timer.stage('notion'):
+                saved = save_image_to_notion(title, description, tags, drive_link)
+            share_future.result()
+
+            # 5. 發送結果通知
+            with timer.stage('push'):
+                line_bot_api.push_message(
                     PushMessageRequest(
                         to=user_id,
-                        messages=[TextMessage(text="⚠️ 無法抓取 Facebook 內容，請檢查 URL 是否正確或稍後再試。")]
+                        messages=[TextMessage(text=build_image_push_text(saved, description, tags, drive_link))]
                     )
                 )
-                return
-
-            # 2. 生成摘要和分類
-            summary, category = generate_summary_and_category(fb_content)
 
-            # 3. 儲存到 Notion（URL 存 Content，摘要存 Summary，來源類型為「社群」）
-            saved = save_summary_to_notion(url, summary, category, source_type="社群")
-
-            # 4. 推送結果
-            if saved:
-                push_text = f"✅ Facebook 貼文已摘要並儲存到 Notion\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n📱 來源：社群"
-            else:
-                push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
+        app.logger.info(f"圖片處理完成，階段耗時：{timer.summary()}")
+        return saved
 
+    except Exception as e:
+        app.logger.error(f"背景處理圖片訊息時發生錯誤: {str(e)}")
+        try:
+            line_bot_api = MessagingApi(line_api_client)
             line_bot_api.push_message(
                 PushMessageRequest(
                     to=user_id,
-                    messages=[TextMessage(text=push_text)]
+                    messages=[TextMessage(text=f"抱歉，處理圖片時發生錯誤：{str(e)}")]
                 )
             )
-
-    except Exception as e:
-        app.logger.error(f"背景處理 Facebook URL 摘要時發生錯誤: {str(e)}")
-        try:
-            with ApiClient(configuration) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text="抱歉，處理 Facebook URL 摘要時發生錯誤。")]
-                    )
-                )
         except:
             pass
+        raise
+
+
+def build_image_batch_push_text(entries, failed):
+    """
+    多張圖片處理結果的推送訊息（整批只推送一則）
+
+    Args:
+        entries: [(title, tags, drive_link, saved), ...]
+        failed: 下載或上傳失敗的圖片數
+    """
+    lines = [f"✅ 已儲存 {len(entries)} 張圖片"]
+    for number, (title, tags, drive_link, saved) in enumerate(entries, start=1):
+        status = '' if saved else '（Notion 儲存失敗）'
+        lines.append(f"\n{number}. {title}{status}\n🏷️ {', '.join(tags)}\n🔗 {drive_link}")
+    if failed:
+        lines.append(f"\n⚠️ {failed} 張圖片處理失敗")
+    return '\n'.join(lines)
+
+
+def share_drive_batch_stage(timer, file_ids):
+    """以單一 batch 請求將多個 Drive 檔案設定為公開可讀"""
+    from google_drive import share_files, sharing_inherited
+
+    if sharing_inherited(GOOGLE_DRIVE_FOLDER_ID):
+        return
+    with timer.stage('drive_share'):
+        results = share_files(file_ids)
+    failed = [file_id for file_id, shared in results.items() if not shared]
+    if failed:
+        app.logger.warning(f"{len(failed)} 個 Drive 檔案權限設定失敗")
+
 
+def process_image_batch_background(message_ids, user_id):
+    """
+    背景處理同一組（相簿）的多張圖片
 
-def process_url_background(url, user_id):
-    """背景處理 URL 摘要的函數"""
+    - 同時下載所有圖片，每張下載完成後立即開始上傳到 Google Drive
+    - 所有圖片以一個（或少數幾個）Vision 請求一起分析，與上傳同時進行
+    - 權限以單一 batch 請求設定，與 Notion 寫入同時進行
+    - 整批只推送一則結果訊息；個別圖片失敗時其餘圖片照常儲存
+    """
     try:
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
+        line_bot_api = MessagingApi(line_api_client)
+        line_bot_blob_api = MessagingApiBlob(line_api_client)
+        timer = metrics.StageTimer('image_batch')
+
+        def download(index):
+            try:
+                with timer.stage('download'):
+                    image_bytes = line_bot_blob_api.get_message_content(message_ids[index])
+                return index, images.prepare_image(image_bytes)
+            except Exception as e:
+                app.logger.error(f"下載第 {index + 1} 張圖片時發生錯誤: {str(e)}")
+                return index, None
+
+        with timer.stage('total'):
+            # 1. 同時下載，每張下載完成後立即開始上傳
+            prepared_images = {}
+            upload_futures = {}
+            download_futures = [image_batch_executor.submit(download, index) for index in range(len(message_ids))]
+            for future in as_completed(download_futures):
+                index, prepared = future.result()
+                if prepared is not None:
+                    prepared_images[index] = prepared
+                    upload_futures[index] = image_batch_executor.submit(upload_drive_stage, timer, prepared, index + 1)
+
+            if not prepared_images:
+                raise Exception("圖片下載失敗")
+
+            # 2. 上傳進行中的同時，一次分析所有圖片
+            indexes = sorted(prepared_images)
+            with timer.stage('vision'):
+                results = analyze_images_with_vision([prepared_images[index] for index in indexes])
+            analyses = dict(zip(indexes, results, strict=True))
+
+            drive_results = {}
+            for index in indexes:
+                try:
+                    drive_results[index] = upload_futures[index].result()
+                except Exception as e:
+                    app.logger.error(f"上傳第 {index + 1} 張圖片時發生錯誤: {str(e)}")
+
+            if not drive_results:
+                raise Exception("上傳到 Google Drive 失敗")
+
+            # 3. 設定 Drive 權限（單一 batch 請求）的同時寫入 Notion
+            uploaded = sorted(drive_results)
+            share_future = image_batch_executor.submit(
+                share_drive_batch_stage, timer, [drive_results[index]['file_id'] for index in uploaded]
+            )
 
-            # 1. 抓取網頁內容
-            web_content = scrape_web_content(url)
+            def save(index):
+                description, tags = analyses[index]
+                return save_image_to_notion(image_title(description), description, tags, drive_results[index]['web_view_link'])
 
-            if not web_content:
-                # 抓取失敗
+            with timer.stage('notion'):
+                saved = list(image_batch_executor.map(save, uploaded))
+            share_future.result()
+
+            # 4. 整批只推送一則結果
+            entries = [
+                (image_title(analyses[index][0]), analyses[index][1], drive_results[index]['web_view_link'], ok)
+                for index, ok in zip(uploaded, saved, strict=True)
+            ]
+            with timer.stage('push'):
                 line_bot_api.push_message(
                     PushMessageRequest(
                         to=user_id,
-                        messages=[TextMessage(text="⚠️ 無法抓取網頁內容，請檢查 URL 是否正確或稍後再試。")]
+                        messages=[TextMessage(text=build_image_batch_push_text(entries, len(message_ids) - len(entries)))]
                     )
                 )
-                return
-
-            # 2. 生成摘要和分類（重用現有函數）
-            summary, category = generate_summary_and_category(web_content)
-
-            # 3. 儲存到 Notion（URL 存 Content，摘要存 Summary，來源類型為「網頁」）
-            saved = save_summary_to_notion(url, summary, category, source_type="網頁")
 
-            # 4. 推送結果
-            if saved:
-                push_text = f"✅ 網頁已摘要並儲存到 Notion\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n🌐 來源：網頁"
-            else:
-                push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
+        app.logger.info(f"{len(message_ids)} 張圖片批次處理完成，階段耗時：{timer.summary()}")
+        return len(entries) == len(message_ids) and all(saved)
 
+    except Exception as e:
+        app.logger.error(f"背景批次處理圖片時發生錯誤: {str(e)}")
+        try:
+            line_bot_api = MessagingApi(line_api_client)
             line_bot_api.push_message(
                 PushMessageRequest(
                     to=user_id,
-                    messages=[TextMessage(text=push_text)]
+                    messages=[TextMessage(text=f"抱歉，處理圖片時發生錯誤：{str(e)}")]
                 )
             )
+        except:
+            pass
+        raise
+
+
+# asyncio 執行模式：背景工作以 coroutine 在單一 event loop 上執行，
+# 各階段的網路 I/O 使用非同步 client，沒有非同步 client 的階段（Google Drive、HTML 解析）交給 thread 執行，
+# Notion 寫入則與 threads 模式共用 notion_queue（以 asyncio.wrap_future 等待結果）
+async_openai_client = None
+async_line_api_client = None
+async_http_session = None
+
+
+async def init_async_clients():
+    """在 event loop 中建立非同步 client"""
+    global async_openai_client, async_line_api_client, async_http_session
+    import aiohttp
+    from openai import AsyncOpenAI
+    from linebot.v3.messaging import AsyncApiClient
+
+    async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    if isinstance(transcriber, transcription.OpenAITranscriber):
+        transcriber.async_client = async_openai_client
+    async_line_api_client = AsyncApiClient(configuration)
+    async_http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=http_client.HTTP_POOL_MAXSIZE),
+        timeout=aiohttp.ClientTimeout(total=30)
+    )
+
+
+async def push_text_async(user_id, text):
+    """使用 push message 發送文字訊息（非同步版本）"""
+    from linebot.v3.messaging import AsyncMessagingApi
+
+    await AsyncMessagingApi(async_line_api_client).push_message(
+        PushMessageRequest(
+            to=user_id,
+            messages=[TextMessage(text=text)]
+        )
+    )
+
+
+async def push_error_async(user_id, text):
+    """發送錯誤通知，發送失敗時忽略"""
+    try:
+        await push_text_async(user_id, text)
+    except Exception:
+        pass
+
+
+async def get_message_content_async(message_id):
+    """從 Line 下載訊息內容（非同步版本）"""
+    from linebot.v3.messaging import AsyncMessagingApiBlob
+
+    content = await AsyncMessagingApiBlob(async_line_api_client).get_message_content(message_id)
+    return bytes(content)
+
+
+async def summarize_chunk_async(chunk, index, total, semaphore):
+    """摘要長文的其中一段（非同步版本），失敗時返回 None"""
+    async def call():
+        response = await async_openai_client.chat.completions.create(
+            **build_chunk_summary_request(chunk, index, total)
+        )
+        return response.choices[0].message.content.strip()
+
+    async with semaphore:
+        try:
+            return await cached_openai_call_async('chunk', chunk, call)
+        except Exception as e:
+            app.logger.error(f"摘要第 {index}/{total} 段時發生錯誤: {str(e)}")
+            return None
+
 
+async def enrich_text_async(text):
+    """使用 OpenAI 生成摘要、內容分類和標籤（非同步版本，長文的各段摘要以 gather 平行處理）"""
+    async def call(source_text):
+        response = await async_openai_client.chat.completions.create(**build_enrich_request(source_text))
+        return parse_enrich_response(response)
+
+    try:
+        # token 計算與切分屬於 CPU 工作，避免阻塞 event loop
+        chunks = await asyncio.to_thread(prepare_chunks, text)
+        if chunks is None:
+            return tuple(await cached_openai_call_async('enrich', text, lambda: call(text)))
+
+        total = len(chunks)
+        semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+        with metrics.timer('summary.map'):
+            summaries = await asyncio.gather(*(
+                summarize_chunk_async(chunk, index, total, semaphore)
+                for index, chunk in enumerate(chunks, 1)
+            ))
+        combined = combine_chunk_summaries(summaries)
+        with metrics.timer('summary.reduce'):
+            return tuple(await cached_openai_call_async('enrich', combined, lambda: call(combined)))
     except Exception as e:
-        app.logger.error(f"背景處理 URL 摘要時發生錯誤: {str(e)}")
+        app.logger.error(f"生成摘要時發生錯誤: {str(e)}")
+        return fallback_enrichment(text)
+
+
+async def analyze_image_with_vision_async(image_bytes, mime_type='image/jpeg'):
+    """使用 OpenAI Vision API 分析圖片內容（非同步版本）"""
+    async def call():
+        # base64 編碼屬於 CPU 工作，避免阻塞 event loop
+        request_params = await asyncio.to_thread(build_vision_request, image_bytes, mime_type)
+        response = await async_openai_client.chat.completions.create(**request_params)
+        return parse_vision_response(response)
+
+    try:
+        return tuple(await cached_openai_call_async('vision', image_bytes, call))
+    except Exception as e:
+        app.logger.error(f"分析圖片時發生錯誤: {str(e)}")
+        return "圖片內容", ["未分類"]
+
+
+async def analyze_images_with_vision_async(prepared_images):
+    """analyze_images_with_vision 的非同步版本"""
+    keys, results, groups = await asyncio.to_thread(vision_batch_groups, prepared_images)
+    for group in groups:
         try:
-            with ApiClient(configuration) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text="抱歉，處理 URL 摘要時發生錯誤。")]
-                    )
-                )
-        except:
-            pass
+            request_params = await asyncio.to_thread(
+                build_vision_batch_request, [prepared_images[index] for index in group]
+            )
+            response = await async_openai_client.chat.completions.create(**request_params)
+            for index, result in zip(group, parse_vision_batch_response(response, len(group)), strict=True):
+                results[index] = result
+                await asyncio.to_thread(openai_cache.set, keys[index], result)
+            metrics.incr('openai.vision.batch_requests')
+        except Exception as e:
+            app.logger.warning(f"批次分析圖片失敗，改為逐張分析: {str(e)}")
+            fallback = await asyncio.gather(*(
+                analyze_image_with_vision_async(prepared_images[index].vision_bytes, prepared_images[index].vision_mime_type)
+                for index in group
+            ))
+            for index, result in zip(group, fallback, strict=True):
+                results[index] = result
+    return [tuple(result) for result in results]
 
 
-def process_image_background(message_id, user_id):
-    """背景處理圖片訊息的函數"""
+async def save_notion_page_async(database_id, properties, optional=(), children=None):
+    """
+    建立 Notion page（非同步版本，經由共用的寫入佇列），返回是否成功
+    optional 為 database 不一定有的選用欄位，children 為 page 內文的 blocks
+    """
     try:
-        # 導入 Google Drive 模組
-        from google_drive import upload_image_to_drive
+        # 屬性檢查可能需要查詢 database 結構，交給 thread 執行
+        future = await asyncio.to_thread(create_notion_page, database_id, properties, optional, children)
+        await asyncio.wrap_future(future)
+        return True
+    except Exception as e:
+        app.logger.error(f"儲存到 Notion 時發生錯誤: {str(e)}")
+        return False
 
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            line_bot_blob_api = MessagingApiBlob(api_client)
 
-            # 1. 下載圖片
-            image_content = line_bot_blob_api.get_message_content(message_id)
-            image_bytes = image_content
+async def process_summary_async(text, user_id):
+    """背景處理文字摘要（非同步版本）"""
+    try:
+        summary, category, tags = await enrich_text_async(text)
+        saved = await save_notion_page_async(
+            NOTION_SUMMARY_DATABASE_ID,
+            build_summary_properties(text, summary, category, "文字", tags),
+            SUMMARY_OPTIONAL_PROPERTIES,
+            notion_writer.overflow_blocks(text)
+        )
 
-            # 2. 使用 Vision API 分析圖片
-            description, tags = analyze_image_with_vision(image_bytes)
+        if saved:
+            push_text = f"✅ 已儲存到 Notion\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n📄 來源：文字"
+        else:
+            push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
 
-            # 3. 生成標題（使用描述的前 50 個字）
-            title = description[:50] + "..." if len(description) > 50 else description
+        await push_text_async(user_id, push_text)
+        return saved
 
-            # 4. 上傳到 Google Drive
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"linebot_image_{timestamp}.jpg"
+    except Exception as e:
+        app.logger.error(f"背景處理文字摘要時發生錯誤: {str(e)}")
+        await push_error_async(user_id, "抱歉，處理文字摘要時發生錯誤。")
+        raise
 
-            drive_result = upload_image_to_drive(
-                image_bytes,
-                filename,
-                folder_id=GOOGLE_DRIVE_FOLDER_ID
+
+async def process_link_async(url, user_id):
+    """背景處理 URL 摘要（非同步版本）"""
+    source = scrapers.find_source(url)
+    try:
+        timer = metrics.StageTimer(f"link.{source.name}")
+        with timer.stage('scrape'):
+            content = await scrapers.scrape_async(async_http_session, source, url)
+
+        if not content:
+            await push_text_async(user_id, source.failed_text)
+            return False
+
+        with timer.stage('summarize'):
+            summary, category, tags = await enrich_text_async(content)
+        with timer.stage('notion'):
+            saved = await save_notion_page_async(
+                NOTION_SUMMARY_DATABASE_ID,
+                build_summary_properties(url, summary, category, source.source_type, tags),
+                SUMMARY_OPTIONAL_PROPERTIES
             )
 
-            if not drive_result:
-                raise Exception("上傳到 Google Drive 失敗")
+        if saved:
+            push_text = f"✅ {source.done_text}\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}\n\n{source.source_text}"
+        else:
+            push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n🔗 URL：{url}\n\n📝 摘要：{summary}\n\n📁 類別：{category}"
 
-            drive_link = drive_result['web_view_link']
+        with timer.stage('push'):
+            await push_text_async(user_id, push_text)
 
-            # 5. 儲存到 Notion
-            saved = save_image_to_notion(title, description, tags, drive_link)
+        app.logger.info(f"{source.name} 摘要完成，階段耗時：{timer.summary()}")
+        return saved
 
-            # 6. 發送結果通知
-            if saved:
-                tags_str = ', '.join(tags)
-                push_text = f"""✅ 圖片已儲存
+    except Exception as e:
+        app.logger.error(f"背景處理 {source.name} URL 摘要時發生錯誤: {str(e)}")
+        await push_error_async(user_id, source.error_text)
+        raise
 
-📝 描述：{description}
 
-🏷️ 標籤：{tags_str}
+async def process_image_async(message_id, user_id):
+    """背景處理圖片訊息（非同步版本，Vision 分析與 Drive 上傳、Drive 權限設定與 Notion 同時進行）"""
+    try:
+        timer = metrics.StageTimer('image')
+
+        with timer.stage('total'):
+            with timer.stage('download'):
+                image_bytes = await get_message_content_async(message_id)
+            # 圖片解碼與縮放屬於 CPU 工作，交給 thread 執行
+            with timer.stage('preprocess'):
+                prepared = await asyncio.to_thread(images.prepare_image, image_bytes)
+
+            # Google Drive 沒有非同步 client，上傳交給 thread 執行，同時進行 Vision 分析
+            upload_task = asyncio.create_task(asyncio.to_thread(upload_drive_stage, timer, prepared))
+            try:
+                with timer.stage('vision'):
+                    description, tags = await analyze_image_with_vision_async(
+                        prepared.vision_bytes, prepared.vision_mime_type
+                    )
+            except Exception:
+                # 上傳仍在 thread 中執行，等待結束避免留下未處理的例外
+                await asyncio.gather(upload_task, return_exceptions=True)
+                raise
+            title = image_title(description)
 
-🔗 Google Drive: {drive_link}"""
-            else:
-                push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n圖片已上傳到 Drive: {drive_link}"
+            drive_result = await upload_task
+            drive_link = drive_result['web_view_link']
 
-            line_bot_api.push_message(
-                PushMessageRequest(
-                    to=user_id,
-                    messages=[TextMessage(text=push_text)]
-                )
+            async def save_notion():
+                with timer.stage('notion'):
+                    return await save_notion_page_async(
+                        NOTION_IMAGE_DATABASE_ID,
+                        build_image_properties(title, description, tags, drive_link)
+                    )
+
+            saved, _ = await asyncio.gather(
+                save_notion(),
+                asyncio.to_thread(share_drive_stage, timer, drive_result['file_id'])
             )
 
+            with timer.stage('push'):
+                await push_text_async(user_id, build_image_push_text(saved, description, tags, drive_link))
+
+        app.logger.info(f"圖片處理完成，階段耗時：{timer.summary()}")
+        return saved
+
     except Exception as e:
         app.logger.error(f"背景處理圖片訊息時發生錯誤: {str(e)}")
-        try:
-            with ApiClient(configuration) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text=f"抱歉，處理圖片時發生錯誤：{str(e)}")]
+        await push_error_async(user_id, f"抱歉，處理圖片時發生錯誤：{str(e)}")
+        raise
+
+
+async def process_image_batch_async(message_ids, user_id):
+    """背景處理同一組（相簿）的多張圖片（非同步版本，流程同 process_image_batch_background）"""
+    try:
+        timer = metrics.StageTimer('image_batch')
+        semaphore = asyncio.Semaphore(IMAGE_BATCH_CONCURRENCY)
+
+        async def download(index):
+            try:
+                async with semaphore:
+                    with timer.stage('download'):
+                        image_bytes = await get_message_content_async(message_ids[index])
+                    return index, await asyncio.to_thread(images.prepare_image, image_bytes)
+            except Exception as e:
+                app.logger.error(f"下載第 {index + 1} 張圖片時發生錯誤: {str(e)}")
+                return index, None
+
+        async def upload(index, prepared):
+            async with semaphore:
+                return await asyncio.to_thread(upload_drive_stage, timer, prepared, index + 1)
+
+        with timer.stage('total'):
+            # 1. 同時下載，每張下載完成後立即開始上傳
+            prepared_images = {}
+            upload_tasks = {}
+            for next_download in asyncio.as_completed([download(index) for index in range(len(message_ids))]):
+                index, prepared = await next_download
+                if prepared is not None:
+                    prepared_images[index] = prepared
+                    upload_tasks[index] = asyncio.create_task(upload(index, prepared))
+
+            if not prepared_images:
+                raise Exception("圖片下載失敗")
+
+            # 2. 上傳進行中的同時，一次分析所有圖片
+            indexes = sorted(prepared_images)
+            try:
+                with timer.stage('vision'):
+                    results = await analyze_images_with_vision_async([prepared_images[index] for index in indexes])
+            finally:
+                # 無論分析是否成功都等待上傳結束，避免留下未處理的例外
+                upload_results = await asyncio.gather(*(upload_tasks[index] for index in indexes), return_exceptions=True)
+            analyses = dict(zip(indexes, results, strict=True))
+
+            drive_results = {}
+            for index, result in zip(indexes, upload_results, strict=True):
+                if isinstance(result, BaseException):
+                    app.logger.error(f"上傳第 {index + 1} 張圖片時發生錯誤: {str(result)}")
+                else:
+                    drive_results[index] = result
+
+            if not drive_results:
+                raise Exception("上傳到 Google Drive 失敗")
+
+            # 3. 設定 Drive 權限（單一 batch 請求）的同時寫入 Notion
+            uploaded = sorted(drive_results)
+
+            async def save(index):
+                description, tags = analyses[index]
+                async with semaphore:
+                    return await save_notion_page_async(
+                        NOTION_IMAGE_DATABASE_ID,
+                        build_image_properties(image_title(description), description, tags, drive_results[index]['web_view_link'])
                     )
-                )
-        except:
-            pass
+
+            async def save_all():
+                with timer.stage('notion'):
+                    return await asyncio.gather(*(save(index) for index in uploaded))
+
+            saved, _ = await asyncio.gather(
+                save_all(),
+                asyncio.to_thread(share_drive_batch_stage, timer, [drive_results[index]['file_id'] for index in uploaded])
+            )
+
+            # 4. 整批只推送一則結果
+            entries = [
+                (image_title(analyses[index][0]), analyses[index][1], drive_results[index]['web_view_link'], ok)
+                for index, ok in zip(uploaded, saved, strict=True)
+            ]
+            with timer.stage('push'):
+                await push_text_async(user_id, build_image_batch_push_text(entries, len(message_ids) - len(entries)))
+
+        app.logger.info(f"{len(message_ids)} 張圖片批次處理完成，階段耗時：{timer.summary()}")
+        return len(entries) == len(message_ids) and all(saved)
+
+    except Exception as e:
+        app.logger.error(f"背景批次處理圖片時發生錯誤: {str(e)}")
+        await push_error_async(user_id, f"抱歉，處理圖片時發生錯誤：{str(e)}")
+        raise
+
+
+async def transcribe_segment_async(segment):
+    """以設定的轉錄後端轉錄一段語音（非同步版本）"""
+    with metrics.timer('audio.transcribe'):
+        return await transcriber.transcribe_async(segment)
+
+
+async def transcribe_audio_async(message_content, duration_seconds):
+    """語音轉文字（非同步版本），切段在 thread 中執行，各段同時轉錄的數量不超過 AUDIO_SEGMENT_CONCURRENCY"""
+    segments = await asyncio.to_thread(audio.segment_audio, message_content, duration_seconds, transcriber.max_bytes)
+    if len(segments) == 1:
+        return await transcribe_segment_async(segments[0])
+
+    semaphore = asyncio.Semaphore(audio.AUDIO_SEGMENT_CONCURRENCY)
+
+    async def transcribe(segment):
+        async with semaphore:
+            return await transcribe_segment_async(segment)
+
+    with metrics.timer('audio.transcribe_total'):
+        return audio.merge_transcripts(await asyncio.gather(*(transcribe(segment) for segment in segments)))
+
+
+async def process_audio_async(message_id, user_id, duration_seconds):
+    """背景處理語音訊息（非同步版本）"""
+    try:
+        message_content = await audio.download_audio_async(async_http_session, message_id, CHANNEL_ACCESS_TOKEN)
+
+        transcribed_text = await transcribe_audio_async(message_content, duration_seconds)
+
+        summary, category, tags = await enrich_text_async(transcribed_text)
+        saved = await save_notion_page_async(
+            NOTION_DATABASE_ID,
+            build_voice_note_properties(transcribed_text, duration_seconds, tags, summary, category),
+            VOICE_OPTIONAL_PROPERTIES,
+            notion_writer.overflow_blocks(transcribed_text)
+        )
+
+        if saved:
+            push_text = f"✅ 已儲存到 Notion\n\n你說：{transcribed_text}\n\n標籤：{', '.join(tags)}"
+        else:
+            push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n你說：{transcribed_text}"
+
+        await push_text_async(user_id, push_text)
+        return saved
+
+    except audio.AudioTooLargeError as e:
+        app.logger.warning(f"語音訊息 {message_id} {str(e)}")
+        await push_error_async(user_id, f"抱歉，{str(e)}，無法轉換為文字。")
+        raise
+    except Exception as e:
+        app.logger.error(f"背景處理語音訊息時發生錯誤: {str(e)}")
+        await push_error_async(user_id, "抱歉，處理語音訊息時發生錯誤。")
+        raise
+
+
+def submit_job(job_id, job_type, args):
+    """依執行模式將工作交給 worker pool 或 event loop，返回是否被接受"""
+    kind = JOB_HANDLERS[job_type][0]
+    if EXECUTION_MODE == 'asyncio':
+        return async_runner.submit(kind, run_job_async, job_id, job_type, args)
+    return dispatcher.submit(kind, run_job, job_id, job_type, args)
+
+
+def enqueue_job(job_type, *args, event_id=None):
+    """
+    先將工作寫入持久化佇列，再交給對應類型的 worker pool
+
+    event_id 為產生工作的 LINE 事件 webhookEventId：同一個事件重新處理時（例如重啟後重新處理中斷的 webhook）
+    不會再新增工作，已有的工作由原本的流程或重啟後的恢復處理
+
+    Returns:
+        bool: 工作被接受時返回 True，pool 滿載被拒絕時返回 False；事件已經新增過工作時返回 None（不需要再回覆）
+    """
+    job_id = job_store.add(job_type, args, event_id)
+    if job_id is None:
+        app.logger.info(f"事件 {event_id} 已建立過 {job_type} 工作，不再重複新增")
+        return None
+
+    if submit_job(job_id, job_type, args):
+        return True
+
+    # 被拒絕的工作已回覆使用者忙碌中，不需要保留
+    job_store.discard(job_id)
+    return False
+
+
+def run_job(job_id, job_type, args):
+    """認領並執行持久化佇列中的工作，內容未儲存（處理函數返回 False 或拋出例外）時標記為失敗"""
+    if not job_store.claim(job_id):
+        return
+
+    func = JOB_HANDLERS[job_type][1]
+    try:
+        saved = func(*args)
+    except Exception as e:
+        job_store.fail(job_id, str(e))
+        raise
+    if saved:
+        job_store.complete(job_id)
+    else:
+        job_store.fail(job_id, JOB_NOT_SAVED_ERROR)
+
+
+async def run_job_async(job_id, job_type, args):
+    """認領並執行持久化佇列中的工作（asyncio 執行模式），失敗的判斷同 run_job"""
+    if not await asyncio.to_thread(job_store.claim, job_id):
+        return
+
+    coro_func = JOB_HANDLERS[job_type][2]
+    try:
+        saved = await coro_func(*args)
+    except Exception as e:
+        await asyncio.to_thread(job_store.fail, job_id, str(e))
+        raise
+    if saved:
+        await asyncio.to_thread(job_store.complete, job_id)
+    else:
+        await asyncio.to_thread(job_store.fail, job_id, JOB_NOT_SAVED_ERROR)
+
+
+def resume_job(job_id, job_type, args):
+    """重新提交程序重啟前未完成的工作"""
+    if job_type == webhook_intake.JOB_TYPE:
+        # 已返回 200 但尚未處理的 webhook（LINE 不會重送）；已改回同步接收時直接在維護 thread 中處理
+        if webhook_queue is None:
+            webhook_intake.replay(handler, job_store, job_id, *args)
+        elif not webhook_queue.resume(job_id, *args):
+            job_store.release(job_id)
+        return
+    if not submit_job(job_id, job_type, args):
+        # pool 滿載時先釋放，下一次維護週期再取回
+        job_store.release(job_id)
+
+
+def reply_text(event, text):
+    """
+    以 reply token 回覆文字訊息
+
+    事件已超過 reply token 的有效時間（REPLY_TOKEN_WINDOW 秒，例如在 webhook 佇列中等待過久）時改用 push
+    """
+    line_bot_api = MessagingApi(line_api_client)
+    age = time.time() - event.timestamp / 1000
+    metrics.observe('webhook.reply_delay', max(0.0, age))
+    user_id = event.source.user_id
+    if age > REPLY_TOKEN_WINDOW and user_id:
+        metrics.incr('webhook.reply_fallback_push')
+        line_bot_api.push_message(PushMessageRequest(to=user_id, messages=[TextMessage(text=text)]))
+        return
+    line_bot_api.reply_message_with_http_info(
+        ReplyMessageRequest(
+            reply_token=event.reply_token,
+            messages=[TextMessage(text=text)]
+        )
+    )
 
 
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_text_message(event):
     """處理文字訊息，支援 URL 自動摘要和 /a 指令進行文字摘要"""
-    with ApiClient(configuration) as api_client:
-        line_bot_api = MessagingApi(api_client)
+    try:
+        text = event.message.text.strip()
 
-        try:
-            text = event.message.text.strip()
-
-            # 最高優先級：檢查是否包含 URL
-            url = extract_url_from_text(text)
-            if url:
-                user_id = event.source.user_id
-
-                # 檢查是否為 Instagram URL
-                if is_instagram_url(url):
-                    # 立即回覆 Instagram 特定訊息
-                    line_bot_api.reply_message_with_http_info(
-                        ReplyMessageRequest(
-                            reply_token=event.reply_token,
-                            messages=[TextMessage(text="🔗 偵測到 Instagram 連結，正在抓取並生成摘要...")]
-                        )
-                    )
+        # 最高優先級：檢查是否包含 URL
+        url = extract_url_from_text(text)
+        if url:
+            user_id = event.source.user_id
 
-                    # 背景處理 Instagram URL
-                    thread = threading.Thread(
-                        target=process_instagram_url_background,
-                        args=(url, user_id)
-                    )
-                    thread.daemon = True
-                    thread.start()
-                    return
-                # 檢查是否為 Facebook URL
-                elif is_facebook_url(url):
-                    # 立即回覆 Facebook 特定訊息
-                    line_bot_api.reply_message_with_http_info(
-                        ReplyMessageRequest(
-                            reply_token=event.reply_token,
-                            messages=[TextMessage(text="🔗 偵測到 Facebook 連結，正在抓取並生成摘要...")]
-                        )
-                    )
+            # 依 URL 選擇爬取來源（Instagram、Facebook 或一般網頁），背景處理
+            source = scrapers.find_source(url)
+            accepted = enqueue_job(source.name, url, user_id, event_id=event.webhook_event_id)
+            if accepted is None:
+                return
+            detected_text = source.detected_text
 
-                    # 背景處理 Facebook URL
-                    thread = threading.Thread(
-                        target=process_facebook_url_background,
-                        args=(url, user_id)
-                    )
-                    thread.daemon = True
-                    thread.start()
-                    return
-                else:
-                    # 一般 URL
-                    line_bot_api.reply_message_with_http_info(
-                        ReplyMessageRequest(
-                            reply_token=event.reply_token,
-                            messages=[TextMessage(text="🔗 偵測到 URL，正在抓取並生成摘要...")]
-                        )
-                    )
+            # 立即回覆（pool 滿載時改回覆忙碌訊息）
+            reply_text(event, detected_text if accepted else BUSY_REPLY_TEXT)
+            return
 
-                    # 背景處理一般 URL
-                    thread = threading.Thread(
-                        target=process_url_background,
-                        args=(url, user_id)
-                    )
-                    thread.daemon = True
-                    thread.start()
-                    return
-
-            # 次優先級：/a 指令（保持原有功能）
-            if text.startswith('/a'):
-                content = text[2:].strip()
-
-                if not content:
-                    line_bot_api.reply_message_with_http_info(
-                        ReplyMessageRequest(
-                            reply_token=event.reply_token,
-                            messages=[TextMessage(text="請在 /a 後面加上要摘要的文字內容\n\n範例：\n/a 這是一段很長的文章內容...")]
-                        )
-                    )
-                    return
+        # 次優先級：/a 指令（保持原有功能）
+        if text.startswith('/a'):
+            content = text[2:].strip()
 
-                line_bot_api.reply_message_with_http_info(
-                    ReplyMessageRequest(
-                        reply_token=event.reply_token,
-                        messages=[TextMessage(text="📝 收到文字內容，正在生成摘要...")]
-                    )
-                )
+            if not content:
+                reply_text(event, "請在 /a 後面加上要摘要的文字內容\n\n範例：\n/a 這是一段很長的文章內容...")
+                return
 
-                user_id = event.source.user_id
-                thread = threading.Thread(
-                    target=process_summary_background,
-                    args=(content, user_id)
-                )
-                thread.daemon = True
-                thread.start()
+            user_id = event.source.user_id
+            accepted = enqueue_job('summary', content, user_id, event_id=event.webhook_event_id)
+            if accepted is None:
                 return
 
-            # 預設：Echo Bot
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text=text)]
-                )
-            )
+            reply_text(event, "📝 收到文字內容，正在生成摘要..." if accepted else BUSY_REPLY_TEXT)
+            return
 
-        except Exception as e:
-            app.logger.error(f"處理文字訊息時發生錯誤: {str(e)}")
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text="抱歉，處理訊息時發生錯誤。")]
-                )
-            )
+        # 預設：Echo Bot
+        reply_text(event, text)
+
+    except Exception as e:
+        app.logger.error(f"處理文字訊息時發生錯誤: {str(e)}")
+        reply_text(event, "抱歉，處理訊息時發生錯誤。")
+
+
+def transcribe_segment(segment):
+    """以設定的轉錄後端（TRANSCRIPTION_BACKEND）轉錄一段語音，直接使用記憶體中的內容"""
+    with metrics.timer('audio.transcribe'):
+        return transcriber.transcribe(segment)
+
+
+def transcribe_audio(message_content, duration_seconds):
+    """
+    語音轉文字：超過 AUDIO_SEGMENT_SECONDS 或轉錄後端大小上限的錄音在靜音處切段，各段同時轉錄後依順序合併
+    """
+    segments = audio.segment_audio(message_content, duration_seconds, transcriber.max_bytes)
+    if len(segments) == 1:
+        return transcribe_segment(segments[0])
+    with metrics.timer('audio.transcribe_total'):
+        return audio.merge_transcripts(audio_segment_executor.map(transcribe_segment, segments))
 
 
 def process_audio_background(message_id, user_id, duration_seconds):
     """背景處理語音訊息的函數"""
     try:
-        with ApiClient(configuration) as api_client:
-            line_bot_api = MessagingApi(api_client)
-            line_bot_blob_api = MessagingApiBlob(api_client)
-
-            # 從 Line 下載語音檔案
-            message_content = line_bot_blob_api.get_message_content(message_id)
-
-            # 將語音內容寫入臨時檔案
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.m4a') as temp_audio:
-                temp_audio.write(message_content)
-                temp_audio_path = temp_audio.name
-
-            # 使用 OpenAI Whisper API 轉換語音為文字
-            with open(temp_audio_path, 'rb') as audio_file:
-                transcription = openai_client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="zh"
-                )
+        line_bot_api = MessagingApi(line_api_client)
 
-            # 刪除臨時檔案
-            os.unlink(temp_audio_path)
+        # 從 Line 串流下載語音檔案（超過 AUDIO_DOWNLOAD_MAX_BYTES 時中止）
+        message_content = audio.download_audio(message_id, CHANNEL_ACCESS_TOKEN)
 
-            # 取得轉錄的文字
-            transcribed_text = transcription.text
+        # 使用 OpenAI Whisper API 轉換語音為文字（長錄音切段後同時轉錄）
+        transcribed_text = transcribe_audio(message_content, duration_seconds)
 
-            # 使用 AI 生成標籤
-            tags = generate_tags(transcribed_text)
+        # 使用 AI 生成摘要、分類和標籤
+        summary, category, tags = enrich_text(transcribed_text)
 
-            # 儲存到 Notion
-            saved = save_to_notion(transcribed_text, duration_seconds, tags)
+        # 儲存到 Notion
+        saved = save_to_notion(transcribed_text, duration_seconds, tags, summary, category)
 
-            # 準備推送訊息
-            if saved:
-                push_text = f"✅ 已儲存到 Notion\n\n你說：{transcribed_text}\n\n標籤：{', '.join(tags)}"
-            else:
-                push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n你說：{transcribed_text}"
+        # 準備推送訊息
+        if saved:
+            push_text = f"✅ 已儲存到 Notion\n\n你說：{transcribed_text}\n\n標籤：{', '.join(tags)}"
+        else:
+            push_text = f"⚠️ 儲存到 Notion 時發生錯誤\n\n你說：{transcribed_text}"
 
-            # 使用 push message 發送結果
-            line_bot_api.push_message(
-                PushMessageRequest(
-                    to=user_id,
-                    messages=[TextMessage(text=push_text)]
-                )
+        # 使用 push message 發送結果
+        line_bot_api.push_message(
+            PushMessageRequest(
+                to=user_id,
+                messages=[TextMessage(text=push_text)]
             )
+        )
+        return saved
 
     except Exception as e:
-        app.logger.error(f"背景處理語音訊息時發生錯誤: {str(e)}")
+        if isinstance(e, audio.AudioTooLargeError):
+            app.logger.warning(f"語音訊息 {message_id} {str(e)}")
+            error_text = f"抱歉，{str(e)}，無法轉換為文字。"
+        else:
+            app.logger.error(f"背景處理語音訊息時發生錯誤: {str(e)}")
+            error_text = "抱歉，處理語音訊息時發生錯誤。"
         try:
-            with ApiClient(configuration) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.push_message(
-                    PushMessageRequest(
-                        to=user_id,
-                        messages=[TextMessage(text="抱歉，處理語音訊息時發生錯誤。")]
-                    )
+            line_bot_api = MessagingApi(line_api_client)
+            line_bot_api.push_message(
+                PushMessageRequest(
+                    to=user_id,
+                    messages=[TextMessage(text=error_text)]
                 )
+            )
         except:
             pass
+        raise
 
 
 @handler.add(MessageEvent, message=AudioMessageContent)
 def handle_audio_message(event):
     """處理語音訊息，立即回應並在背景處理"""
-    # 立即回應 Line，避免 timeout
-    with ApiClient(configuration) as api_client:
-        line_bot_api = MessagingApi(api_client)
+    try:
+        # 獲取必要資訊
+        message_id = event.message.id
+        user_id = event.source.user_id
+        duration_seconds = event.message.duration / 1000
 
-        try:
-            # 獲取必要資訊
-            message_id = event.message.id
-            user_id = event.source.user_id
-            duration_seconds = event.message.duration / 1000
+        # 記錄工作並交給 audio pool 背景處理
+        accepted = enqueue_job('audio', message_id, user_id, duration_seconds, event_id=event.webhook_event_id)
+        if accepted is None:
+            return
 
-            # 立即回覆「處理中」
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text="🎤 收到語音訊息，正在處理中...")]
-                )
-            )
+        # 立即回覆「處理中」（pool 滿載時改回覆忙碌訊息）
+        reply_text(event, "🎤 收到語音訊息，正在處理中..." if accepted else BUSY_REPLY_TEXT)
 
-            # 啟動背景線程處理
-            thread = threading.Thread(
-                target=process_audio_background,
-                args=(message_id, user_id, duration_seconds)
-            )
-            thread.daemon = True
-            thread.start()
-
-        except Exception as e:
-            app.logger.error(f"處理語音訊息時發生錯誤: {str(e)}")
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text="抱歉，處理語音訊息時發生錯誤。")]
-                )
-            )
+    except Exception as e:
+        app.logger.error(f"處理語音訊息時發生錯誤: {str(e)}")
+        reply_text(event, "抱歉，處理語音訊息時發生錯誤。")
 
 
 @handler.add(MessageEvent, message=ImageMessageContent)
 def handle_image_message(event):
     """處理圖片訊息，立即回應並在背景處理"""
-    with ApiClient(configuration) as api_client:
-        line_bot_api = MessagingApi(api_client)
+    try:
+        message_id = event.message.id
+        user_id = event.source.user_id
+        image_set = event.message.image_set
+
+        if image_set is not None and image_batcher is not None:
+            # 一次傳送多張圖片時，同一組圖片收齊後一起處理，只回覆第一張；
+            # 每張圖片先各自寫入持久化佇列，聚合期間程序終止時重啟後仍會逐張處理
+            job_id = job_store.add('image', (message_id, user_id), event.webhook_event_id)
+            if job_id is None:
+                # 重新處理的事件：圖片已寫入佇列（或已合併到批次工作）
+                return
+            first = image_batcher.add(
+                (user_id, image_set.id), (image_set.index or 0, message_id, job_id), image_set.total
+            )
+            if first:
+                count = f" {image_set.total} 張" if image_set.total else "多張"
+                reply_text(event, f"🖼️ 收到{count}圖片，正在分析並上傳到 Google Drive...")
+            return
 
-        try:
-            message_id = event.message.id
-            user_id = event.source.user_id
+        # 記錄工作並交給 image pool 背景處理
+        accepted = enqueue_job('image', message_id, user_id, event_id=event.webhook_event_id)
+        if accepted is None:
+            return
 
-            # 立即回覆
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text="🖼️ 收到圖片，正在分析並上傳到 Google Drive...")]
-                )
-            )
+        # 立即回覆（pool 滿載時改回覆忙碌訊息）
+        reply_text(event, "🖼️ 收到圖片，正在分析並上傳到 Google Drive..." if accepted else BUSY_REPLY_TEXT)
 
-            # 背景處理
-            thread = threading.Thread(
-                target=process_image_background,
-                args=(message_id, user_id)
-            )
-            thread.daemon = True
-            thread.start()
+    except Exception as e:
+        app.logger.error(f"處理圖片訊息時發生錯誤: {str(e)}")
+        reply_text(event, "抱歉，處理圖片訊息時發生錯誤。")
+
+
+# 持久化工作類型：{類型名稱: (worker pool 類型, 處理函數, asyncio 模式的處理函數)}
+# 處理函數返回內容是否已儲存到 Notion；發生錯誤時通知使用者後再拋出例外，工作才會標記為失敗
+JOB_HANDLERS = {
+    'summary': ('text', process_summary_background, process_summary_async),
+    'image': ('image', process_image_background, process_image_async),
+    'image_batch': ('image', process_image_batch_background, process_image_batch_async),
+    'audio': ('audio', process_audio_background, process_audio_async),
+    # 舊版的一般網址工作類型（相容升級前已寫入佇列的工作）
+    'url': ('web', process_link_background, process_link_async)
+}
+# 每個爬取來源各自是一種工作類型
+for _source in scrapers.all_sources():
+    JOB_HANDLERS[_source.name] = (_source.kind, process_link_background, process_link_async)
+
+
+def flush_image_batch(key, items):
+    """
+    聚合視窗送出一組圖片：將各張圖片已寫入佇列的工作依圖片順序合併成批次工作
+    （只有一張時直接提交原本的圖片工作）
+    """
+    user_id = key[0]
+    items = sorted(items)
+    message_ids = [message_id for _, message_id, _ in items]
+    if len(items) == 1:
+        job_id, job_type, args = items[0][2], 'image', (message_ids[0], user_id)
+    else:
+        job_type, args = 'image_batch', (message_ids, user_id)
+        job_id = job_store.merge([job_id for _, _, job_id in items], job_type, args)
+
+    if not submit_job(job_id, job_type, args):
+        job_store.discard(job_id)
+        # 回覆 token 已使用，只能以 push 通知忙碌
+        MessagingApi(line_api_client).push_message(
+            PushMessageRequest(to=user_id, messages=[TextMessage(text=BUSY_REPLY_TEXT)])
+        )
 
-        except Exception as e:
-            app.logger.error(f"處理圖片訊息時發生錯誤: {str(e)}")
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text="抱歉，處理圖片訊息時發生錯誤。")]
-                )
-            )
+
+if IMAGE_BATCH_WINDOW > 0:
+    image_batcher = AggregationWindow('image', IMAGE_BATCH_WINDOW, flush_image_batch, max_items=IMAGE_BATCH_MAX)
+    metrics.register_gauge('image_batcher', image_batcher.stats)
+else:
+    image_batcher = None
+
+if webhook_intake.WEBHOOK_INTAKE == 'queue':
+    # webhook 只驗證簽章並排入佇列就返回，事件由背景 thread 處理
+    webhook_queue = webhook_intake.WebhookIntake(handler, job_store)
+    metrics.register_gauge('webhook', webhook_queue.stats)
+else:
+    webhook_queue = None
+
+if EXECUTION_MODE == 'asyncio':
+    async_runner = AsyncJobRunner(ASYNC_CONCURRENCY, JOB_QUEUE_SIZE, on_start=init_async_clients)
+else:
+    async_runner = None
 
 
 @app.route("/", methods=['GET'])
@@ -1200,7 +1928,26 @@ def health_check():
     return 'Line Bot is running!', 200
 
 
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    """背景工作 pool 狀態與執行期指標"""
+    return jsonify({
+        'pools': async_runner.stats() if async_runner else dispatcher.stats(),
+        **metrics.snapshot()
+    })
+
+
 if __name__ == "__main__":
     # 在本地開發時使用
+    # debug 模式的 reloader 會在子程序重新執行本程式，只在實際提供服務的子程序恢復未完成的工作
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        notion_schemas.start(NOTION_DATABASE_IDS)
+        transcriber.start()
+        job_store.start(on_recover=resume_job)
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
+else:
+    # 由 WSGI 伺服器（例如 gunicorn）載入時，啟動後立即載入 database 結構與轉錄模型，並恢復未完成的工作
+    notion_schemas.start(NOTION_DATABASE_IDS)
+    transcriber.start()
+    job_store.start(on_recover=resume_job)
@@ -0,0 +1,111 @@
+"""
+asyncio 背景工作執行模組
+在獨立的 thread 中執行單一 event loop，所有背景工作以 coroutine 形式共用這個 loop，
+每種工作類型以 semaphore 限制同時執行數量，並以等待中的工作數量上限提供背壓
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncJobRunner:
+    """以單一 event loop 執行背景 coroutine 的執行器"""
+
+    def __init__(self, concurrency, queue_size, on_start=None):
+        """
+        Args:
+            concurrency: 各工作類型同時執行的上限，例如 {'audio': 20, 'web': 50}
+            queue_size: 各工作類型等待中的工作數量上限，超過即拒絕新工作
+            on_start: loop 啟動後執行的 coroutine function（用於建立非同步 client）
+        """
+        self.concurrency = dict(concurrency)
+        self.queue_size = queue_size
+        self._on_start = on_start
+
+        self._lock = threading.Lock()
+        self._stats = {
+            kind: {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'running': 0, 'waiting': 0}
+            for kind in self.concurrency
+        }
+        self._semaphores = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name='async-job-runner')
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphores = {kind: asyncio.Semaphore(limit) for kind, limit in self.concurrency.items()}
+        if self._on_start:
+            try:
+                self._loop.run_until_complete(self._on_start())
+            except Exception as e:
+                logger.error(f"初始化非同步 client 時發生錯誤: {str(e)}")
+        self._ready.set()
+        self._loop.run_forever()
+
+    def submit(self, kind, coro_func, *args):
+        """
+        提交 coroutine 工作（可從任意 thread 呼叫）
+
+        Returns:
+            bool: 工作被接受時返回 True，等待中的工作已達上限時返回 False
+        """
+        if kind not in self._stats:
+            raise ValueError(f"未知的工作類型：{kind}")
+
+        with self._lock:
+            stats = self._stats[kind]
+            stats['submitted'] += 1
+            if stats['running'] + stats['waiting'] >= self.concurrency[kind] + self.queue_size:
+                stats['rejected'] += 1
+                metrics.incr(f"pool.{kind}.rejected")
+                logger.warning(f"{kind} 工作已滿載，拒絕新工作")
+                return False
+            stats['waiting'] += 1
+
+        asyncio.run_coroutine_threadsafe(self._run(kind, coro_func, args, time.perf_counter()), self._loop)
+        return True
+
+    async def _run(self, kind, coro_func, args, enqueued_at):
+        async with self._semaphores[kind]:
+            with self._lock:
+                self._stats[kind]['waiting'] -= 1
+                self._stats[kind]['running'] += 1
+
+            metrics.observe(f"pool.{kind}.wait", time.perf_counter() - enqueued_at)
+            start = time.perf_counter()
+            try:
+                await coro_func(*args)
+                succeeded = True
+            except Exception as e:
+                succeeded = False
+                logger.error(f"{kind} 非同步工作發生錯誤: {str(e)}")
+            finally:
+                metrics.observe(f"pool.{kind}.run", time.perf_counter() - start)
+                with self._lock:
+                    self._stats[kind]['running'] -= 1
+                    self._stats[kind]['completed' if succeeded else 'failed'] += 1
+
+    def stats(self):
+        """取得各工作類型的即時狀態"""
+        with self._lock:
+            result = {}
+            for kind, stats in self._stats.items():
+                capacity = self.concurrency[kind] + self.queue_size
+                result[kind] = {
+                    'concurrency': self.concurrency[kind],
+                    'queue_size': self.queue_size,
+                    'saturation': round((stats['running'] + stats['waiting']) / capacity, 3),
+                    **stats
+                }
+            return result
@@ -0,0 +1,340 @@
+"""
+語音處理模組
+LINE 語音檔以串流方式直接下載到記憶體（超過 AUDIO_DOWNLOAD_MAX_BYTES 立即中止），
+再以帶有檔名的 bytes 交給轉錄 API，整個流程不寫入磁碟。
+少數仍需要實體檔案的步驟（例如交給外部程式處理）使用 temporary_audio_file，
+確保不論成功或失敗都會刪除臨時檔案。
+
+長錄音（超過 AUDIO_SEGMENT_SECONDS）或超過單次轉錄大小上限（AUDIO_MAX_BYTES，Whisper 為 25MB）的錄音
+以 ffmpeg 偵測靜音，在目標長度附近的靜音處切段，每段都不超過大小上限，各段同時轉錄後依順序合併；
+未安裝 ffmpeg 或切段失敗時整段送出（超過大小上限時改為通知使用者）。
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+import http_client
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 下載語音檔的大小上限，限制每個語音工作使用的記憶體
+AUDIO_DOWNLOAD_MAX_BYTES = int(os.getenv('AUDIO_DOWNLOAD_MAX_BYTES', 200 * 1024 * 1024))
+# 單次轉錄請求的大小上限（Whisper API 的上限為 25MB），較大的錄音切段後每段不超過此大小
+AUDIO_MAX_BYTES = int(os.getenv('AUDIO_MAX_BYTES', 25 * 1024 * 1024))
+# 依位元率估算每段長度時保留的餘裕（可變位元率的錄音各段大小不完全相同）
+AUDIO_SIZE_MARGIN = 0.9
+AUDIO_CHUNK_SIZE = 256 * 1024
+
+# 長錄音切段設定
+AUDIO_SEGMENT_SECONDS = float(os.getenv('AUDIO_SEGMENT_SECONDS', 120))  # 每段的目標長度，0 表示不切段
+AUDIO_SEGMENT_CONCURRENCY = int(os.getenv('AUDIO_SEGMENT_CONCURRENCY', 4))  # 同時轉錄的段數
+AUDIO_SILENCE_NOISE = os.getenv('AUDIO_SILENCE_NOISE', '-35dB')  # 低於此音量視為靜音
+AUDIO_SILENCE_MIN_SECONDS = float(os.getenv('AUDIO_SILENCE_MIN_SECONDS', 0.4))  # 靜音的最短長度
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFMPEG_TIMEOUT = 120
+
+_SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+_SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+_DURATION = re.compile(r'Duration: (\d+):(\d+):([\d.]+)')
+
+# LINE 訊息內容（語音、圖片等）的下載網址
+LINE_CONTENT_URL = 'https://api-data.line.me/v2/bot/message/{message_id}/content'
+
+
+class AudioTooLargeError(Exception):
+    """語音檔超過下載上限，或無法切成不超過單次轉錄上限的分段"""
+
+    def __init__(self, size, max_bytes):
+        super().__init__(f"語音檔超過 {max_bytes / 1024 / 1024:.0f}MB 上限（{size / 1024 / 1024:.1f}MB）")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+def detect_audio_extension(data):
+    """依 magic bytes 判斷語音格式，無法判斷時返回 m4a（LINE 語音訊息的格式）"""
+    if data[4:8] == b'ftyp':
+        return 'm4a'
+    if data.startswith(b'OggS'):
+        return 'ogg'
+    if data.startswith(b'ID3') or data[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return 'mp3'
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return 'wav'
+    if data.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm'
+    return 'm4a'
+
+
+def audio_file(data):
+    """
+    轉錄 API 使用的檔案參數：(檔名, bytes)
+
+    API 依副檔名判斷格式，因此檔名依實際格式決定
+    """
+    return f"audio.{detect_audio_extension(data)}", data
+
+
+def _check_content_length(value, max_bytes):
+    """回應標頭已宣告的大小超過上限時，不讀取內容直接中止"""
+    if value is not None and value.isdigit() and int(value) > max_bytes:
+        raise AudioTooLargeError(int(value), max_bytes)
+
+
+def _record_download(size):
+    metrics.incr('audio.downloaded')
+    metrics.incr('audio.bytes', size)
+
+
+def download_audio(message_id, access_token, max_bytes=AUDIO_DOWNLOAD_MAX_BYTES):
+    """
+    以共用的 HTTP 連線池串流下載 LINE 語音檔
+
+    Raises:
+        AudioTooLargeError: 檔案超過 max_bytes（讀取超過上限時立即中止，不會讀完整個檔案）
+    """
+    session = http_client.get_session()
+    chunks = []
+    size = 0
+    with metrics.timer('audio.download'):
+        with session.get(
+            LINE_CONTENT_URL.format(message_id=message_id),
+            headers={'Authorization': f'Bearer {access_token}'},
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            _check_content_length(response.headers.get('Content-Length'), max_bytes)
+            for chunk in response.iter_content(AUDIO_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    metrics.incr('audio.too_large')
+                    raise AudioTooLargeError(size, max_bytes)
+                chunks.append(chunk)
+
+    _record_download(size)
+    return b''.join(chunks)
+
+
+async def download_audio_async(http_session, message_id, access_token, max_bytes=AUDIO_DOWNLOAD_MAX_BYTES):
+    """download_audio 的非同步版本（使用 aiohttp ClientSession）"""
+    chunks = []
+    size = 0
+    with metrics.timer('audio.download'):
+        async with http_session.get(
+            LINE_CONTENT_URL.format(message_id=message_id),
+            headers={'Authorization': f'Bearer {access_token}'}
+        ) as response:
+            response.raise_for_status()
+            _check_content_length(response.headers.get('Content-Length'), max_bytes)
+            async for chunk in response.content.iter_chunked(AUDIO_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    metrics.incr('audio.too_large')
+                    raise AudioTooLargeError(size, max_bytes)
+                chunks.append(chunk)
+
+    _record_download(size)
+    return b''.join(chunks)
+
+
+@contextlib.contextmanager
+def temporary_audio_file(data, suffix=None):
+    """
+    將語音內容寫入臨時檔案並返回路徑，離開 with 區塊時（包含發生例外）一定刪除
+
+    Args:
+        suffix: 副檔名（含「.」），預設依內容判斷
+    """
+    suffix = suffix or f".{detect_audio_extension(data)}"
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix='audio-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"刪除臨時語音檔 {path} 時發生錯誤: {str(e)}")
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_available():
+    """是否可以執行 ffmpeg（只檢查一次）"""
+    if shutil.which(FFMPEG_PATH) is None:
+        logger.info(f"找不到 ffmpeg（{FFMPEG_PATH}），長錄音不切段直接轉錄")
+        return False
+    return True
+
+
+def parse_silences(output):
+    """解析 ffmpeg silencedetect 的輸出，返回 [(開始秒數, 結束秒數)]"""
+    silences = []
+    start = None
+    for line in output.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def parse_duration(output):
+    """由 ffmpeg 輸出的「Duration: HH:MM:SS.xx」取得錄音長度（秒），沒有時返回 None"""
+    match = _DURATION.search(output)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def segment_seconds_for(size, duration, max_bytes, segment_seconds=AUDIO_SEGMENT_SECONDS):
+    """
+    每段的目標長度：不超過 segment_seconds，且依平均位元率估算每段不超過 max_bytes
+
+    plan_cut_points 的分段最長可達目標長度的 125%，因此依大小估算的長度再除以 1.25
+    """
+    targets = [segment_seconds] if segment_seconds > 0 else []
+    if max_bytes and size > max_bytes * AUDIO_SIZE_MARGIN:
+        targets.append(duration * max_bytes * AUDIO_SIZE_MARGIN / size / 1.25)
+    return min(targets) if targets else 0
+
+
+def plan_cut_points(duration, silences, segment_seconds=AUDIO_SEGMENT_SECONDS):
+    """
+    決定切點：每段在目標長度附近的靜音中點切開
+
+    候選範圍為目標長度的 50%～125%，取最接近目標長度的靜音；範圍內沒有靜音時直接在目標長度切開。
+    剩餘長度不超過 segment_seconds 的 125% 時不再切段，避免最後一段過短
+
+    Returns:
+        list: 依序排列的切點（秒）
+    """
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+    cuts = []
+    last = 0.0
+    while duration - last > segment_seconds * 1.25:
+        target = last + segment_seconds
+        candidates = [
+            point for point in midpoints
+            if last + segment_seconds * 0.5 <= point <= target + segment_seconds * 0.25
+        ]
+        cut = min(candidates, key=lambda point: abs(point - target)) if candidates else target
+        cuts.append(cut)
+        last = cut
+    return cuts
+
+
+def _run_ffmpeg(args):
+    return subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-nostdin', *args],
+        capture_output=True, text=True, timeout=FFMPEG_TIMEOUT, check=True
+    )
+
+
+def detect_silences(path):
+    """
+    以 ffmpeg silencedetect 找出錄音中的靜音區間
+
+    Returns:
+        tuple: ([(開始秒數, 結束秒數)], ffmpeg 讀到的錄音長度（秒，無法取得時為 None）)
+    """
+    result = _run_ffmpeg([
+        '-i', path,
+        '-af', f"silencedetect=noise={AUDIO_SILENCE_NOISE}:d={AUDIO_SILENCE_MIN_SECONDS}",
+        '-f', 'null', '-'
+    ])
+    return parse_silences(result.stderr), parse_duration(result.stderr)
+
+
+def split_audio(data, duration_seconds, segment_seconds=AUDIO_SEGMENT_SECONDS, max_bytes=AUDIO_MAX_BYTES):
+    """
+    在靜音處將錄音切成多段（不重新編碼），臨時檔案在返回前全部刪除
+
+    每段的長度依 segment_seconds 與 max_bytes（依平均位元率估算）決定；
+    duration_seconds 為 0 或 None 時使用 ffmpeg 讀到的長度
+
+    Returns:
+        list: 依時間順序排列的各段 bytes；不需要切段時只有原始內容
+    """
+    extension = detect_audio_extension(data)
+    with temporary_audio_file(data) as path, tempfile.TemporaryDirectory(prefix='audio-segments-') as directory:
+        with metrics.timer('audio.silence_detect'):
+            silences, detected_duration = detect_silences(path)
+        duration_seconds = duration_seconds or detected_duration
+        if not duration_seconds:
+            return [data]
+        cuts = plan_cut_points(
+            duration_seconds, silences, segment_seconds_for(len(data), duration_seconds, max_bytes, segment_seconds)
+        )
+        if not cuts:
+            return [data]
+
+        with metrics.timer('audio.split'):
+            _run_ffmpeg([
+                '-i', path, '-map', '0:a', '-c', 'copy',
+                '-f', 'segment', '-segment_times', ','.join(f"{cut:.3f}" for cut in cuts),
+                '-reset_timestamps', '1',
+                os.path.join(directory, f"segment%03d.{extension}")
+            ])
+        segments = []
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), 'rb') as segment_file:
+                segments.append(segment_file.read())
+    return segments
+
+
+def segment_audio(data, duration_seconds, max_bytes=AUDIO_MAX_BYTES):
+    """
+    依錄音長度與大小決定是否切段
+
+    未超過 AUDIO_SEGMENT_SECONDS 與 max_bytes、未安裝 ffmpeg 或切段失敗時返回 [data]（整段轉錄）
+
+    Args:
+        max_bytes: 單次轉錄的大小上限，None 表示沒有上限（例如本機轉錄）
+
+    Raises:
+        AudioTooLargeError: 錄音超過 max_bytes 且無法切成每段都不超過 max_bytes
+    """
+    too_large = max_bytes is not None and len(data) > max_bytes
+    too_long = AUDIO_SEGMENT_SECONDS > 0 and duration_seconds > AUDIO_SEGMENT_SECONDS * 1.25
+    if not too_large and not too_long:
+        return [data]
+    if not ffmpeg_available():
+        if too_large:
+            raise AudioTooLargeError(len(data), max_bytes)
+        return [data]
+    try:
+        segments = split_audio(data, duration_seconds, max_bytes=max_bytes)
+    except (OSError, subprocess.SubprocessError) as e:
+        metrics.incr('audio.split_failed')
+        if too_large:
+            logger.warning(f"語音切段失敗: {str(e)}")
+            raise AudioTooLargeError(len(data), max_bytes) from e
+        logger.warning(f"語音切段失敗，改為整段轉錄: {str(e)}")
+        return [data]
+    largest = max(len(segment) for segment in segments)
+    if max_bytes is not None and largest > max_bytes:
+        # 位元率變化大或沒有可切的位置時，仍可能有分段超過上限
+        metrics.incr('audio.segment_too_large')
+        raise AudioTooLargeError(largest, max_bytes)
+    metrics.incr('audio.segmented')
+    metrics.incr('audio.segments', len(segments))
+    return segments
+
+
+def merge_transcripts(texts):
+    """依順序合併各段的轉錄文字（每段一行，略過空白段落）"""
+    return '\n'.join(text.strip() for text in texts if text and text.strip())
@@ -0,0 +1,103 @@
+"""
+聚合視窗模組
+依 key 收集短時間內陸續到達的項目（例如同一使用者一次傳送的多張圖片），
+收齊預期數量、達到上限，或一段時間內沒有新項目時，一次交給 on_flush 處理
+"""
+
+import logging
+import threading
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Group:
+    __slots__ = ('items', 'expected', 'timer')
+
+    def __init__(self, expected):
+        self.items = []
+        self.expected = expected
+        self.timer = None
+
+
+class AggregationWindow:
+    """
+    thread-safe 的聚合視窗
+
+    每收到一個項目就重新計時 window_seconds 秒（相簿的圖片會在數秒內陸續送達），
+    計時結束、收齊 expected 個項目或達到 max_items 時呼叫 on_flush(key, items)。
+    on_flush 在呼叫 add 的 thread 或計時器的 thread 中執行，應盡快返回（例如只提交工作）
+    """
+
+    def __init__(self, name, window_seconds, on_flush, max_items=20):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.on_flush = on_flush
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def add(self, key, item, expected=None):
+        """
+        加入一個項目
+
+        Returns:
+            bool: 是否為該 key 目前這一批的第一個項目
+        """
+        with self._lock:
+            group = self._groups.get(key)
+            first = group is None
+            if first:
+                group = _Group(expected)
+                self._groups[key] = group
+            elif group.timer is not None:
+                group.timer.cancel()
+            group.items.append(item)
+
+            full = len(group.items) >= self.max_items or (
+                group.expected is not None and len(group.items) >= group.expected
+            )
+            if full:
+                del self._groups[key]
+            else:
+                group.timer = threading.Timer(self.window_seconds, self._expire, args=(key, group))
+                group.timer.daemon = True
+                group.timer.start()
+
+        if full:
+            self._deliver(key, group.items, 'full')
+        return first
+
+    def _expire(self, key, group):
+        with self._lock:
+            # 計時期間已收齊或被新的計時器取代時不處理
+            if self._groups.get(key) is not group or group.timer is not threading.current_thread():
+                return
+            del self._groups[key]
+        self._deliver(key, group.items, 'timeout')
+
+    def _deliver(self, key, items, reason):
+        metrics.incr(f"batch.{self.name}.flushed_{reason}")
+        metrics.incr(f"batch.{self.name}.items", len(items))
+        try:
+            self.on_flush(key, items)
+        except Exception as e:
+            logger.error(f"處理聚合項目 {key} 時發生錯誤: {str(e)}")
+
+    def flush_all(self):
+        """立即送出所有等待中的項目（例如程序結束前）"""
+        with self._lock:
+            groups = list(self._groups.items())
+            self._groups.clear()
+        for key, group in groups:
+            if group.timer is not None:
+                group.timer.cancel()
+            self._deliver(key, group.items, 'forced')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_groups': len(self._groups),
+                'pending_items': sum(len(group.items) for group in self._groups.values())
+            }
@@ -0,0 +1,104 @@
+"""
+長錄音切段驗證與效能腳本
+以 ffmpeg 產生含有固定間隔靜音的測試錄音，執行 audio.segment_audio 的實際切段流程（silencedetect +
+segment muxer，不重新編碼），檢查切段結果並量測耗時：
+- long：超過 AUDIO_SEGMENT_SECONDS 的低位元率 m4a，依長度切段
+- large：長度未超過 AUDIO_SEGMENT_SECONDS 1.25 倍、但超過單次轉錄大小上限的 wav，依大小切段
+
+檢查項目：每段都不超過大小上限、各段長度總和與原始錄音相同（誤差 1 秒內）、切點落在靜音中。
+任一項檢查失敗時以非 0 結束；未安裝 ffmpeg 時略過並以 0 結束
+
+執行方式：
+    python benchmarks/audio_split_benchmark.py [--long-minutes 10] [--large-mb 12] [--max-mb 8]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio
+
+# 測試錄音：每 9 秒中前 8 秒為 440Hz 音訊、最後 1 秒靜音
+TONE_SECONDS = 8
+PERIOD_SECONDS = 9
+
+
+def generate(path, seconds, codec_args):
+    """以 ffmpeg 產生含週期性靜音的測試錄音"""
+    subprocess.run(
+        [
+            audio.FFMPEG_PATH, '-hide_banner', '-nostdin', '-y',
+            '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+            '-af', f"volume='if(lt(mod(t,{PERIOD_SECONDS}),{TONE_SECONDS}),1,0)':eval=frame",
+            *codec_args, path
+        ],
+        capture_output=True, check=True
+    )
+    with open(path, 'rb') as audio_file:
+        return audio_file.read()
+
+
+def segment_duration(data):
+    with audio.temporary_audio_file(data) as path:
+        _, duration = audio.detect_silences(path)
+    return duration
+
+
+def run_case(name, data, duration, max_bytes):
+    start = time.perf_counter()
+    segments = audio.segment_audio(data, duration, max_bytes)
+    elapsed = time.perf_counter() - start
+
+    durations = [segment_duration(segment) for segment in segments]
+    # 切點（各段結束的累計時間，最後一段除外）應落在每個週期的靜音區間中
+    cut_points = [sum(durations[:index + 1]) for index in range(len(durations) - 1)]
+    checks = {
+        'split': len(segments) > 1,
+        'size': max_bytes is None or max(len(segment) for segment in segments) <= max_bytes,
+        'duration': abs(sum(durations) - duration) <= 1,
+        'silence': all(point % PERIOD_SECONDS >= TONE_SECONDS - 0.1 for point in cut_points)
+    }
+    print(
+        f"{name:<6} {len(data) / 1024 / 1024:>7.1f}MB {duration:>6.0f}s -> {len(segments):>2} 段  "
+        f"最大 {max(len(segment) for segment in segments) / 1024 / 1024:.1f}MB  "
+        f"長度 {', '.join(f'{value:.0f}' for value in durations)}s  耗時 {elapsed:.2f}s"
+    )
+    failed = [check for check, ok in checks.items() if not ok]
+    if failed:
+        print(f"       檢查失敗：{', '.join(failed)}")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='驗證長錄音與大檔案的切段結果並量測耗時')
+    parser.add_argument('--long-minutes', type=float, default=10, help='long 測試錄音的分鐘數')
+    parser.add_argument('--large-mb', type=float, default=12, help='large 測試錄音的大小（MB）')
+    parser.add_argument('--max-mb', type=float, default=8, help='large 測試使用的單次轉錄大小上限（MB）')
+    args = parser.parse_args()
+
+    if not audio.ffmpeg_available():
+        print(f"找不到 ffmpeg（{audio.FFMPEG_PATH}），略過切段測試")
+        return 0
+
+    ok = True
+    with tempfile.TemporaryDirectory(prefix='audio-split-benchmark-') as directory:
+        long_seconds = args.long_minutes * 60
+        data = generate(os.path.join(directory, 'long.m4a'), long_seconds, ['-c:a', 'aac', '-b:a', '64k'])
+        ok &= run_case('long', data, long_seconds, audio.AUDIO_MAX_BYTES)
+
+        # 44.1kHz 16-bit 單聲道 wav 約每秒 88KB；長度維持在依長度切段的門檻內，只因大小而切段
+        large_seconds = min(args.large_mb * 1024 * 1024 / 88200, audio.AUDIO_SEGMENT_SECONDS * 1.25 or float('inf'))
+        data = generate(os.path.join(directory, 'large.wav'), large_seconds, ['-c:a', 'pcm_s16le'])
+        ok &= run_case('large', data, large_seconds, int(args.max_mb * 1024 * 1024))
+
+    print('全部檢查通過' if ok else '部分檢查失敗')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
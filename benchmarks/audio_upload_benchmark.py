@@ -0,0 +1,114 @@
+"""
+語音上傳路徑效能比較腳本
+以本機的假轉錄 API（OpenAI client 的 base_url 指向本機 HTTP server），比較兩種將語音檔交給 Whisper 的方式：
+- tempfile：原本的方式，寫入 NamedTemporaryFile 後重新開啟上傳，再刪除檔案
+- memory：以 (檔名, bytes) 直接上傳，不寫入磁碟
+
+輸出每種大小的中位數耗時與 Python 記憶體配置的峰值（tracemalloc，另外單獨執行一次量測）
+
+執行方式：
+    python benchmarks/audio_upload_benchmark.py [--sizes 1,5,20] [--runs 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio
+
+
+class FakeTranscriptionHandler(BaseHTTPRequestHandler):
+    """讀完上傳內容後返回固定的轉錄結果"""
+
+    def do_POST(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+        body = json.dumps({'text': 'ok'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTranscriptionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def fake_audio(size):
+    """m4a 開頭（ftyp）加上隨機內容"""
+    header = b'\x00\x00\x00\x20ftypM4A \x00\x00\x00\x00'
+    return header + os.urandom(size - len(header))
+
+
+def upload_tempfile(client, data):
+    """原本的路徑：寫入臨時檔案、重新開啟上傳、刪除"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.m4a') as temp_audio:
+        temp_audio.write(data)
+        temp_audio_path = temp_audio.name
+    with open(temp_audio_path, 'rb') as audio_file:
+        result = client.audio.transcriptions.create(model='whisper-1', file=audio_file, language='zh')
+    os.unlink(temp_audio_path)
+    return result
+
+
+def upload_memory(client, data):
+    """新的路徑：直接以記憶體中的內容上傳"""
+    return client.audio.transcriptions.create(model='whisper-1', file=audio.audio_file(data), language='zh')
+
+
+def measure(func, client, data, runs):
+    func(client, data)  # 暖身（建立連線）
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(client, data)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(client, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較語音上傳路徑的耗時與記憶體用量')
+    parser.add_argument('--sizes', default='1,5,20', help='語音檔大小（MB，以逗號分隔）')
+    parser.add_argument('--runs', type=int, default=10, help='每種大小的執行次數')
+    args = parser.parse_args()
+
+    from openai import OpenAI
+
+    server = start_server()
+    client = OpenAI(api_key='benchmark', base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    paths = {'tempfile': upload_tempfile, 'memory': upload_memory}
+
+    print(f"{'size':>6}  {'path':<9} {'median ms':>10} {'peak MB':>8}")
+    for size_mb in [float(size) for size in args.sizes.split(',')]:
+        data = fake_audio(int(size_mb * 1024 * 1024))
+        for name, func in paths.items():
+            median, peak = measure(func, client, data, args.runs)
+            print(f"{size_mb:>5g}M  {name:<9} {median * 1000:>10.1f} {peak / 1024 / 1024:>8.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
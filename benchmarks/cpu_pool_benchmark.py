@@ -0,0 +1,133 @@
+"""
+CPU process pool 效能比較腳本
+在背景 thread 持續執行 CPU 密集的階段（圖片解碼縮放、HTML 解析）時，量測模擬 webhook 處理
+（驗證簽章 + 解析 JSON）的延遲，比較以下兩種方式：
+- inline：CPU_POOL_WORKERS=0，所有階段在同一個 process 中執行，與 webhook thread 競爭 GIL
+- pool：CPU 密集的階段交給 process pool
+
+執行方式：
+    python benchmarks/cpu_pool_benchmark.py [--workers 2] [--jobs 4] [--seconds 10]
+
+圖片階段需要 Pillow，HTML 解析使用 benchmarks/fixtures 中保存的頁面
+"""
+
+import argparse
+import base64
+import glob
+import hashlib
+import hmac
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cpu_pool
+import extractors
+import images
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PROBE_INTERVAL = 0.005
+
+SECRET = b'benchmark-channel-secret'
+WEBHOOK_BODY = json.dumps({
+    'destination': 'U' + '0' * 32,
+    'events': [{
+        'type': 'message',
+        'message': {'type': 'text', 'id': str(index), 'text': 'https://example.com/article'},
+        'timestamp': 1700000000000,
+        'source': {'type': 'user', 'userId': 'U' + '1' * 32},
+        'replyToken': 'r' * 32,
+        'mode': 'active'
+    } for index in range(3)]
+}).encode()
+
+
+def handle_webhook():
+    """模擬 webhook 的同步處理：驗證簽章並解析事件"""
+    signature = base64.b64encode(hmac.new(SECRET, WEBHOOK_BODY, hashlib.sha256).digest())
+    hmac.compare_digest(signature, signature)
+    return json.loads(WEBHOOK_BODY)
+
+
+def sample_image():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    output = io.BytesIO()
+    Image.effect_noise((4000, 3000), 60).convert('RGB').save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def heavy_job(stop, pages, image):
+    """重複執行 CPU 密集的階段（經由 cpu_pool，未啟用時在目前的 thread 中執行）"""
+    while not stop.is_set():
+        if image is not None:
+            images.prepare_image(image)
+        for page in pages:
+            cpu_pool.run(extractors.extract_page, 'text/html', page, 200000, 'readability')
+
+
+def measure(seconds, jobs, pages, image):
+    stop = threading.Event()
+    threads = [threading.Thread(target=heavy_job, args=(stop, pages, image)) for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        # 從預定的喚醒時間開始計算，包含等待 GIL 的時間
+        scheduled = time.perf_counter() + PROBE_INTERVAL
+        time.sleep(PROBE_INTERVAL)
+        handle_webhook()
+        latencies.append(time.perf_counter() - scheduled)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'max': latencies[-1],
+        'samples': len(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較 CPU 密集階段在同一個 process 與 process pool 中執行時的 webhook 延遲')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1), help='process pool 的 worker 數量')
+    parser.add_argument('--jobs', type=int, default=4, help='同時執行 CPU 密集階段的背景 thread 數')
+    parser.add_argument('--seconds', type=float, default=10, help='每種方式的量測秒數')
+    args = parser.parse_args()
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as page_file:
+            pages.append(page_file.read())
+    image = sample_image()
+    if image is None:
+        print('未安裝 Pillow，只測試 HTML 解析')
+
+    results = {'idle': measure(min(args.seconds, 3), 0, pages, image)}
+    results['inline'] = measure(args.seconds, args.jobs, pages, image)
+    cpu_pool.start(args.workers)
+    results['pool'] = measure(args.seconds, args.jobs, pages, image)
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'samples':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<8} {result['p50'] * 1000:>8.3f} {result['p99'] * 1000:>8.3f} "
+            f"{result['max'] * 1000:>8.3f} {result['samples']:>8}"
+        )
+    print(f"\n背景 {args.jobs} 個 thread，pool {args.workers} workers；cpu_pool 統計：{cpu_pool.stats()}")
+
+
+if __name__ == '__main__':
+    main()
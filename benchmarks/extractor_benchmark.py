@@ -0,0 +1,110 @@
+"""
+網頁文字提取器效能比較腳本
+以 benchmarks/fixtures 中保存的 HTML 頁面，比較各提取器的 CPU 時間與輸出長度（估計的 token 數）
+
+執行方式：
+    python benchmarks/extractor_benchmark.py [--runs 30] [--show]
+
+比較的提取器：
+- bs4：原本的 BeautifulSoup html.parser 提取方式（需要安裝 beautifulsoup4，作為基準）
+- stream：標準函式庫的增量式解析器
+- readability：lxml 主要內容評分
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chunking
+import extractors
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 與 scrapers.MAX_CONTENT_CHARS 的預設值相同（不匯入 scrapers，避免讀取 .env 設定）
+MAX_CONTENT_CHARS = 200000
+
+
+def extract_with_bs4(html):
+    """原本的提取方式：BeautifulSoup html.parser + 固定的移除元素清單"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form']):
+        element.decompose()
+    text = soup.get_text(separator='\n', strip=True)
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return '\n'.join(lines)
+
+
+def decode_fixture(data):
+    """與實際抓取相同的方式判斷編碼（fixture 沒有 HTTP header，只依 BOM 與 <meta charset>）"""
+    charset = extractors.sniff_charset(data) or 'utf-8'
+    return data.decode(charset, errors='replace')
+
+
+def available_extractors():
+    candidates = {
+        'bs4': extract_with_bs4,
+        'stream': lambda html: extractors.extract_text(html, 'stream', MAX_CONTENT_CHARS),
+        'readability': lambda html: extractors.extract_text(html, 'readability', MAX_CONTENT_CHARS),
+    }
+    available = {}
+    for name, func in candidates.items():
+        try:
+            func('<p>test</p>')
+            available[name] = func
+        except ImportError as e:
+            print(f"⚠️  略過 {name}：{e}")
+    return available
+
+
+def benchmark(func, html, runs):
+    durations = []
+    text = ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = func(html)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較網頁文字提取器的效能')
+    parser.add_argument('--runs', type=int, default=30, help='每個頁面重複執行的次數（取中位數）')
+    parser.add_argument('--show', action='store_true', help='顯示各提取器輸出的前幾行')
+    args = parser.parse_args()
+
+    extractor_funcs = available_extractors()
+    fixtures = sorted(name for name in os.listdir(FIXTURES_DIR) if name.endswith('.html'))
+
+    print(f"{'頁面':<22}{'提取器':<14}{'中位數(ms)':>12}{'字元數':>10}{'摘要 tokens':>14}")
+    totals = {name: [0.0, 0] for name in extractor_funcs}
+    for fixture in fixtures:
+        with open(os.path.join(FIXTURES_DIR, fixture), 'rb') as f:
+            data = f.read()
+        html = decode_fixture(data)
+
+        for name, func in extractor_funcs.items():
+            median, text = benchmark(func, html, args.runs)
+            # 提取結果全部會送進摘要（長文會分段），token 數即摘要成本
+            tokens = chunking.count_tokens(text)
+            totals[name][0] += median
+            totals[name][1] += tokens
+            print(f"{fixture:<22}{name:<14}{median * 1000:>12.2f}{len(text):>10}{tokens:>14}")
+
+            if args.show:
+                preview = text.splitlines()[:5]
+                print('    ' + '\n    '.join(preview))
+        print()
+
+    print('合計：')
+    for name, (duration, tokens) in totals.items():
+        print(f"  {name:<14}{duration * 1000:>10.2f} ms{tokens:>10} tokens")
+
+
+if __name__ == '__main__':
+    main()
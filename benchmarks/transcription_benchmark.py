@@ -0,0 +1,139 @@
+"""
+語音轉文字後端效能比較腳本
+以實際的語音檔（例如從 LINE 下載的 .m4a）比較各轉錄後端的延遲、吞吐量與費用
+
+執行方式：
+    python benchmarks/transcription_benchmark.py samples/*.m4a [--backends openai,local] [--concurrency 4]
+
+比較的後端：
+- openai：whisper-1 API（需要 OPENAI_API_KEY，會產生實際費用）
+- local：faster-whisper 本機 CPU 轉錄（需要安裝 faster-whisper，模型設定同 LOCAL_WHISPER_* 環境變數）
+
+輸出：
+- 延遲：逐一轉錄每個檔案的中位數耗時與 real-time factor（耗時 / 錄音長度，越小越快）
+- 吞吐量：以 --concurrency 個 thread 同時轉錄所有檔案時，每分鐘處理的錄音分鐘數
+- 費用：openai 依 whisper-1 每分鐘的價格估計；local 沒有 API 費用，另外列出消耗的 CPU 秒數
+錄音長度以 PyAV（faster-whisper 的相依套件）或 ffprobe 取得
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import transcription
+
+
+def audio_duration(path):
+    """錄音長度（秒），無法取得時返回 None"""
+    try:
+        import av
+
+        with av.open(path) as container:
+            if container.duration:
+                return container.duration / 1_000_000
+    except ImportError:
+        pass
+    if shutil.which('ffprobe'):
+        result = subprocess.run(
+            ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', path],
+            capture_output=True, text=True
+        )
+        duration = json.loads(result.stdout or '{}').get('format', {}).get('duration')
+        return float(duration) if duration else None
+    return None
+
+
+def create_backend(name):
+    if name == 'openai':
+        from openai import OpenAI
+
+        return transcription.OpenAITranscriber(OpenAI())
+    return transcription.create_backend(name)
+
+
+def benchmark_backend(backend, samples, concurrency):
+    """返回 (各檔案延遲, 吞吐量測試的總耗時, CPU 秒數)"""
+    # 暖機：local 載入模型並完成第一次推論，openai 建立連線
+    start = time.perf_counter()
+    backend.transcribe(samples[0][1])
+    print(f"  暖機 {time.perf_counter() - start:.1f}s")
+
+    cpu_start = time.process_time()
+    latencies = []
+    for path, data, _ in samples:
+        start = time.perf_counter()
+        text = backend.transcribe(data)
+        latencies.append(time.perf_counter() - start)
+        print(f"  {os.path.basename(path)}: {latencies[-1]:.2f}s  {text[:40]!r}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(backend.transcribe, [data for _, data, _ in samples]))
+    wall = time.perf_counter() - start
+    return latencies, wall, time.process_time() - cpu_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較語音轉文字後端的延遲、吞吐量與費用')
+    parser.add_argument('files', nargs='+', help='語音檔路徑（.m4a、.mp3 等）')
+    parser.add_argument('--backends', default='openai,local', help='要比較的後端（以逗號分隔）')
+    parser.add_argument('--concurrency', type=int, default=4, help='吞吐量測試同時轉錄的數量')
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.files:
+        with open(path, 'rb') as audio_file:
+            samples.append((path, audio_file.read(), audio_duration(path)))
+    known = [duration for _, _, duration in samples if duration]
+    audio_minutes = sum(known) / 60 if len(known) == len(samples) else None
+    if audio_minutes is None:
+        print('無法取得部分檔案的錄音長度（需要 PyAV 或 ffprobe），略過 real-time factor 與費用')
+
+    results = []
+    for name in args.backends.split(','):
+        print(f"[{name}]")
+        try:
+            backend = create_backend(name)
+            latencies, wall, cpu_seconds = benchmark_backend(backend, samples, args.concurrency)
+        except Exception as e:
+            print(f"  無法執行：{str(e)}")
+            continue
+
+        rtf = [
+            latency / duration for latency, (_, _, duration) in zip(latencies, samples, strict=True) if duration
+        ] if audio_minutes else []
+        cost = audio_minutes * transcription.OPENAI_COST_PER_MINUTE if name == 'openai' and audio_minutes else 0.0
+        results.append((
+            name,
+            statistics.median(latencies),
+            statistics.median(rtf) if rtf else None,
+            audio_minutes / (wall / 60) if audio_minutes else None,
+            cost,
+            cpu_seconds
+        ))
+
+    print()
+    print(f"{'backend':<8} {'median s':>9} {'RTF':>6} {'audio min/min':>14} {'USD / run':>10} {'CPU s':>7}")
+    for name, latency, rtf, throughput, cost, cpu_seconds in results:
+        print(
+            f"{name:<8} {latency:>9.2f} {rtf if rtf is not None else float('nan'):>6.2f} "
+            f"{throughput if throughput is not None else float('nan'):>14.1f} {cost:>10.4f} {cpu_seconds:>7.1f}"
+        )
+    if audio_minutes:
+        print(f"\n樣本共 {len(samples)} 個檔案、{audio_minutes:.1f} 分鐘；USD / run 為逐一轉錄一輪的 API 費用")
+
+
+if __name__ == '__main__':
+    main()
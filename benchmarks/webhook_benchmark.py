@@ -0,0 +1,140 @@
+"""
+Webhook 回應延遲比較腳本
+以 Flask test client 同時送出多批已簽章的文字訊息 webhook（echo 回覆），
+LINE reply API 以固定延遲模擬（不會連線到 LINE），比較兩種接收方式的回應時間分布：
+- sync：原本的方式，webhook 在返回前解析事件並送出 reply
+- queue：WEBHOOK_INTAKE=queue，只驗證簽章、寫入 job store 並排入佇列就返回，回覆由背景 thread 送出
+
+執行方式：
+    python benchmarks/webhook_benchmark.py [--bursts 20] [--burst-size 20] [--reply-ms 150]
+
+未設定的 LINE / OpenAI / Notion 環境變數會以假的值代替，Notion 連線失敗的警告可忽略
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('LINE_CHANNEL_ACCESS_TOKEN', 'benchmark')
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ.setdefault('NOTION_API_KEY', 'benchmark')
+os.environ.setdefault('NOTION_DATABASE_ID', 'benchmark')
+os.environ.setdefault('NOTION_SUMMARY_DATABASE_ID', 'benchmark')
+os.environ.setdefault('NOTION_IMAGE_DATABASE_ID', 'benchmark')
+os.environ.setdefault('APIFY_API_KEY', 'benchmark')
+os.environ.setdefault('LINE_CHANNEL_SECRET', 'benchmark-channel-secret')
+os.environ.setdefault('JOB_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+os.environ.setdefault('WEBHOOK_LOG_SAMPLE_RATE', '0')
+
+import app as bot
+import webhook_intake
+
+
+class FakeMessagingApi:
+    """以固定延遲模擬 LINE Messaging API 的 reply / push"""
+    delay = 0.15
+    sent = 0
+    _lock = threading.Lock()
+
+    def __init__(self, api_client=None):
+        pass
+
+    def reply_message_with_http_info(self, request):
+        time.sleep(self.delay)
+        with self._lock:
+            FakeMessagingApi.sent += 1
+
+    push_message = reply_message_with_http_info
+
+
+def webhook_body(index):
+    return json.dumps({
+        'destination': 'U' + '0' * 32,
+        'events': [{
+            'type': 'message',
+            'message': {'type': 'text', 'id': str(index), 'quoteToken': 'q', 'text': f'echo {index}'},
+            'webhookEventId': f'event-{index}',
+            'deliveryContext': {'isRedelivery': False},
+            'timestamp': int(time.time() * 1000),
+            'source': {'type': 'user', 'userId': 'U' + '1' * 32},
+            'replyToken': f'reply-{index}',
+            'mode': 'active'
+        }]
+    })
+
+
+def sign(body):
+    secret = os.environ['LINE_CHANNEL_SECRET'].encode()
+    return base64.b64encode(hmac.new(secret, body.encode(), hashlib.sha256).digest()).decode()
+
+
+def run_bursts(bursts, burst_size):
+    client = bot.app.test_client()
+    latencies = []
+
+    def send(index):
+        body = webhook_body(index)
+        start = time.perf_counter()
+        response = client.post('/webhook', data=body, headers={
+            'X-Line-Signature': sign(body), 'Content-Type': 'application/json'
+        })
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=burst_size) as executor:
+        for burst in range(bursts):
+            latencies.extend(executor.map(send, range(burst * burst_size, (burst + 1) * burst_size)))
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies),
+        'p99': latencies[max(0, int(len(latencies) * 0.99) - 1)],
+        'max': latencies[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較 webhook 同步處理與佇列接收的回應延遲')
+    parser.add_argument('--bursts', type=int, default=20, help='送出的批次數')
+    parser.add_argument('--burst-size', type=int, default=20, help='每批同時送出的 webhook 數')
+    parser.add_argument('--reply-ms', type=float, default=150, help='模擬的 reply API 延遲（毫秒）')
+    args = parser.parse_args()
+
+    FakeMessagingApi.delay = args.reply_ms / 1000
+    bot.MessagingApi = FakeMessagingApi
+    total = args.bursts * args.burst_size
+
+    results = {}
+    bot.webhook_queue = None
+    results['sync'] = run_bursts(args.bursts, args.burst_size)
+
+    FakeMessagingApi.sent = 0
+    bot.webhook_queue = webhook_intake.WebhookIntake(bot.handler, bot.job_store)
+    start = time.perf_counter()
+    results['queue'] = run_bursts(args.bursts, args.burst_size)
+    while FakeMessagingApi.sent < total and time.perf_counter() - start < 120:
+        time.sleep(0.01)
+    drained = time.perf_counter() - start
+
+    print(f"\n{'intake':<7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, result in results.items():
+        print(f"{name:<7} {result['p50'] * 1000:>8.2f} {result['p99'] * 1000:>8.2f} {result['max'] * 1000:>8.2f}")
+    print(
+        f"\n{total} 個 webhook（每批 {args.burst_size} 個），reply 延遲 {args.reply_ms:.0f}ms；"
+        f"queue 模式 {FakeMessagingApi.sent} 則回覆在 {drained:.1f}s 內送出（{bot.webhook_queue.stats()}）"
+    )
+
+
+if __name__ == '__main__':
+    main()
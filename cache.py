@@ -0,0 +1,217 @@
+"""
+快取模組
+提供具 TTL 與 LRU 容量上限的 thread-safe 快取，可選擇以 SQLite 檔案作為持久化後端，
+讓快取在程序重啟後仍然有效。過期的項目在被淘汰前仍會保留，
+供呼叫端以 ETag / Last-Modified 等驗證資訊重新驗證。
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    meta TEXT,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (namespace, accessed_at);
+"""
+
+
+def content_key(*parts):
+    """以各部分內容（str 或 bytes）計算 SHA-256 快取鍵"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        # 加上長度前綴，避免不同切分方式得到相同的鍵
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class CacheEntry(namedtuple('CacheEntry', ['value', 'expires_at', 'meta'])):
+    """快取項目，meta 用來存放重新驗證所需的資訊（例如 ETag）"""
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+
+class _SQLiteBackend:
+    """以 SQLite 實作的持久化快取後端（多個 namespace 可共用同一個檔案）"""
+
+    def __init__(self, path, namespace, max_entries):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, meta FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key)
+            )
+        value, expires_at, meta = row
+        return CacheEntry(json.loads(value), expires_at, json.loads(meta) if meta else None)
+
+    def set(self, key, entry):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, meta, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.namespace,
+                    key,
+                    json.dumps(entry.value, ensure_ascii=False),
+                    json.dumps(entry.meta, ensure_ascii=False) if entry.meta else None,
+                    entry.expires_at,
+                    now
+                )
+            )
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+            if count > self.max_entries:
+                # 淘汰最久未使用的項目
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key IN "
+                    "(SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                    (self.namespace, self.namespace, count - self.max_entries)
+                )
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+
+class TTLCache:
+    """具 TTL 與 LRU 容量上限的快取（記憶體層 + 選用的 SQLite 持久化層）"""
+
+    def __init__(self, name, max_entries=1000, default_ttl=3600, path=None):
+        """
+        Args:
+            name: 快取名稱（同時作為 SQLite 中的 namespace 與指標名稱）
+            max_entries: 最多保留的項目數，超過時淘汰最久未使用的項目
+            default_ttl: 預設有效秒數
+            path: SQLite 檔案路徑，None 表示只使用記憶體
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._backend = None
+
+        if path:
+            try:
+                self._backend = _SQLiteBackend(path, name, max_entries)
+            except Exception as e:
+                logger.error(f"開啟快取檔案 {path} 時發生錯誤，{name} 快取改為只使用記憶體: {str(e)}")
+
+    def get_entry(self, key):
+        """取得快取項目（包含已過期但尚未淘汰的項目），不存在時返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        if self._backend is None:
+            return None
+
+        try:
+            entry = self._backend.get(key)
+        except Exception as e:
+            logger.error(f"讀取 {self.name} 快取時發生錯誤: {str(e)}")
+            return None
+
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def get(self, key):
+        """取得未過期的快取值，不存在或已過期時返回 None（並計入命中率）"""
+        entry = self.get_entry(key)
+        hit = entry is not None and entry.fresh
+        self.record(hit)
+        return entry.value if hit else None
+
+    def record(self, hit):
+        """記錄一次查詢結果（供自行以 get_entry 判斷命中的呼叫端使用）"""
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def set(self, key, value, ttl=None, meta=None):
+        """寫入快取"""
+        entry = CacheEntry(value, time.time() + (ttl if ttl is not None else self.default_ttl), meta)
+        self._remember(key, entry)
+
+        if self._backend is not None:
+            try:
+                self._backend.set(key, entry)
+            except Exception as e:
+                logger.error(f"寫入 {self.name} 快取時發生錯誤: {str(e)}")
+
+    def touch(self, key, ttl=None):
+        """延長既有項目的有效期限（例如重新驗證後內容未變更）"""
+        entry = self.get_entry(key)
+        if entry is not None:
+            self.set(key, entry.value, ttl=ttl, meta=entry.meta)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """快取命中率與容量"""
+        with self._lock:
+            hits = self._hits
+            misses = self._misses
+            memory_size = len(self._entries)
+
+        stats = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'memory_entries': memory_size,
+            'max_entries': self.max_entries
+        }
+        if self._backend is not None:
+            try:
+                stats['disk_entries'] = self._backend.size()
+            except Exception as e:
+                stats['disk_entries'] = f"error: {e}"
+        return stats
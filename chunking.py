@@ -0,0 +1,137 @@
+"""
+文字切分模組
+計算 token 數並將長文依段落、句子的邊界切分成不超過指定 token 數的區塊，
+供長文摘要先分段摘要（map）再彙整（reduce）。
+
+有安裝 tiktoken 時使用模型實際的 tokenizer 計算；未安裝時以保守的方式估計
+（CJK 字元每字 1 token，其他字元每 4 個字元 1 token）。
+"""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# gpt-4o / gpt-4o-mini 使用的編碼
+TIKTOKEN_ENCODING = 'o200k_base'
+
+# 句子結尾（中英文標點），用於切分過長的段落
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;.])\s*')
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception as e:
+            logger.info(f"未使用 tiktoken（{str(e)}），改以字元數估計 token 數")
+        _encoding_loaded = True
+    return _encoding
+
+
+def _is_cjk(char):
+    return '　' <= char <= '鿿' or '가' <= char <= '힯' or '＀' <= char <= '￯'
+
+
+def count_tokens(text):
+    """計算（或估計）文字的 token 數"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = sum(1 for char in text if _is_cjk(char))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _hard_split(text, max_tokens):
+    """
+    沒有可用的斷句位置時，直接依字元數切分
+
+    一個字元可能對應多個 token（罕用漢字、emoji 等），每段先取 max_tokens 個字元，
+    超過時以二分搜尋縮短到 token 數不超過 max_tokens 的最長長度（至少 1 個字元）
+    """
+    start = 0
+    while start < len(text):
+        size = min(max_tokens, len(text) - start)
+        if count_tokens(text[start:start + size]) > max_tokens:
+            low, high = 1, size - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if count_tokens(text[start:start + middle]) <= max_tokens:
+                    low = middle
+                else:
+                    high = middle - 1
+            size = low
+        yield text[start:start + size]
+        start += size
+
+
+def _pieces(text, max_tokens):
+    """依段落 → 句子 → 字元的順序，產生每段都不超過 max_tokens 的文字片段"""
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            if not sentence:
+                continue
+            if count_tokens(sentence) <= max_tokens:
+                yield sentence
+            else:
+                yield from _hard_split(sentence, max_tokens)
+
+
+def split_text(text, max_tokens):
+    """
+    將文字切分成不超過 max_tokens 的區塊（盡量在段落或句子的邊界切分）
+
+    Returns:
+        list: [(區塊文字, token 數), ...]
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in _pieces(text, max_tokens):
+        tokens = count_tokens(piece)
+        # 區塊之間的換行以 1 個 token 計算
+        if current and current_tokens + 1 + tokens > max_tokens:
+            chunks.append(_chunk(current))
+            current = []
+            current_tokens = 0
+        elif current:
+            current_tokens += 1
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(_chunk(current))
+    return chunks
+
+
+def _chunk(pieces):
+    """合併片段並重新計算實際的 token 數"""
+    text = '\n'.join(pieces)
+    return text, count_tokens(text)
+
+
+def within_budget(chunks, budget):
+    """
+    依序保留總 token 數不超過預算的區塊（至少保留第一個區塊）
+
+    Returns:
+        tuple: (保留的區塊, 是否因預算捨棄了部分區塊)
+    """
+    kept = []
+    used = 0
+    for chunk in chunks:
+        if kept and used + chunk[1] > budget:
+            return kept, True
+        kept.append(chunk)
+        used += chunk[1]
+    return kept, False
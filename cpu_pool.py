@@ -0,0 +1,188 @@
+"""
+CPU 工作 process pool 模組
+HTML 解析、圖片解碼與縮放等 CPU 密集的階段可交給獨立的 process 執行，
+不再與 webhook 的 thread 競爭 GIL，大量工作進行中 webhook 的回應時間仍維持穩定。
+
+- CPU_POOL_WORKERS=0（預設）時不建立 process，所有工作在呼叫端的 thread 中執行
+- 大於 CPU_POOL_SHM_THRESHOLD 的 bytes 參數以 shared memory 傳遞：worker 直接讀取同一塊記憶體
+  （memoryview），不經過 pickle 與 pipe 複製
+- worker 以 fork 建立，start() 必須在程式啟動、建立其他 thread 之前呼叫；
+  spawn / forkserver 會在每個 worker 中重新執行主程式，因此不使用
+- worker 異常終止導致 pool 無法使用時，之後的工作改在呼叫端執行
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CPU_POOL_WORKERS = int(os.getenv('CPU_POOL_WORKERS', 0))  # 0 表示不使用 process pool
+# 大於此大小（位元組）的 bytes 參數以 shared memory 傳遞
+CPU_POOL_SHM_THRESHOLD = int(os.getenv('CPU_POOL_SHM_THRESHOLD', 256 * 1024))
+
+_lock = threading.Lock()
+_executor = None
+_broken = False
+_stats = {'submitted': 0, 'in_flight': 0, 'completed': 0, 'failed': 0, 'inline': 0, 'shared_bytes': 0}
+
+
+class SharedBuffer:
+    """以 shared memory 傳遞的 bytes（只包含名稱與大小，pickle 成本固定）"""
+    __slots__ = ('name', 'size')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __getstate__(self):
+        return self.name, self.size
+
+    def __setstate__(self, state):
+        self.name, self.size = state
+
+
+def start(workers=CPU_POOL_WORKERS):
+    """建立 process pool 並立即啟動所有 worker（workers 為 0 時不建立）"""
+    global _executor
+    if workers <= 0 or _executor is not None:
+        return
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # fork context 在第一次提交時建立所有 worker，趁還沒有其他 thread 時完成
+    _executor.submit(os.getpid).result()
+    logger.info(f"已啟動 CPU process pool（{workers} workers，{context.get_start_method()}）")
+
+
+def enabled():
+    return _executor is not None and not _broken
+
+
+def _share(args):
+    """將大型 bytes 參數複製到 shared memory，返回 (轉換後的參數, shared memory 清單)"""
+    converted = []
+    segments = []
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray, memoryview)) and len(arg) >= CPU_POOL_SHM_THRESHOLD:
+            segment = shared_memory.SharedMemory(create=True, size=len(arg))
+            segment.buf[:len(arg)] = arg
+            segments.append(segment)
+            converted.append(SharedBuffer(segment.name, len(arg)))
+        else:
+            converted.append(arg)
+    return converted, segments
+
+
+def _release(segments):
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+def _invoke(func, args):
+    """在 worker 中執行：SharedBuffer 參數轉成指向 shared memory 的 memoryview"""
+    segments = []
+    resolved = []
+    try:
+        for arg in args:
+            if isinstance(arg, SharedBuffer):
+                segment = shared_memory.SharedMemory(name=arg.name, track=False)
+                segments.append(segment)
+                resolved.append(segment.buf[:arg.size])
+            else:
+                resolved.append(arg)
+        return func(*resolved)
+    finally:
+        for view in resolved:
+            if isinstance(view, memoryview):
+                view.release()
+        for segment in segments:
+            segment.close()
+
+
+def _finish(name, start_time, outcome):
+    with _lock:
+        _stats['in_flight'] -= 1
+        _stats[outcome] += 1
+    metrics.observe(f"cpu_pool.{name}", time.perf_counter() - start_time)
+
+
+def submit(func, *args):
+    """
+    在 process pool 中執行 func(*args)
+
+    func 必須是可 pickle 的模組層級函數；大型 bytes 參數在 worker 中以 memoryview 傳入。
+    未啟用 pool 或 pool 已無法使用時，直接在目前的 thread 中執行
+
+    Returns:
+        concurrent.futures.Future
+    """
+    if enabled():
+        converted, segments = _share(args)
+        start_time = time.perf_counter()
+        with _lock:
+            _stats['submitted'] += 1
+            _stats['in_flight'] += 1
+            _stats['shared_bytes'] += sum(segment.size for segment in segments)
+        try:
+            future = _executor.submit(_invoke, func, converted)
+        except BrokenProcessPool as e:
+            _release(segments)
+            _finish(func.__name__, start_time, 'failed')
+            _disable(e)
+        else:
+            def on_done(done):
+                _release(segments)
+                _finish(func.__name__, start_time, 'failed' if done.exception() else 'completed')
+                if isinstance(done.exception(), BrokenProcessPool):
+                    _disable(done.exception())
+
+            future.add_done_callback(on_done)
+            return future
+
+    with _lock:
+        _stats['inline'] += 1
+    future = Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _disable(error):
+    """worker 異常終止時停用 pool，之後的工作在呼叫端執行"""
+    global _broken
+    # executor 已自行終止所有 worker；此處可能在 executor 的管理 thread 中執行，
+    # 保留 executor 的參照（釋放最後一個參照會在管理 thread 中 deadlock），只標記為不可用
+    with _lock:
+        first, _broken = not _broken, True
+    if first:
+        logger.error(f"CPU process pool 無法使用，改在目前的 process 中執行: {str(error)}")
+
+
+def run(func, *args):
+    """submit 後等待結果"""
+    return submit(func, *args).result()
+
+
+async def run_async(func, *args):
+    """run 的非同步版本（等待 worker 時不佔用 event loop）"""
+    if not enabled():
+        # 未啟用 pool 時與原本相同，交給 thread 執行
+        return await asyncio.to_thread(run, func, *args)
+    return await asyncio.wrap_future(submit(func, *args))
+
+
+def stats():
+    with _lock:
+        return {'workers': _executor._max_workers if enabled() else 0, **_stats}
@@ -0,0 +1,201 @@
+"""
+背景工作分派模組
+以「每種工作類型一個固定大小的 worker pool + 有界佇列」取代每則訊息開一條 thread，
+佇列滿載時依設定的溢出策略處理：
+- reject：拒絕新工作，由呼叫端回覆「忙碌中」
+- defer：暫存到延後佇列，等有空位時再依序補進工作佇列
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_REJECT = 'reject'
+OVERFLOW_DEFER = 'defer'
+
+
+class WorkerPool:
+    """單一工作類型的固定大小 worker pool"""
+
+    def __init__(self, name, workers, queue_size, overflow_policy=OVERFLOW_REJECT, max_deferred=200):
+        if workers < 1:
+            raise ValueError(f"{name} pool 的 worker 數量必須大於 0")
+        if queue_size < 1:
+            raise ValueError(f"{name} pool 的佇列長度必須大於 0")
+        if overflow_policy not in (OVERFLOW_REJECT, OVERFLOW_DEFER):
+            raise ValueError(f"未知的溢出策略：{overflow_policy}")
+
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.max_deferred = max_deferred
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._deferred = deque()
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'deferred': 0,
+            'completed': 0,
+            'failed': 0
+        }
+
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{name}-worker-{index}"
+            )
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args):
+        """
+        提交工作
+
+        Returns:
+            bool: 工作已被接受（立即排入或延後）時返回 True，被拒絕時返回 False
+        """
+        task = (func, args, time.perf_counter())
+
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._promote_deferred()
+
+            # 已有延後的工作時，新工作也排到後面，維持先進先出
+            if not self._deferred:
+                try:
+                    self._queue.put_nowait(task)
+                    return True
+                except queue.Full:
+                    pass
+
+            if self.overflow_policy == OVERFLOW_DEFER and len(self._deferred) < self.max_deferred:
+                self._deferred.append(task)
+                self._stats['deferred'] += 1
+                metrics.incr(f"pool.{self.name}.deferred")
+                return True
+
+            self._stats['rejected'] += 1
+            metrics.incr(f"pool.{self.name}.rejected")
+            logger.warning(f"{self.name} pool 已滿載，拒絕新工作")
+            return False
+
+    def _promote_deferred(self):
+        """將延後佇列的工作補進工作佇列（呼叫前需持有 self._lock）"""
+        while self._deferred:
+            try:
+                self._queue.put_nowait(self._deferred[0])
+            except queue.Full:
+                return
+            self._deferred.popleft()
+
+    def _worker_loop(self):
+        while True:
+            func, args, enqueued_at = self._queue.get()
+
+            with self._lock:
+                self._busy += 1
+                self._promote_deferred()
+
+            metrics.observe(f"pool.{self.name}.wait", time.perf_counter() - enqueued_at)
+            start = time.perf_counter()
+            try:
+                func(*args)
+                succeeded = True
+            except Exception as e:
+                succeeded = False
+                logger.error(f"{self.name} pool 執行工作時發生錯誤: {str(e)}")
+            finally:
+                metrics.observe(f"pool.{self.name}.run", time.perf_counter() - start)
+                with self._lock:
+                    self._busy -= 1
+                    self._stats['completed' if succeeded else 'failed'] += 1
+                self._queue.task_done()
+
+    def stats(self):
+        """取得 pool 的即時狀態"""
+        with self._lock:
+            queued = self._queue.qsize()
+            deferred = len(self._deferred)
+            busy = self._busy
+            stats = dict(self._stats)
+
+        capacity = self.workers + self.queue_size
+        return {
+            'workers': self.workers,
+            'busy': busy,
+            'queue_size': self.queue_size,
+            'queued': queued,
+            'deferred_pending': deferred,
+            'overflow_policy': self.overflow_policy,
+            # 飽和度：執行中與排隊中的工作佔總容量的比例，超過 1 表示有工作被延後
+            'saturation': round((busy + queued + deferred) / capacity, 3),
+            **stats
+        }
+
+
+class JobDispatcher:
+    """依工作類型分派到對應 worker pool 的分派器"""
+
+    def __init__(self, pool_workers, queue_size, overflow_policy=OVERFLOW_REJECT, max_deferred=200):
+        """
+        Args:
+            pool_workers: 各工作類型的 worker 數量，例如 {'audio': 2, 'image': 2}
+            queue_size: 每個 pool 的佇列長度
+            overflow_policy: 佇列滿載時的處理策略（reject 或 defer）
+            max_deferred: defer 策略下每個 pool 最多延後的工作數
+        """
+        self._pools = {
+            kind: WorkerPool(kind, workers, queue_size, overflow_policy, max_deferred)
+            for kind, workers in pool_workers.items()
+        }
+
+    def submit(self, kind, func, *args):
+        """提交工作到指定類型的 pool，返回是否被接受"""
+        pool = self._pools.get(kind)
+        if pool is None:
+            raise ValueError(f"未知的工作類型：{kind}")
+        return pool.submit(func, *args)
+
+    def stats(self):
+        """取得所有 pool 的即時狀態"""
+        return {kind: pool.stats() for kind, pool in self._pools.items()}
+
+
+def parse_pool_workers(value, defaults):
+    """
+    解析 worker 數量設定字串
+
+    Args:
+        value: 例如 "audio:2,image:2,web:4"，未列出的類型使用預設值
+        defaults: 預設的 {類型: worker 數量}
+
+    Returns:
+        dict: {類型: worker 數量}
+    """
+    pool_workers = dict(defaults)
+    if not value:
+        return pool_workers
+
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, count = item.partition(':')
+        kind = kind.strip()
+        if kind not in pool_workers:
+            raise ValueError(f"未知的工作類型：{kind}")
+        pool_workers[kind] = int(count)
+
+    return pool_workers
@@ -0,0 +1,409 @@
+"""
+網頁文字提取模組
+以串流方式處理 HTTP 回應：依 Content-Type header 或 <meta charset> 判斷編碼，
+逐段解碼後交給文字提取器，不需要對整份內容做編碼偵測。
+
+提取器（以 WEB_EXTRACTOR 選擇）：
+- readability：以 lxml（C 實作的解析器）建立 DOM，依段落文字量、標點、連結密度與
+  class/id 特徵為區塊評分，只保留主要內容，減少送給 OpenAI 的導覽列、側欄等雜訊
+- stream：標準函式庫的增量式解析器，收集到足夠文字即停止（不需要額外套件）
+"""
+
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+# 不提取文字的元素（導覽列、頁首頁尾、側欄、表單與程式碼）
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'nav', 'header', 'footer', 'aside', 'form'}
+
+# readability 提取器額外移除的元素
+REMOVE_TAGS = SKIP_TAGS | {'iframe', 'button', 'select', 'input', 'textarea', 'canvas', 'object', 'embed'}
+
+# 可能是主要內容 / 不太可能是主要內容的 class、id 特徵
+POSITIVE_HINTS = re.compile(r'article|body|content|entry|main|page|post|story|text|blog', re.IGNORECASE)
+NEGATIVE_HINTS = re.compile(
+    r'comment|contact|footer|foot|masthead|menu|nav|promo|related|share|sidebar|sponsor|social|'
+    r'widget|banner|breadcrumb|cookie|popup|modal|subscribe|newsletter|advert|\bad\b|\bads\b',
+    re.IGNORECASE
+)
+
+# 段落型元素（評分的基本單位）與輸出時需要換行的區塊元素
+PARAGRAPH_TAGS = ('p', 'pre', 'td', 'blockquote')
+BLOCK_TAGS = (
+    'p', 'pre', 'td', 'blockquote', 'div', 'section', 'article', 'li', 'ul', 'ol', 'br', 'tr', 'table',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'dd', 'dt', 'figcaption'
+)
+TAG_WEIGHTS = {'article': 10, 'main': 10, 'div': 5, 'section': 3, 'pre': 3, 'td': 3, 'blockquote': 3,
+               'ol': -3, 'ul': -3, 'li': -3, 'form': -3, 'th': -5, 'h1': -5, 'h2': -5, 'h3': -5, 'body': -5}
+
+# 主要內容少於這個字數時，視為評分失敗並改用整頁文字
+MIN_MAIN_CONTENT_CHARS = 200
+
+# 判斷 <meta charset> 時最多檢查的開頭位元組數
+CHARSET_SNIFF_BYTES = 4096
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_\-:.]+)', re.IGNORECASE)
+
+# 允許處理的內容類型，其他類型（PDF、圖片、壓縮檔等二進位內容）直接拒絕
+TEXT_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+
+
+class UnsupportedContentError(Exception):
+    """回應內容不是可提取文字的 HTML 或純文字"""
+
+
+def content_mime_type(content_type):
+    """從 Content-Type header 取出 MIME 類型，例如 'text/html; charset=utf-8' -> 'text/html'"""
+    return (content_type or '').split(';')[0].strip().lower()
+
+
+def check_content_type(content_type):
+    """檢查 Content-Type 是否可提取文字（未提供時視為 HTML），否則拋出 UnsupportedContentError"""
+    mime_type = content_mime_type(content_type)
+    if mime_type and mime_type not in TEXT_CONTENT_TYPES:
+        raise UnsupportedContentError(f"不支援的內容類型：{mime_type}")
+
+
+def _valid_codec(name):
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def header_charset(content_type):
+    """從 Content-Type header 取出 charset 參數"""
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.strip().lower() == 'charset':
+            return _valid_codec(value.strip().strip('"\''))
+    return None
+
+
+def sniff_charset(head):
+    """從頁面開頭的 BOM 或 <meta charset> / <meta http-equiv> 判斷編碼"""
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    match = _META_CHARSET.search(head[:CHARSET_SNIFF_BYTES])
+    if match:
+        return _valid_codec(match.group(1).decode('ascii', errors='ignore'))
+    return None
+
+
+class StreamingTextExtractor(HTMLParser):
+    """增量式 HTML 文字提取器，收集的文字超過 limit 個字元後即標記為完成"""
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.done = False
+        self._skip_depth = 0
+        self._lines = []
+        self._length = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        for line in data.splitlines():
+            line = line.strip()
+            if line:
+                self._lines.append(line)
+                self._length += len(line) + 1
+        if self._length > self.limit:
+            self.done = True
+
+    def text(self):
+        return '\n'.join(self._lines)
+
+
+class ReadabilityExtractor:
+    """
+    lxml 主要內容提取器
+    以 lxml 的增量式 HTML 解析器建立 DOM（讀取量由 PageReader 的位元組上限控制），
+    結束時以 readability 的評分方式找出主要內容區塊
+    """
+
+    def __init__(self, limit):
+        import lxml.html
+
+        self.limit = limit
+        self.done = False
+        self._parser = lxml.html.HTMLParser(remove_comments=True, remove_pis=True, no_network=True)
+        self._fed = False
+        self._text = ''
+
+    def feed(self, data):
+        if data:
+            self._parser.feed(data)
+            self._fed = True
+
+    def close(self):
+        if not self._fed:
+            return
+        try:
+            root = self._parser.close()
+        except Exception as e:
+            logger.warning(f"lxml 無法解析頁面: {str(e)}")
+            return
+        if root is not None:
+            self._text = main_content_text(root)
+
+    def text(self):
+        return self._text
+
+
+def _class_weight(element):
+    weight = 0
+    for value in (element.get('class'), element.get('id')):
+        if value:
+            if NEGATIVE_HINTS.search(value):
+                weight -= 25
+            if POSITIVE_HINTS.search(value):
+                weight += 25
+    return weight
+
+
+def _link_density(element, text_length):
+    link_length = sum(len(link.text_content()) for link in element.iter('a'))
+    return link_length / text_length if text_length else 0.0
+
+
+def _block_text(element):
+    """提取元素文字，區塊元素之間換行，並移除空白行"""
+    for block in element.iter(*BLOCK_TAGS):
+        block.tail = '\n' + (block.tail or '')
+        if block.tag != 'br':
+            block.text = '\n' + (block.text or '')
+    lines = (line.strip() for line in element.text_content().splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _remove_boilerplate(root):
+    for element in list(root.iter(*REMOVE_TAGS)):
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    # 移除 class / id 看起來不是主要內容的區塊（例如側欄、留言、分享按鈕）
+    for element in list(root.iter('div', 'section', 'ul', 'span', 'table')):
+        if element.getparent() is None:
+            continue
+        hints = f"{element.get('class', '')} {element.get('id', '')}".strip()
+        if hints and NEGATIVE_HINTS.search(hints) and not POSITIVE_HINTS.search(hints):
+            element.drop_tree()
+
+
+def _score_candidates(root):
+    """依段落為父層（全額）與祖父層（一半）元素累計分數"""
+    scores = {}
+    for paragraph in root.iter(*PARAGRAPH_TAGS):
+        text = paragraph.text_content().strip()
+        if len(text) < 25:
+            continue
+
+        # 基本分 + 逗號、句號數量（中英文）+ 每 100 字加 1 分（最多 3 分）
+        score = 1 + sum(text.count(mark) for mark in (',', '，', '。', '、')) + min(len(text) // 100, 3)
+
+        parent = paragraph.getparent()
+        grandparent = parent.getparent() if parent is not None else None
+        for node, share in ((parent, 1.0), (grandparent, 0.5)):
+            if node is None or not isinstance(node.tag, str):
+                continue
+            if node not in scores:
+                scores[node] = TAG_WEIGHTS.get(node.tag, 0) + _class_weight(node)
+            scores[node] += score * share
+
+    # 連結比例高的區塊（導覽、相關文章列表）降低分數
+    for node in scores:
+        scores[node] *= 1 - _link_density(node, len(node.text_content()))
+    return scores
+
+
+def main_content_text(root):
+    """以 readability 方式提取主要內容文字，評分失敗時返回整頁文字"""
+    _remove_boilerplate(root)
+    body = root.find('body')
+    if body is None:
+        body = root
+
+    scores = _score_candidates(root)
+    if scores:
+        top = max(scores, key=scores.get)
+        threshold = max(10.0, scores[top] * 0.2)
+        parent = top.getparent()
+        siblings = list(parent) if parent is not None else [top]
+
+        # 主要區塊加上分數接近的相鄰區塊，以及連結很少的長段落
+        parts = []
+        for sibling in siblings:
+            if sibling is top or scores.get(sibling, 0) >= threshold:
+                parts.append(sibling)
+            elif sibling.tag == 'p':
+                text = sibling.text_content()
+                if len(text) > 80 and _link_density(sibling, len(text)) < 0.25:
+                    parts.append(sibling)
+
+        text = '\n'.join(filter(None, (_block_text(part) for part in parts)))
+        if len(text) >= MIN_MAIN_CONTENT_CHARS:
+            # 主要區塊不含標題時補上頁面標題，讓摘要有完整脈絡
+            heading = _page_heading(root)
+            if heading and heading not in ' '.join(text.split()):
+                text = f"{heading}\n{text}"
+            return text
+
+    return _block_text(body)
+
+
+def _page_heading(root):
+    """頁面標題：優先使用第一個 <h1>，其次是 <title>"""
+    for path in ('.//h1', './/title'):
+        element = root.find(path)
+        if element is not None:
+            heading = ' '.join(element.text_content().split())
+            if heading:
+                return heading
+    return None
+
+
+# 提取器名稱 -> 類別
+EXTRACTORS = {
+    'readability': ReadabilityExtractor,
+    'stream': StreamingTextExtractor,
+}
+
+
+def create_extractor(name, limit):
+    """建立指定名稱的提取器，readability 需要的 lxml 未安裝時改用 stream"""
+    extractor_class = EXTRACTORS.get(name)
+    if extractor_class is None:
+        raise ValueError(f"未知的網頁提取器：{name}")
+    try:
+        return extractor_class(limit)
+    except ImportError:
+        logger.warning(f"{name} 提取器需要的套件未安裝，改用 stream 提取器")
+        return StreamingTextExtractor(limit)
+
+
+def extract_text(html, name='readability', limit=10000):
+    """從完整的 HTML 字串提取文字（供離線處理與效能比較使用）"""
+    extractor = create_extractor(name, limit)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def extract_page(content_type, data, limit, extractor='readability'):
+    """
+    解析完整的回應內容（由 BufferedPageReader 收集，可在 CPU process pool 中執行）
+
+    Returns:
+        tuple: (文字, 使用的編碼)
+    """
+    reader = PageReader(content_type, len(data), limit, extractor)
+    reader.feed(data)
+    return reader.close(), reader.charset
+
+
+class BufferedPageReader:
+    """
+    只收集回應內容、不在目前的 thread 中解析的讀取器，介面與 PageReader 的 feed() 相同
+
+    用於需要讀完才能解析的提取器（readability）：讀取結束後以 extract_page 一次解析，
+    讓解析可以交給其他 process 執行
+    """
+
+    def __init__(self, content_type, max_bytes):
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.charset = header_charset(content_type)
+        self.data = bytearray()
+
+    def feed(self, chunk):
+        """收集一段回應內容，返回是否需要繼續讀取"""
+        remaining = self.max_bytes - self.bytes_read
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            self.truncated = True
+        self.bytes_read += len(chunk)
+        self.data += chunk
+        return not self.truncated
+
+
+class PageReader:
+    """
+    將串流的回應 bytes 解碼後交給文字提取器
+
+    使用方式：對每個 chunk 呼叫 feed()，返回 False 時停止讀取，最後以 close() 取得文字
+    """
+
+    def __init__(self, content_type, max_bytes, limit, extractor='stream'):
+        """
+        Args:
+            content_type: 回應的 Content-Type header
+            max_bytes: 最多讀取的位元組數（解壓縮後）
+            limit: 收集到多少字元的文字後停止（stream 提取器）
+            extractor: 提取器名稱（見 EXTRACTORS）
+        """
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.charset = header_charset(content_type)
+        self.extractor = create_extractor(extractor, limit)
+        self._pending = b''
+        self._decoder = None
+
+    def feed(self, chunk):
+        """
+        處理一段回應內容
+
+        Returns:
+            bool: 是否需要繼續讀取
+        """
+        remaining = self.max_bytes - self.bytes_read
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            self.truncated = True
+        self.bytes_read += len(chunk)
+
+        if self._decoder is None:
+            # 先累積開頭的內容，用來判斷 <meta charset>
+            self._pending += chunk
+            if len(self._pending) >= CHARSET_SNIFF_BYTES or self.truncated:
+                self._start_decoding()
+        else:
+            self.extractor.feed(self._decoder.decode(chunk))
+
+        if self.extractor.done:
+            self.truncated = True
+        return not self.truncated
+
+    def _start_decoding(self):
+        charset = self.charset or sniff_charset(self._pending) or 'utf-8'
+        self.charset = charset
+        self._decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        pending, self._pending = self._pending, b''
+        self.extractor.feed(self._decoder.decode(pending))
+
+    def close(self):
+        """結束解析並返回提取的文字"""
+        if self._decoder is None:
+            self._start_decoding()
+        self.extractor.feed(self._decoder.decode(b'', final=True))
+        self.extractor.close()
+        return self.extractor.text()
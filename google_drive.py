@@ -1,11 +1,19 @@
 """
 Google Drive API 整合模組
 處理 OAuth 2.0 認證和檔案上傳功能
+
+Drive 服務與憑證在整個程序中只建立一次：憑證在到期前主動刷新（以 lock 保護，避免多個 thread 同時刷新），
+API 請求則使用各 thread 自己的 HTTP 連線（httplib2 不是 thread-safe），每次上傳只剩上傳本身的請求
 """
 
 import os
 import io
 import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import google_auth_httplib2
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -13,21 +21,60 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 
+import http_client
+import metrics
+
 # Google Drive API 權限範圍（最小權限：只能建立檔案）
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
+# access token 到期前多少秒主動刷新
+GOOGLE_TOKEN_REFRESH_MARGIN = int(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN', 300))
 
-def get_drive_service():
+# 上傳方式：小於門檻的檔案以 multipart 單一請求上傳，較大的檔案使用可續傳上傳（resumable）
+DRIVE_RESUMABLE_THRESHOLD = int(os.getenv('DRIVE_RESUMABLE_THRESHOLD', 5 * 1024 * 1024))
+# 可續傳上傳每個請求的大小（Drive 要求為 256 KiB 的倍數）
+_CHUNK_UNIT = 256 * 1024
+DRIVE_UPLOAD_CHUNK_SIZE = max(_CHUNK_UNIT, int(os.getenv('DRIVE_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)) // _CHUNK_UNIT * _CHUNK_UNIT)
+
+# 公開分享方式：file（每個檔案各自設定權限）或 folder（沿用目標資料夾的分享設定，不另外設定權限）
+DRIVE_SHARE_MODE = os.getenv('DRIVE_SHARE_MODE', 'file')
+# Drive batch API 單一批次的請求數上限
+DRIVE_BATCH_LIMIT = 100
+
+PUBLIC_PERMISSION = {
+    'type': 'anyone',
+    'role': 'reader'
+}
+
+_lock = threading.Lock()
+_credentials = None
+_service = None
+_local = threading.local()
+
+
+def _save_token(creds):
+    """儲存憑證供下次使用（僅在本地環境，從環境變數載入時不寫檔）"""
+    if os.getenv('GOOGLE_TOKEN_JSON'):
+        return
+    token_path = os.getenv('GOOGLE_TOKEN_PATH', 'token.json')
+    try:
+        with open(token_path, 'w') as token:
+            token.write(creds.to_json())
+        print(f"Token 已儲存到 {token_path}")
+    except Exception as e:
+        print(f"儲存 token 時發生錯誤: {e}")
+
+
+def load_credentials():
     """
-    建立並返回 Google Drive API 服務實例
-    處理 OAuth 2.0 認證流程：
+    載入 OAuth 2.0 憑證
     - 優先從環境變數 GOOGLE_TOKEN_JSON 讀取（適用於雲端部署）
     - 如果環境變數不存在，從 token.json 檔案讀取
     - 如果 token 過期，自動刷新
     - 如果沒有 token，引導用戶授權（需要 credentials.json，僅限本地）
 
     Returns:
-        service: Google Drive API 服務實例
+        Credentials: 憑證
         None: 如果認證失敗
     """
     creds = None
@@ -87,25 +134,126 @@ def get_drive_service():
                 print(f"OAuth 授權失敗: {e}")
                 return None
 
-        # 儲存憑證供下次使用（僅在本地環境）
-        if not token_json_env:
+        _save_token(creds)
+
+    return creds
+
+
+def _needs_refresh(creds):
+    """access token 已失效或即將到期（expiry 為 UTC naive datetime）"""
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now <= timedelta(seconds=GOOGLE_TOKEN_REFRESH_MARGIN)
+
+
+def get_credentials():
+    """
+    取得共用的憑證，第一次呼叫時載入，之後在到期前主動刷新
+
+    Returns:
+        Credentials: 憑證
+        None: 如果認證失敗
+    """
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials = load_credentials()
+        elif _credentials.refresh_token and _needs_refresh(_credentials):
+            try:
+                _credentials.refresh(Request())
+                metrics.incr('drive.token_refreshed')
+                print("Token 已刷新")
+                _save_token(_credentials)
+            except Exception as e:
+                # 刷新失敗時，token 尚未到期仍可使用；已到期則下次重新載入
+                print(f"刷新 token 失敗: {e}")
+                if not _credentials.valid:
+                    _credentials = None
+        return _credentials
+
+
+def get_drive_service():
+    """
+    返回整個程序共用的 Google Drive API 服務實例（第一次呼叫時建立）
+
+    服務物件只保存 API 描述，發送請求時請搭配 get_http() 取得目前 thread 的連線：
+        service.files().get(fileId=file_id).execute(http=get_http())
+
+    Returns:
+        service: Google Drive API 服務實例
+        None: 如果認證失敗
+    """
+    global _service
+    creds = get_credentials()
+    if not creds:
+        return None
+
+    with _lock:
+        if _service is None:
+            # 建立 Drive API 服務（使用套件內建的 discovery 文件，不需要額外的網路請求）
             try:
-                with open(token_path, 'w') as token:
-                    token.write(creds.to_json())
-                print(f"Token 已儲存到 {token_path}")
+                _service = build('drive', 'v3', credentials=creds, cache_discovery=False)
             except Exception as e:
-                print(f"儲存 token 時發生錯誤: {e}")
+                print(f"建立 Drive 服務時發生錯誤: {e}")
+                return None
+        return _service
 
-    # 建立 Drive API 服務
-    try:
-        service = build('drive', 'v3', credentials=creds)
-        return service
-    except Exception as e:
-        print(f"建立 Drive 服務時發生錯誤: {e}")
+
+def get_http():
+    """
+    取得目前 thread 專用的已授權 HTTP 連線（持續重用同一條 keep-alive 連線）
+
+    Returns:
+        AuthorizedHttp: 已授權的 HTTP 連線
+        None: 如果認證失敗
+    """
+    creds = get_credentials()
+    if not creds:
         return None
+    authorized = getattr(_local, 'http', None)
+    # 憑證重新載入後（物件不同）需要重建連線
+    if authorized is None or authorized.credentials is not creds:
+        authorized = google_auth_httplib2.AuthorizedHttp(
+            creds,
+            http=httplib2.Http(timeout=http_client.HTTP_READ_TIMEOUT)
+        )
+        _local.http = authorized
+    return authorized
+
+
+def sharing_inherited(folder_id):
+    """
+    檔案是否沿用目標資料夾的分享設定
+
+    DRIVE_SHARE_MODE=folder 時，目標資料夾需事先設定為「知道連結的任何人皆可檢視」，
+    上傳到其中的檔案會繼承該權限，不需要逐一設定
+    """
+    return DRIVE_SHARE_MODE == 'folder' and bool(folder_id)
+
+
+def create_media_upload(data, mime_type):
+    """
+    依檔案大小選擇上傳方式
+
+    小檔案以 multipart 在同一個請求中送出 metadata 與內容（省去建立上傳工作階段的往返）；
+    大檔案使用可續傳上傳，以 DRIVE_UPLOAD_CHUNK_SIZE 分段送出，中斷時只需重送失敗的分段
+    """
+    resumable = len(data) >= DRIVE_RESUMABLE_THRESHOLD
+    metrics.incr('drive.upload.resumable' if resumable else 'drive.upload.multipart')
+    if resumable:
+        return MediaIoBaseUpload(
+            io.BytesIO(data),
+            mimetype=mime_type,
+            chunksize=DRIVE_UPLOAD_CHUNK_SIZE,
+            resumable=True
+        )
+    return MediaIoBaseUpload(io.BytesIO(data), mimetype=mime_type, resumable=False)
 
 
-def upload_image_to_drive(image_bytes, filename, folder_id=None):
+def upload_image_to_drive(image_bytes, filename, folder_id=None, mime_type='image/jpeg', share=True):
     """
     上傳圖片到 Google Drive
 
@@ -113,6 +261,10 @@ def upload_image_to_drive(image_bytes, filename, folder_id=None):
         image_bytes: 圖片的二進制數據（bytes）
         filename: 檔案名稱（例如："image_20240101_120000.jpg"）
         folder_id: 目標資料夾 ID（可選，None 則上傳到根目錄）
+        mime_type: 圖片的 MIME 類型（例如："image/png"）
+        share: 是否同時設定為公開可讀；False 時由呼叫端另外呼叫 share_file / share_files，
+               以便與其他工作（例如儲存到 Notion）同時進行或合併成批次請求。
+               沿用資料夾分享設定時（見 sharing_inherited）不會另外設定
 
     Returns:
         dict: 成功時返回包含 file_id 和 web_view_link 的字典
@@ -123,55 +275,41 @@ def upload_image_to_drive(image_bytes, filename, folder_id=None):
         None: 上傳失敗時返回 None
     """
     try:
-        # 取得 Drive 服務
+        # 取得 Drive 服務與目前 thread 的連線
         service = get_drive_service()
-        if not service:
+        http = get_http()
+        if not service or not http:
             print("無法取得 Drive 服務")
             return None
 
         # 建立檔案 metadata
         file_metadata = {
             'name': filename,
-            'mimeType': 'image/jpeg'
+            'mimeType': mime_type
         }
 
         # 如果指定了資料夾 ID，將檔案放入該資料夾
         if folder_id:
             file_metadata['parents'] = [folder_id]
 
-        # 建立 media upload
-        media = MediaIoBaseUpload(
-            io.BytesIO(image_bytes),
-            mimetype='image/jpeg',
-            resumable=True
-        )
+        # 建立 media upload（依大小選擇 multipart 或可續傳上傳）
+        media = create_media_upload(image_bytes, mime_type)
 
         # 上傳檔案
         file = service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id, webViewLink'
-        ).execute()
+        ).execute(http=http)
 
         file_id = file.get('id')
         web_view_link = file.get('webViewLink')
 
         print(f"檔案上傳成功，ID: {file_id}")
 
-        # 設定檔案權限為公開可讀（任何擁有連結的人都可以檢視）
-        try:
-            permission = {
-                'type': 'anyone',
-                'role': 'reader'
-            }
-            service.permissions().create(
-                fileId=file_id,
-                body=permission
-            ).execute()
-            print("檔案權限已設定為公開")
-        except HttpError as error:
-            print(f"設定檔案權限時發生錯誤: {error}")
+        if share and not sharing_inherited(folder_id):
             # 即使權限設定失敗，仍然返回檔案資訊
+            share_file(file_id)
 
         return {
             'file_id': file_id,
@@ -186,6 +324,82 @@ def upload_image_to_drive(image_bytes, filename, folder_id=None):
         return None
 
 
+def share_file(file_id):
+    """
+    設定檔案權限為公開可讀（任何擁有連結的人都可以檢視）
+
+    Args:
+        file_id: Google Drive 檔案 ID
+
+    Returns:
+        bool: 是否設定成功
+    """
+    try:
+        service = get_drive_service()
+        http = get_http()
+        if not service or not http:
+            print("無法取得 Drive 服務")
+            return False
+
+        metrics.incr('drive.permission_requests')
+        service.permissions().create(
+            fileId=file_id,
+            body=PUBLIC_PERMISSION,
+            fields='id'
+        ).execute(http=http)
+        print("檔案權限已設定為公開")
+        return True
+    except HttpError as error:
+        print(f"設定檔案權限時發生錯誤: {error}")
+        return False
+    except Exception as error:
+        print(f"設定檔案權限時發生錯誤: {error}")
+        return False
+
+
+def share_files(file_ids):
+    """
+    以 Drive batch API 將多個檔案設定為公開可讀（每 100 個檔案一個 HTTP 請求）
+
+    Args:
+        file_ids: Google Drive 檔案 ID 列表
+
+    Returns:
+        dict: {file_id: 是否設定成功}
+    """
+    results = {file_id: False for file_id in file_ids}
+    if len(results) <= 1:
+        return {file_id: share_file(file_id) for file_id in results}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            print(f"設定檔案 {request_id} 權限時發生錯誤: {exception}")
+        else:
+            results[request_id] = True
+
+    try:
+        service = get_drive_service()
+        http = get_http()
+        if not service or not http:
+            print("無法取得 Drive 服務")
+            return results
+
+        pending = list(results)
+        for start in range(0, len(pending), DRIVE_BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=on_response)
+            for file_id in pending[start:start + DRIVE_BATCH_LIMIT]:
+                batch.add(
+                    service.permissions().create(fileId=file_id, body=PUBLIC_PERMISSION, fields='id'),
+                    request_id=file_id
+                )
+            metrics.incr('drive.permission_requests')
+            batch.execute(http=http)
+        print(f"已設定 {sum(results.values())}/{len(results)} 個檔案為公開")
+    except Exception as error:
+        print(f"批次設定檔案權限時發生錯誤: {error}")
+    return results
+
+
 def get_shareable_link(file_id):
     """
     取得檔案的可分享連結
@@ -199,14 +413,15 @@ def get_shareable_link(file_id):
     """
     try:
         service = get_drive_service()
-        if not service:
+        http = get_http()
+        if not service or not http:
             return None
 
         # 取得檔案 metadata
         file = service.files().get(
             fileId=file_id,
             fields='webViewLink'
-        ).execute()
+        ).execute(http=http)
 
         return file.get('webViewLink')
 
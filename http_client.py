@@ -0,0 +1,107 @@
+"""
+共用 HTTP 連線模組
+提供整個程序共用的 requests Session：每個 host 各自維持 keep-alive 連線池，
+所有背景工作重複使用相同連線，並統計請求數與新建連線（TCP/TLS handshake）數
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+
+# 連線池設定
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 20))  # 保留連線池的 host 數量
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))  # 每個 host 保留的連線數量
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+
+_lock = threading.Lock()
+_session = None
+
+
+def _count_new_connection(scheme, host):
+    metrics.incr('http.connections_opened')
+    metrics.incr(f"http.{host}.connections_opened")
+    if scheme == 'https':
+        metrics.incr('http.tls_handshakes')
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def urlopen(self, *args, **kwargs):
+        metrics.incr('http.requests')
+        return super().urlopen(*args, **kwargs)
+
+    def _new_conn(self):
+        _count_new_connection('http', self.host)
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def urlopen(self, *args, **kwargs):
+        metrics.incr('http.requests')
+        return super().urlopen(*args, **kwargs)
+
+    def _new_conn(self):
+        _count_new_connection('https', self.host)
+        return super()._new_conn()
+
+
+def instrument_pool_manager(pool_manager):
+    """讓 urllib3 PoolManager 新建連線時記錄到指標（也用於 LINE SDK 內部的連線池）"""
+    pool_manager.pool_classes_by_scheme = {
+        'http': _CountingHTTPConnectionPool,
+        'https': _CountingHTTPSConnectionPool
+    }
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """套用預設 timeout 並統計連線的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        instrument_pool_manager(self.poolmanager)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def get_session():
+    """
+    取得整個程序共用的 requests Session
+
+    Returns:
+        requests.Session: 已設定連線池與預設 timeout 的 Session
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = _PooledHTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def stats():
+    """連線重用統計"""
+    requests_count = metrics.get_counter('http.requests')
+    opened = metrics.get_counter('http.connections_opened')
+    reused = max(requests_count - opened, 0)
+    return {
+        'requests': requests_count,
+        'connections_opened': opened,
+        'tls_handshakes': metrics.get_counter('http.tls_handshakes'),
+        'connections_reused': reused,
+        'reuse_ratio': round(reused / requests_count, 3) if requests_count else 0.0
+    }
@@ -0,0 +1,155 @@
+"""
+圖片前處理模組
+依檔案開頭的 magic bytes 判斷實際的圖片格式，並只解碼一次，產生送給 OpenAI Vision 的縮小版本：
+依 detail 等級縮放到模型實際會使用的解析度，再重新編碼為 JPEG，
+減少請求大小、上傳時間與 vision token 數。原始圖片保留給 Google Drive。
+
+縮放需要 Pillow；未安裝時只判斷格式，圖片原樣送出。
+解碼與縮放在 CPU process pool（cpu_pool）中執行，未啟用時在呼叫端的 thread 中執行。
+"""
+
+import io
+import logging
+import os
+from dataclasses import dataclass
+
+import cpu_pool
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Vision 的 detail 等級：low（固定 512px、最省 token）、high 或 auto（由模型決定）
+VISION_IMAGE_DETAIL = os.getenv('VISION_IMAGE_DETAIL', 'auto')
+VISION_JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', 85))
+
+# 各 detail 等級下模型實際使用的解析度上限：(長邊, 短邊)
+# high / auto 會先縮放到 2048px 內、短邊再縮到 768px；low 一律以 512px 處理
+VISION_SIZE_LIMITS = {
+    'low': (512, 512),
+    'high': (2048, 768),
+    'auto': (2048, 768),
+}
+
+# OpenAI Vision 接受的格式，其他格式（HEIC、BMP、TIFF 等）一律轉成 JPEG
+VISION_MIME_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+MIME_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/heic': 'heic',
+    'image/bmp': 'bmp',
+    'image/tiff': 'tiff',
+}
+
+
+@dataclass
+class PreparedImage:
+    """前處理後的圖片"""
+    original: bytes
+    mime_type: str
+    vision_bytes: bytes
+    vision_mime_type: str
+    width: int = 0
+    height: int = 0
+
+    @property
+    def extension(self):
+        return MIME_EXTENSIONS.get(self.mime_type, 'jpg')
+
+    @property
+    def bytes_saved(self):
+        return len(self.original) - len(self.vision_bytes)
+
+
+def detect_mime_type(data):
+    """依 magic bytes 判斷圖片格式，無法判斷時返回 image/jpeg（LINE 預設的格式）"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'heic', b'heix', b'mif1', b'msf1', b'hevc'):
+        return 'image/heic'
+    if data.startswith(b'BM'):
+        return 'image/bmp'
+    if data.startswith((b'II*\x00', b'MM\x00*')):
+        return 'image/tiff'
+    return 'image/jpeg'
+
+
+def _target_size(width, height, detail):
+    """計算縮放後的尺寸（只縮小不放大）"""
+    long_limit, short_limit = VISION_SIZE_LIMITS.get(detail, VISION_SIZE_LIMITS['auto'])
+    scale = min(1.0, long_limit / max(width, height), short_limit / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale)), scale < 1.0
+
+
+def _resize_for_vision(data, mime_type, detail):
+    """解碼並縮放圖片，返回 (JPEG bytes 或 None, 原始寬, 原始高)；data 可以是 bytes 或 memoryview"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        target_width, target_height, needs_resize = _target_size(width, height, detail)
+        if not needs_resize and mime_type in VISION_MIME_TYPES:
+            return None, width, height
+
+        if image.format == 'JPEG':
+            # JPEG 可在解碼時直接以 DCT 縮放，大幅減少解碼成本
+            image.draft('RGB', (target_width, target_height))
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # 透明背景以白色填滿後轉成 RGB
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        if needs_resize:
+            # exif_transpose 可能交換長寬，以轉正後的尺寸重新計算
+            target_width, target_height, _ = _target_size(image.width, image.height, detail)
+            image = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=VISION_JPEG_QUALITY, optimize=True)
+        return output.getvalue(), width, height
+
+
+def prepare_image(data, detail=VISION_IMAGE_DETAIL):
+    """
+    判斷圖片格式並產生送給 Vision 的版本
+
+    Returns:
+        PreparedImage: 原始圖片與 Vision 用的圖片（不需要縮放或縮放失敗時與原始圖片相同）
+    """
+    mime_type = detect_mime_type(data)
+    prepared = PreparedImage(data, mime_type, data, mime_type)
+
+    with metrics.timer('image.preprocess'):
+        try:
+            resized, prepared.width, prepared.height = cpu_pool.run(_resize_for_vision, data, mime_type, detail)
+            if resized is not None and (len(resized) < len(data) or mime_type not in VISION_MIME_TYPES):
+                prepared.vision_bytes = resized
+                prepared.vision_mime_type = 'image/jpeg'
+        except ImportError:
+            logger.info("未安裝 Pillow，圖片不縮放直接送出")
+        except Exception as e:
+            logger.warning(f"圖片前處理失敗，改用原始圖片: {str(e)}")
+
+    metrics.incr('image.bytes_original', len(data))
+    metrics.incr('image.bytes_vision', len(prepared.vision_bytes))
+    metrics.incr('image.bytes_saved', prepared.bytes_saved)
+    if prepared.bytes_saved:
+        logger.info(
+            f"圖片 {mime_type} {prepared.width}x{prepared.height} {len(data) / 1024:.0f}KB → "
+            f"Vision {len(prepared.vision_bytes) / 1024:.0f}KB（節省 {prepared.bytes_saved / len(data):.0%}）"
+        )
+    return prepared
@@ -0,0 +1,256 @@
+"""
+持久化工作佇列模組
+使用 SQLite（WAL 模式）在回覆使用者之前記錄每個被接受的工作，
+worker 執行前先認領（claim）工作，完成後標記結束。
+程序重啟或異常終止後，未完成的工作會被重新取回並繼續處理。
+由 LINE 事件產生的工作記錄事件的 webhookEventId，同一個事件重新處理時不會再新增工作。
+
+多程序部署（例如 gunicorn 多個 worker）時，每個程序以 owner 身分定期寫入心跳，
+只有 owner 心跳已逾時（程序已終止）的工作才會被其他程序接手。
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_MERGED = 'merged'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    event_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS owners (
+    owner TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+class JobStore:
+    """以 SQLite 實作的持久化工作佇列"""
+
+    def __init__(self, path, max_attempts=3, heartbeat_interval=15, owner_timeout=60, retention_days=7):
+        """
+        Args:
+            path: SQLite 資料庫檔案路徑
+            max_attempts: 單一工作最多執行次數，超過則標記為失敗（避免有問題的工作反覆重跑）
+            heartbeat_interval: 寫入心跳與檢查待恢復工作的間隔（秒）
+            owner_timeout: owner 心跳超過此秒數未更新即視為已終止
+            retention_days: 已完成或失敗的工作保留天數
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.heartbeat_interval = heartbeat_interval
+        self.owner_timeout = owner_timeout
+        self.retention_days = retention_days
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'event_id' not in columns:
+            # 舊版建立的資料庫沒有 event_id 欄位
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN event_id TEXT')
+        self._conn.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_event_id ON jobs (event_id) WHERE event_id IS NOT NULL'
+        )
+        self._heartbeat()
+
+        self._thread = None
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _heartbeat(self):
+        self._execute(
+            "INSERT INTO owners (owner, heartbeat) VALUES (?, ?) "
+            "ON CONFLICT(owner) DO UPDATE SET heartbeat = excluded.heartbeat",
+            (self.owner, time.time())
+        )
+
+    def add(self, job_type, args, event_id=None):
+        """
+        新增工作（在回覆使用者之前呼叫）
+
+        Args:
+            job_type: 工作類型名稱
+            args: 工作參數（必須可序列化為 JSON）
+            event_id: 產生此工作的 LINE 事件 webhookEventId
+
+        Returns:
+            int: 工作 ID；同一個 event_id 已經新增過工作時返回 None
+        """
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO jobs (job_type, payload, status, owner, event_id, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (event_id) WHERE event_id IS NOT NULL DO NOTHING",
+            (job_type, json.dumps(list(args), ensure_ascii=False), STATUS_PENDING, self.owner, event_id, now, now)
+        )
+        return cursor.lastrowid if cursor.rowcount == 1 else None
+
+    def merge(self, job_ids, job_type, args):
+        """
+        將多個尚未執行的工作合併成一個新工作（例如聚合視窗收齊的一組圖片）
+
+        原本的工作標記為已合併（保留 event_id，同一個事件重新處理時不會再新增），
+        與新增合併後的工作在同一個交易中完成，程序在任何時間點終止都不會遺失或重複
+
+        Returns:
+            int: 合併後的工作 ID
+        """
+        now = time.time()
+        placeholders = ', '.join('?' for _ in job_ids)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    f"UPDATE jobs SET status = ?, updated_at = ? WHERE id IN ({placeholders}) AND status = ?",
+                    (STATUS_MERGED, now, *job_ids, STATUS_PENDING)
+                )
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (job_type, payload, status, owner, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_type, json.dumps(list(args), ensure_ascii=False), STATUS_PENDING, self.owner, now, now)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return cursor.lastrowid
+
+    def claim(self, job_id):
+        """認領工作，返回是否認領成功（已被其他 worker 處理或已結束時返回 False）"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ? AND status = ? AND owner = ?",
+            (STATUS_RUNNING, time.time(), job_id, STATUS_PENDING, self.owner)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id):
+        """標記工作完成"""
+        self._execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+            (STATUS_DONE, time.time(), job_id)
+        )
+
+    def fail(self, job_id, error):
+        """標記工作失敗"""
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (STATUS_FAILED, error, time.time(), job_id)
+        )
+
+    def discard(self, job_id):
+        """刪除尚未執行的工作（例如被 worker pool 拒絕、已回覆使用者忙碌中）"""
+        self._execute("DELETE FROM jobs WHERE id = ? AND status = ?", (job_id, STATUS_PENDING))
+
+    def release(self, job_id):
+        """釋放工作，讓下一次恢復檢查時重新取回"""
+        self._execute(
+            "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ?",
+            (STATUS_PENDING, time.time(), job_id)
+        )
+
+    def recover(self):
+        """
+        取回 owner 已終止（或未指定 owner）的未完成工作，並改由目前程序負責
+
+        Returns:
+            list: [(job_id, job_type, args), ...]
+        """
+        stale_before = time.time() - self.owner_timeout
+        rows = self._execute(
+            "SELECT id, job_type, payload, owner, attempts FROM jobs "
+            "WHERE status IN (?, ?) AND (owner IS NULL OR owner NOT IN "
+            "(SELECT owner FROM owners WHERE heartbeat >= ?)) ORDER BY id",
+            (STATUS_PENDING, STATUS_RUNNING, stale_before)
+        ).fetchall()
+
+        recovered = []
+        for job_id, job_type, payload, old_owner, attempts in rows:
+            if attempts >= self.max_attempts:
+                self.fail(job_id, f"已執行 {attempts} 次仍未完成")
+                logger.error(f"工作 {job_id}（{job_type}）已達最大執行次數，標記為失敗")
+                continue
+
+            cursor = self._execute(
+                "UPDATE jobs SET status = ?, owner = ?, updated_at = ? "
+                "WHERE id = ? AND owner IS ? AND status IN (?, ?)",
+                (STATUS_PENDING, self.owner, time.time(), job_id, old_owner, STATUS_PENDING, STATUS_RUNNING)
+            )
+            if cursor.rowcount == 1:
+                recovered.append((job_id, job_type, json.loads(payload)))
+
+        return recovered
+
+    def purge(self):
+        """刪除超過保留期限的已結束工作與過期的 owner 心跳"""
+        now = time.time()
+        self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+            (STATUS_DONE, STATUS_FAILED, STATUS_MERGED, now - self.retention_days * 86400)
+        )
+        self._execute(
+            "DELETE FROM owners WHERE heartbeat < ? AND owner != ?",
+            (now - self.retention_days * 86400, self.owner)
+        )
+
+    def start(self, on_recover):
+        """
+        啟動背景維護 thread：定期寫入心跳、取回待恢復的工作並清理舊資料
+
+        Args:
+            on_recover: 取回工作時的回呼函數 on_recover(job_id, job_type, args)
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self._heartbeat()
+                    jobs = self.recover()
+                    if jobs:
+                        logger.info(f"恢復 {len(jobs)} 個未完成的工作")
+                    for job_id, job_type, args in jobs:
+                        on_recover(job_id, job_type, args)
+                    self.purge()
+                except Exception as e:
+                    logger.error(f"工作佇列維護時發生錯誤: {str(e)}")
+                time.sleep(self.heartbeat_interval)
+
+        self._thread = threading.Thread(target=loop, name='job-store-maintenance')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stats(self):
+        """各狀態的工作數量"""
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
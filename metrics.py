@@ -0,0 +1,129 @@
+"""
+執行期指標模組
+提供 thread-safe 的計數器、即時量測值（gauge）與耗時統計，
+供 /metrics endpoint 輸出，用來依實際資料調整各項容量設定
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 每個耗時指標保留的最近樣本數（用於計算百分位數）
+_SAMPLE_SIZE = 512
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+_gauges = {}
+
+
+def incr(name, value=1):
+    """累加計數器"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get_counter(name):
+    """取得計數器目前的值"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def observe(name, seconds):
+    """記錄一次耗時（秒）"""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = {
+                'count': 0,
+                'total': 0.0,
+                'max': 0.0,
+                'samples': deque(maxlen=_SAMPLE_SIZE)
+            }
+            _timings[name] = timing
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+        timing['samples'].append(seconds)
+
+
+@contextmanager
+def timer(name):
+    """量測 with 區塊的執行時間並記錄到指定指標"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def register_gauge(name, func):
+    """註冊即時量測值，func 在輸出指標時才會被呼叫"""
+    with _lock:
+        _gauges[name] = func
+
+
+def _percentile(sorted_samples, ratio):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(ratio * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def snapshot():
+    """
+    取得目前所有指標的快照
+
+    Returns:
+        dict: {'counters': {...}, 'timings': {...}, 'gauges': {...}}
+    """
+    with _lock:
+        counters = dict(_counters)
+        timings = {}
+        for name, timing in _timings.items():
+            samples = sorted(timing['samples'])
+            timings[name] = {
+                'count': timing['count'],
+                'avg': round(timing['total'] / timing['count'], 4) if timing['count'] else 0.0,
+                'max': round(timing['max'], 4),
+                'p50': round(_percentile(samples, 0.50), 4),
+                'p95': round(_percentile(samples, 0.95), 4),
+                'p99': round(_percentile(samples, 0.99), 4)
+            }
+        gauges = dict(_gauges)
+
+    gauge_values = {}
+    for name, func in gauges.items():
+        try:
+            gauge_values[name] = func()
+        except Exception as e:
+            gauge_values[name] = f"error: {e}"
+
+    return {
+        'counters': counters,
+        'timings': timings,
+        'gauges': gauge_values
+    }
+
+
+class StageTimer:
+    """記錄單一工作各階段的耗時，同時累計到對應的耗時指標"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages.append((name, elapsed))
+            observe(f"{self.prefix}.{name}", elapsed)
+
+    def summary(self):
+        """各階段耗時的文字摘要，例如 "scrape 3.21s, summarize 1.05s" """
+        return ', '.join(f"{name} {elapsed:.2f}s" for name, elapsed in self.stages)
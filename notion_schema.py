@@ -0,0 +1,237 @@
+"""
+Notion database 結構快取模組
+啟動時載入各 database 的欄位名稱、類型與 select / multi_select 選項，並定期在背景更新，
+寫入前在本地檢查 page 屬性，避免送出後才收到 400：
+- database 沒有（或類型不同）的欄位直接移除，select 與 multi_select 之間自動轉換
+- title 欄位依 database 實際的名稱改名
+- AI 生成的標籤先對照既有選項正規化（忽略大小寫、全半形、空白與符號，或字形幾乎相同），
+  選項數量達上限後不再新增，避免選項清單無限制成長
+
+同時支援新版 Notion API（2025-09-03 起）的 data source：欄位定義改由 data_sources.retrieve 取得，
+建立 page 時以 data source 作為 parent
+"""
+
+import difflib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+NOTION_SCHEMA_REFRESH = int(os.getenv('NOTION_SCHEMA_REFRESH', 600))  # 背景更新間隔（秒）
+NOTION_MAX_TAG_OPTIONS = int(os.getenv('NOTION_MAX_TAG_OPTIONS', 200))  # 每個欄位最多的選項數
+NOTION_TAG_SIMILARITY = float(os.getenv('NOTION_TAG_SIMILARITY', 0.85))  # 視為相同標籤的相似度
+
+# 查詢失敗後，至少間隔多少秒才再次查詢（避免每次寫入都多一個失敗的請求）
+LOAD_RETRY_INTERVAL = 60
+
+OPTION_TYPES = ('select', 'multi_select')
+MAX_OPTION_LENGTH = 100
+
+# 比對標籤時忽略的字元（空白、連字號、底線、井字號、標點）
+_IGNORED_CHARS = re.compile(r'[\s\-_#·・.,，、/]+')
+
+
+def option_key(name):
+    """標籤的比對鍵：NFKC 正規化（全形轉半形）、忽略大小寫與空白符號"""
+    return _IGNORED_CHARS.sub('', unicodedata.normalize('NFKC', name).casefold())
+
+
+def clean_option(name):
+    """Notion 選項名稱不可包含逗號，長度上限 100 字"""
+    return ' '.join(name.replace(',', ' ').split())[:MAX_OPTION_LENGTH]
+
+
+@dataclass
+class DatabaseSchema:
+    """database 的欄位定義"""
+    types: dict
+    options: dict = field(default_factory=dict)
+    title_property: str = 'Name'
+    data_source_id: str = None
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+def parse_schema(properties, data_source_id=None):
+    """由 Notion 回應中的 properties 建立 DatabaseSchema"""
+    schema = DatabaseSchema(types={}, data_source_id=data_source_id)
+    for name, prop in properties.items():
+        prop_type = prop['type']
+        schema.types[name] = prop_type
+        if prop_type == 'title':
+            schema.title_property = name
+        elif prop_type in OPTION_TYPES:
+            schema.options[name] = [option['name'] for option in prop.get(prop_type, {}).get('options', [])]
+    return schema
+
+
+class SchemaCache:
+    """各 database 結構的快取，查詢失敗時保留上一次的結果"""
+
+    def __init__(self, client, refresh_interval=NOTION_SCHEMA_REFRESH):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._schemas = {}
+        self._failed_at = {}
+        self._database_ids = set()
+
+    def load(self, database_id):
+        """向 Notion 查詢 database 結構並更新快取，失敗時返回 None"""
+        try:
+            with metrics.timer('notion.schema.load'):
+                database = self.client.databases.retrieve(database_id=database_id)
+                if 'properties' in database:
+                    schema = parse_schema(database['properties'])
+                else:
+                    # 新版 API：欄位定義在 data source 上（只使用第一個 data source）
+                    data_source_id = database['data_sources'][0]['id']
+                    data_source = self.client.data_sources.retrieve(data_source_id=data_source_id)
+                    schema = parse_schema(data_source['properties'], data_source_id)
+        except Exception as e:
+            metrics.incr('notion.schema.load_failed')
+            logger.warning(f"取得 Notion database {database_id} 欄位時發生錯誤: {str(e)}")
+            with self._lock:
+                self._failed_at[database_id] = time.monotonic()
+            return None
+
+        with self._lock:
+            self._schemas[database_id] = schema
+            self._failed_at.pop(database_id, None)
+        return schema
+
+    def get(self, database_id):
+        """取得 database 結構（未載入時立即查詢），無法取得時返回 None"""
+        with self._lock:
+            self._database_ids.add(database_id)
+            schema = self._schemas.get(database_id)
+            failed_at = self._failed_at.get(database_id)
+        if schema is not None:
+            return schema
+        if failed_at is not None and time.monotonic() - failed_at < LOAD_RETRY_INTERVAL:
+            return None
+        return self.load(database_id)
+
+    def start(self, database_ids):
+        """啟動背景 thread：立即載入各 database 的結構，之後每 refresh_interval 秒更新一次"""
+        with self._lock:
+            self._database_ids.update(database_id for database_id in database_ids if database_id)
+        thread = threading.Thread(target=self._refresh_loop, name='notion-schema')
+        thread.daemon = True
+        thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                database_ids = list(self._database_ids)
+            for database_id in database_ids:
+                self.load(database_id)
+            time.sleep(self.refresh_interval)
+
+    def parent(self, database_id):
+        """建立 page 時使用的 parent（新版 API 以 data source 為 parent）"""
+        schema = self.get(database_id)
+        if schema is not None and schema.data_source_id:
+            return {'data_source_id': schema.data_source_id}
+        return {'database_id': database_id}
+
+    def normalize_options(self, database_id, property_name, names):
+        """
+        將選項名稱對照既有選項正規化
+
+        - 比對鍵相同（忽略大小寫、全半形、空白與符號）或相似度達 NOTION_TAG_SIMILARITY 時使用既有選項
+        - 選項數已達 NOTION_MAX_TAG_OPTIONS 時，沒有對應既有選項的名稱直接捨棄
+        - 新增的選項加入快取，之後的 page 沿用相同寫法
+        """
+        with self._lock:
+            schema = self._schemas.get(database_id)
+            if schema is None or property_name not in schema.options:
+                return list(dict.fromkeys(clean_option(name) for name in names if clean_option(name)))
+
+            existing = schema.options[property_name]
+            keys = {option_key(option): option for option in existing}
+            result = []
+            for name in names:
+                name = clean_option(name)
+                key = option_key(name)
+                if not key:
+                    continue
+                match = keys.get(key)
+                if match is None:
+                    close = difflib.get_close_matches(key, keys, n=1, cutoff=NOTION_TAG_SIMILARITY)
+                    match = keys[close[0]] if close else None
+                if match is None:
+                    if len(existing) >= NOTION_MAX_TAG_OPTIONS:
+                        metrics.incr('notion.tags.dropped')
+                        continue
+                    existing.append(name)
+                    keys[key] = name
+                    match = name
+                    metrics.incr('notion.tags.created')
+                elif match != name:
+                    metrics.incr('notion.tags.normalized')
+                if match not in result:
+                    result.append(match)
+            return result
+
+    def prepare(self, database_id, properties, optional=()):
+        """
+        寫入前在本地檢查並調整 page 屬性
+
+        - database 沒有的欄位（或類型不同且無法轉換）會被移除；optional 以外的欄位被移除時記錄警告
+        - title 欄位改用 database 實際的名稱
+        - select / multi_select 的值依欄位類型互相轉換，並對照既有選項正規化
+        無法取得 database 結構時，只移除 optional 欄位，其餘原樣送出
+        """
+        schema = self.get(database_id)
+        if schema is None:
+            return {name: value for name, value in properties.items() if name not in optional}
+
+        prepared = {}
+        for name, value in properties.items():
+            value_type = next(iter(value))
+            if value_type == 'title':
+                prepared[schema.title_property] = value
+                continue
+
+            target_type = schema.types.get(name)
+            if target_type in OPTION_TYPES and value_type in OPTION_TYPES:
+                value = self._option_value(database_id, name, value, value_type, target_type)
+            elif target_type != value_type:
+                if name not in optional:
+                    metrics.incr('notion.schema.dropped_properties')
+                    logger.warning(
+                        f"Notion database {database_id} 沒有 {value_type} 欄位「{name}」"
+                        f"{f'（實際類型為 {target_type}）' if target_type else ''}，略過此欄位"
+                    )
+                continue
+            prepared[name] = value
+        return prepared
+
+    def _option_value(self, database_id, name, value, value_type, target_type):
+        if value_type == 'select':
+            names = [value['select']['name']] if value['select'] else []
+        else:
+            names = [option['name'] for option in value['multi_select']]
+        names = self.normalize_options(database_id, name, names)
+        if target_type == 'select':
+            return {'select': {'name': names[0]} if names else None}
+        return {'multi_select': [{'name': option} for option in names]}
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                database_id: {
+                    'age': round(now - schema.loaded_at),
+                    'properties': len(schema.types),
+                    'options': {name: len(options) for name, options in schema.options.items()}
+                }
+                for database_id, schema in self._schemas.items()
+            }
@@ -0,0 +1,417 @@
+"""
+Notion 寫入模組
+所有 Notion 寫入（語音筆記、摘要、圖片三個 database 的 page 建立等）共用同一個 NotionWriter：
+- 單一佇列：各 database 的寫入依到達順序排隊，由少數 worker thread 依速率上限送出
+- token bucket：整個 integration 的請求速率維持在 Notion 的上限（約每秒 3 個請求）內
+- 429 依 Retry-After 暫停所有 worker；連線階段的錯誤以指數退避加隨機抖動重試
+- pages.create、blocks.children.append 不是冪等操作：5xx、409、讀取逾時等請求可能已被 Notion 寫入的錯誤，
+  只有在查詢確認尚未寫入後才重試（page 以 NOTION_REQUEST_ID_PROPERTY 欄位記錄的 request ID 查詢，
+  內文以 page 目前的 block 數量判斷），database 沒有此欄位時不重試，避免產生重複的筆記
+呼叫端取得 concurrent.futures.Future，可同步等待，或在 asyncio 中以 asyncio.wrap_future 等待
+
+Notion 沒有一次建立多個 page 的 API，各 database 的 page 無法合併成同一個請求；
+合併送出是以 block 為單位：page 內文盡量併入 pages.create，其餘以每批最多 100 個 block 附加
+
+長文字依 Notion 的限制切分：每個 rich_text 物件最多 2000 字、每個陣列最多 100 個元素；
+放不進屬性的長內容改存成 page 內文的 paragraph blocks，建立 page 時一起送出前 100 個，
+其餘以 blocks.children.append 分批附加
+"""
+
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import httpx
+from notion_client import Client
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+NOTION_RATE_LIMIT = float(os.getenv('NOTION_RATE_LIMIT', 3))  # 每秒請求數
+NOTION_RATE_BURST = int(os.getenv('NOTION_RATE_BURST', 3))  # 閒置後可連續送出的請求數
+NOTION_WRITER_WORKERS = int(os.getenv('NOTION_WRITER_WORKERS', 3))
+NOTION_MAX_RETRIES = int(os.getenv('NOTION_MAX_RETRIES', 5))
+NOTION_RETRY_BASE_DELAY = 0.5  # 指數退避的基準秒數
+NOTION_RETRY_MAX_DELAY = 30.0
+
+# Notion API 的內容限制
+RICH_TEXT_MAX_CHARS = 2000  # 單一 rich_text 物件的字數上限
+MAX_ARRAY_ITEMS = 100  # rich_text 陣列與每次送出的 block 數量上限
+MAX_REQUEST_BYTES = 400 * 1024  # 每個請求的內容大小（Notion 上限為 500KB，保留 headers 等空間）
+# 屬性中最多保存的字數，更長的內容完整存到 page 內文
+NOTION_PROPERTY_MAX_CHARS = int(os.getenv('NOTION_PROPERTY_MAX_CHARS', 2000))
+
+# 記錄 request ID 的 rich_text 欄位名稱（database 有此欄位時，暫時性錯誤可先查詢再安全重試）
+NOTION_REQUEST_ID_PROPERTY = os.getenv('NOTION_REQUEST_ID_PROPERTY', 'Request ID')
+
+# 暫時性錯誤的 HTTP 狀態碼（409 為 Notion 的寫入衝突，官方建議重試）
+TRANSIENT_STATUS = {409, 429, 500, 502, 503, 504}
+
+
+def create_client(auth):
+    """建立寫入用的 Notion client（關閉 client 內建的重試，由 NotionWriter 統一處理）"""
+    try:
+        return Client(auth=auth, retry=False)
+    except TypeError:
+        # 舊版 notion-client 沒有內建重試
+        return Client(auth=auth)
+
+
+def split_text(text, limit=RICH_TEXT_MAX_CHARS):
+    """將文字切分成不超過 limit 字的片段，盡量在換行處切分"""
+    segments = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit) + 1 or limit
+        segments.append(text[:cut])
+        text = text[cut:]
+    if text or not segments:
+        segments.append(text)
+    return segments
+
+
+def rich_text(text, max_chars=None):
+    """
+    建立 rich_text 陣列（每段最多 2000 字、最多 100 段）
+
+    Args:
+        max_chars: 最多保留的字數，超過時截斷並加上「…」
+    """
+    limit = min(max_chars or RICH_TEXT_MAX_CHARS * MAX_ARRAY_ITEMS, RICH_TEXT_MAX_CHARS * MAX_ARRAY_ITEMS)
+    if len(text) > limit:
+        text = text[:limit - 1] + '…'
+    return [{"text": {"content": segment}} for segment in split_text(text)]
+
+
+def paragraph_blocks(text):
+    """將文字轉成 paragraph blocks：依段落合併到接近 2000 字，過長的段落切成多個 rich_text 片段"""
+    blocks = []
+    current = ''
+    for paragraph in text.split('\n'):
+        if current and len(current) + 1 + len(paragraph) > RICH_TEXT_MAX_CHARS:
+            blocks.append(current)
+            current = ''
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current.strip():
+        blocks.append(current)
+
+    return [
+        {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {"rich_text": rich_text(block)}
+        }
+        for block in blocks
+    ]
+
+
+def overflow_blocks(text, max_chars=NOTION_PROPERTY_MAX_CHARS):
+    """內容超過屬性保存的字數時，返回完整內容的 paragraph blocks；否則返回 None"""
+    if len(text) <= max_chars:
+        return None
+    return paragraph_blocks(text)
+
+
+def batch_blocks(blocks, max_blocks=MAX_ARRAY_ITEMS, max_bytes=MAX_REQUEST_BYTES):
+    """將 blocks 分批：每批最多 max_blocks 個，內容大小（JSON 編碼後）不超過 max_bytes"""
+    batches = []
+    current = []
+    size = 0
+    for block in blocks:
+        block_size = len(json.dumps(block))
+        if current and (len(current) >= max_blocks or size + block_size > max_bytes):
+            batches.append(current)
+            current = []
+            size = 0
+        current.append(block)
+        size += block_size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def is_transient(error):
+    """是否為暫時性錯誤（請求可能已被 Notion 處理）"""
+    if isinstance(error, HTTPResponseError):
+        return error.status in TRANSIENT_STATUS
+    return isinstance(error, (RequestTimeoutError, httpx.TransportError))
+
+
+def is_retryable(error):
+    """是否可直接重試：429 或連線階段就失敗，請求確定沒有被 Notion 處理"""
+    if isinstance(error, HTTPResponseError):
+        return error.status == 429
+    if isinstance(error, RequestTimeoutError):
+        # notion-client 將 httpx 的逾時轉成 RequestTimeoutError，原始例外保留在 __context__
+        error = error.__context__
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def retry_after(error):
+    """429 回應的 Retry-After 秒數，沒有時返回 None"""
+    headers = getattr(error, 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """thread-safe 的 token bucket，另外支援收到 429 時暫停所有請求"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個 token（必要時等待），返回等待的秒數"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """在 seconds 秒內不發出任何 token，並清空累積的 token"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class _WriteRequest:
+    __slots__ = ('operation', 'func', 'kwargs', 'dedupe', 'future', 'enqueued_at')
+
+    def __init__(self, operation, func, kwargs, dedupe=None):
+        self.operation = operation
+        self.func = func
+        self.kwargs = kwargs
+        self.dedupe = dedupe
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class NotionWriter:
+    """Notion 寫入佇列，所有寫入共用速率上限與重試策略"""
+
+    def __init__(self, client, rate=NOTION_RATE_LIMIT, burst=NOTION_RATE_BURST,
+                 workers=NOTION_WRITER_WORKERS, max_retries=NOTION_MAX_RETRIES):
+        self.client = client
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'in_flight': 0, 'completed': 0, 'failed': 0, 'retries': 0, 'rate_limited': 0,
+            'deduplicated': 0
+        }
+
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'notion-writer-{index}')
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, operation, func, dedupe=None, **kwargs):
+        """
+        排入一個寫入請求
+
+        Args:
+            operation: 請求名稱（用於指標與日誌，例如 "pages.create"）
+            func: 實際呼叫的 client 方法，例如 client.pages.create
+            dedupe: 請求可能已被寫入時（5xx、逾時等）呼叫的查詢函數，已寫入時返回結果、尚未寫入時返回 None；
+                沒有提供時這類錯誤不重試
+
+        Returns:
+            Future: 結果為 API 回應；重試用盡或不可重試的錯誤時為該例外
+        """
+        request = _WriteRequest(operation, func, kwargs, dedupe)
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._queue.put(request)
+        return request.future
+
+    def create_page(self, database_id, properties, children=None, parent=None):
+        """
+        在 database 中建立 page
+
+        children 的第一批隨 pages.create 一起送出，其餘依序以 blocks.children.append 附加；
+        parent 預設為 database，新版 API 的 data source 可另外指定。
+        parent 為 data source 且 properties 包含 NOTION_REQUEST_ID_PROPERTY 欄位時，
+        暫時性錯誤會先以該 request ID 查詢再重試
+
+        Returns:
+            Future: 所有內容寫入後完成，結果為 pages.create 的回應
+        """
+        batches = batch_blocks(children or [])
+        parent = parent or {'database_id': database_id}
+        kwargs = {'parent': parent, 'properties': properties}
+        if batches:
+            kwargs['children'] = batches[0]
+        request_id = properties.get(NOTION_REQUEST_ID_PROPERTY)
+        dedupe = None
+        if request_id is not None and 'data_source_id' in parent:
+            dedupe = functools.partial(self._find_page, parent, request_id['rich_text'][0]['text']['content'])
+        elif request_id is not None:
+            # 目前的 API 版本只能查詢 data source；尚未取得 data source 時無法確認是否已寫入，這類錯誤不重試
+            logger.warning(f"Notion database {database_id} 尚未取得 data source，暫時錯誤時不重試建立 page")
+        created = self.submit('pages.create', self.client.pages.create, dedupe=dedupe, **kwargs)
+        if len(batches) <= 1:
+            return created
+
+        done = Future()
+
+        def append(page, index):
+            if index == len(batches):
+                done.set_result(page)
+                return
+            # 已寫入的 block 數量達到這一批之後的數量，表示先前失敗的請求其實已經寫入
+            expected = sum(len(batch) for batch in batches[:index + 1])
+            appended = self.submit(
+                'blocks.children.append', self.client.blocks.children.append,
+                dedupe=functools.partial(self._find_blocks, page['id'], expected),
+                block_id=page['id'], children=batches[index]
+            )
+            appended.add_done_callback(lambda future: on_done(future, page, index + 1))
+
+        def on_done(future, page, next_index):
+            error = future.exception()
+            if error is not None:
+                if page is not None:
+                    logger.error(f"Notion page {page['id']} 內文只寫入了 {next_index - 1}/{len(batches)} 批")
+                done.set_exception(error)
+            else:
+                append(future.result() if page is None else page, next_index)
+
+        created.add_done_callback(lambda future: on_done(future, None, 1))
+        return done
+
+    def _find_page(self, parent, request_id):
+        """以 request ID 查詢已建立的 page，找不到時返回 None"""
+        query_filter = {'property': NOTION_REQUEST_ID_PROPERTY, 'rich_text': {'equals': request_id}}
+        self._bucket.acquire()
+        response = self.client.data_sources.query(
+            data_source_id=parent['data_source_id'], filter=query_filter, page_size=1
+        )
+        return response['results'][0] if response['results'] else None
+
+    def _find_blocks(self, block_id, expected):
+        """page 的 block 數量已達 expected 時返回最後一頁的查詢結果，否則返回 None"""
+        count = 0
+        cursor = None
+        while True:
+            self._bucket.acquire()
+            kwargs = {'start_cursor': cursor} if cursor else {}
+            response = self.client.blocks.children.list(block_id=block_id, page_size=100, **kwargs)
+            count += len(response['results'])
+            if count >= expected:
+                return response
+            if not response.get('has_more'):
+                return None
+            cursor = response['next_cursor']
+
+    def _worker(self):
+        while True:
+            request = self._queue.get()
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._stats['in_flight'] += 1
+            try:
+                result = self._execute(request)
+            except Exception as e:
+                self._finish(request, 'failed')
+                request.future.set_exception(e)
+            else:
+                self._finish(request, 'completed')
+                request.future.set_result(result)
+
+    def _finish(self, request, outcome):
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            self._stats[outcome] += 1
+        metrics.observe('notion.write.total', time.perf_counter() - request.enqueued_at)
+
+    def _execute(self, request):
+        metrics.observe('notion.write.wait', time.perf_counter() - request.enqueued_at)
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            start = time.perf_counter()
+            try:
+                return request.func(**request.kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                metrics.observe(f"notion.{request.operation}", time.perf_counter() - start)
+
+            if not is_transient(error) or attempt >= self.max_retries:
+                raise error
+            if not is_retryable(error) and request.dedupe is None:
+                # 請求可能已經寫入，無法確認時不重試，避免重複建立
+                logger.error(f"Notion {request.operation} 失敗且可能已寫入，不重試: {str(error)}")
+                raise error
+            delay = self._retry_delay(error, attempt)
+            attempt += 1
+            with self._lock:
+                self._stats['retries'] += 1
+            logger.warning(
+                f"Notion {request.operation} 暫時失敗（{str(error)}），{delay:.1f} 秒後第 {attempt} 次重試"
+            )
+            time.sleep(delay)
+
+            if not is_retryable(error):
+                existing = self._dedupe(request, error)
+                if existing is not None:
+                    return existing
+
+    def _dedupe(self, request, error):
+        """確認可能已寫入的請求是否已經生效，已生效時返回結果；無法確認時拋出原本的錯誤"""
+        try:
+            existing = request.dedupe()
+        except Exception as e:
+            logger.error(f"Notion {request.operation} 無法確認是否已寫入（{str(e)}），不重試")
+            raise error from e
+        if existing is not None:
+            with self._lock:
+                self._stats['deduplicated'] += 1
+            logger.info(f"Notion {request.operation} 先前的請求已寫入，不再重送")
+        return existing
+
+    def _retry_delay(self, error, attempt):
+        wait = retry_after(error)
+        if getattr(error, 'status', None) == 429:
+            with self._lock:
+                self._stats['rate_limited'] += 1
+            # 速率上限是整個 integration 共用，暫停所有 worker
+            wait = wait if wait is not None else NOTION_RETRY_BASE_DELAY * 2 ** attempt
+            self._bucket.pause(wait)
+            return wait + random.uniform(0, NOTION_RETRY_BASE_DELAY)
+        if wait is not None:
+            return wait
+        # full jitter：在 0 到指數退避上限之間隨機等待，避免多個 worker 同時重試
+        return random.uniform(0, min(NOTION_RETRY_MAX_DELAY, NOTION_RETRY_BASE_DELAY * 2 ** (attempt + 1)))
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self._queue.qsize(), **self._stats}
@@ -0,0 +1,779 @@
+"""
+網址內容爬取模組
+以來源註冊表（registry）統一處理社群貼文與一般網頁：
+每個來源宣告 URL 比對規則、Apify Actor（或自訂抓取函數）以及欄位提取函數，
+共用的爬取引擎負責啟動執行、等待、取得結果、限制長度與記錄指標。
+抓取結果依正規化後的 URL 快取，重複轉傳的貼文或文章不會再次爬取；
+一般網頁過期後以 ETag / Last-Modified 發送條件式請求重新驗證。
+
+新增來源（例如 TikTok、Threads、X）只需要撰寫提取函數並以 register_source() 註冊。
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+import cache
+import cpu_pool
+import extractors
+import http_client
+import metrics
+
+logger = logging.getLogger(__name__)
+
+APIFY_API_KEY = os.getenv('APIFY_API_KEY')
+APIFY_RUN_TIMEOUT = int(os.getenv('APIFY_RUN_TIMEOUT', 60))
+APIFY_API_BASE = "https://api.apify.com/v2"
+APIFY_TERMINAL_STATUSES = ['SUCCEEDED', 'FAILED', 'ABORTED', 'TIMED-OUT']
+# 單一 waitForFinish 請求最多等待的秒數（Apify API 上限）
+APIFY_MAX_WAIT_PER_REQUEST = 60
+
+# 單頁內容長度上限（限制記憶體用量；送給 OpenAI 的 token 數由摘要的分段與 token 預算控制）
+MAX_CONTENT_CHARS = int(os.getenv('SCRAPE_MAX_CHARS', 200000))
+
+# 爬取結果快取設定
+URL_CACHE_PATH = os.getenv('URL_CACHE_PATH', '')  # SQLite 檔案路徑，空白表示只使用記憶體
+URL_CACHE_MAX_ENTRIES = int(os.getenv('URL_CACHE_MAX_ENTRIES', 1000))
+# 各 pool 類型的快取有效秒數（社群貼文內容少有變動，一般網頁較常更新）
+URL_CACHE_TTL = {
+    'social': int(os.getenv('URL_CACHE_TTL_SOCIAL', 86400)),
+    'web': int(os.getenv('URL_CACHE_TTL_WEB', 21600))
+}
+
+# 正規化 URL 時移除的追蹤參數（utm_* 另外處理）
+TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'igsh', 'mibextid', 'si', 'ref_src', 'mc_cid', 'mc_eid', '_ga'}
+
+# 一般網頁串流讀取設定：最多讀取的位元組數（解壓縮後）與每次讀取的區塊大小
+WEB_MAX_BYTES = int(os.getenv('WEB_MAX_BYTES', 2 * 1024 * 1024))
+WEB_EXTRACTOR = os.getenv('WEB_EXTRACTOR', 'readability')  # readability 或 stream
+WEB_CHUNK_SIZE = 64 * 1024
+
+# 設定 User-Agent 避免被封鎖
+WEB_REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+
+@dataclass(frozen=True)
+class ScraperSource:
+    """
+    爬取來源定義
+
+    Attributes:
+        name: 來源名稱（同時作為持久化工作類型名稱）
+        kind: 使用的 worker pool 類型（social 或 web）
+        source_type: 儲存到 Notion 的來源類型（社群、網頁）
+        domains: 比對的網域（同時符合其子網域），空白表示符合所有 URL（一般網頁）
+        actor_id: Apify Actor ID（使用 Apify 爬取時設定）
+        build_input: 建立 Actor input 的函數 build_input(url)
+        extract: 從 Apify 結果提取文字的函數 extract(item)
+        fetch: 自訂抓取函數 fetch(url)，未使用 Apify 時設定
+        fetch_async: 自訂抓取函數的非同步版本 fetch_async(session, url)
+        conditional_get: fetch 支援條件式請求，呼叫時傳入 validators 並返回 (內容, validators)，
+            內容未變更時返回 NOT_MODIFIED
+        cache_ttl: 快取有效秒數，None 表示使用 pool 類型的預設值（0 表示不快取）
+        detected_text / failed_text / done_text / source_text / error_text: 回覆與推送給使用者的訊息
+    """
+    name: str
+    kind: str
+    source_type: str
+    domains: tuple
+    detected_text: str
+    failed_text: str
+    done_text: str
+    source_text: str
+    error_text: str
+    actor_id: Optional[str] = None
+    build_input: Optional[Callable] = None
+    extract: Optional[Callable] = None
+    fetch: Optional[Callable] = None
+    fetch_async: Optional[Callable] = None
+    conditional_get: bool = False
+    cache_ttl: Optional[int] = None
+
+    def matches(self, url):
+        """檢查 URL 的 host 是否為此來源的網域或其子網域"""
+        if not self.domains:
+            return True
+        try:
+            host = urlparse(url).hostname
+        except Exception:
+            return False
+        if not host:
+            return False
+        host = host.rstrip('.')
+        return any(host == domain or host.endswith('.' + domain) for domain in self.domains)
+
+
+def social_source(name, label, domains, actor_id, build_input, extract):
+    """建立使用 Apify 爬取的社群來源"""
+    return ScraperSource(
+        name=name,
+        kind='social',
+        source_type='社群',
+        domains=tuple(domains),
+        actor_id=actor_id,
+        build_input=build_input,
+        extract=extract,
+        detected_text=f"🔗 偵測到 {label} 連結，正在抓取並生成摘要...",
+        failed_text=f"⚠️ 無法抓取 {label} 內容，請檢查 URL 是否正確或稍後再試。",
+        done_text=f"{label} 貼文已摘要並儲存到 Notion",
+        source_text="📱 來源：社群",
+        error_text=f"抱歉，處理 {label} URL 摘要時發生錯誤。"
+    )
+
+
+def normalize_url(url):
+    """
+    正規化 URL 作為快取鍵：scheme 與 host 轉小寫、移除預設 port、fragment、
+    結尾斜線與追蹤參數，其餘查詢參數依名稱排序
+    """
+    url = url.strip()
+    try:
+        parsed = urlparse(url)
+        scheme = (parsed.scheme or 'https').lower()
+        netloc = (parsed.hostname or '').lower()
+        if parsed.port and (scheme, parsed.port) not in (('http', 80), ('https', 443)):
+            netloc = f"{netloc}:{parsed.port}"
+    except ValueError:
+        return url
+
+    path = parsed.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    return urlunparse((scheme, netloc, path, '', urlencode(query), ''))
+
+
+def truncate_content(content, limit=MAX_CONTENT_CHARS):
+    """限制內容長度"""
+    if len(content) > limit:
+        content = content[:limit] + "\n\n[內容過長，已截斷...]"
+    return content
+
+
+# ---------- Instagram ----------
+
+def build_instagram_run_input(url):
+    """建立 Instagram Scraper 的 Actor input"""
+    return {
+        "directUrls": [url],
+        "resultsType": "posts",
+        "resultsLimit": 1,
+        "searchLimit": 1,
+        "addParentData": False
+    }
+
+
+def extract_instagram_post(post):
+    """提取 Instagram 貼文的主要內容"""
+    text_parts = []
+
+    # 嘗試不同的欄位名稱（不同 scraper 可能使用不同名稱）
+    caption = post.get('caption') or post.get('text') or post.get('description')
+    if caption:
+        text_parts.append(f"貼文內容：\n{caption}")
+
+    post_url = post.get('url') or post.get('postUrl') or post.get('displayUrl')
+    if post_url:
+        text_parts.append(f"\n原始連結：{post_url}")
+
+    # 其他可能的欄位
+    likes = post.get('likesCount') or post.get('likes')
+    if likes:
+        text_parts.append(f"\n按讚數：{likes}")
+
+    comments = post.get('commentsCount') or post.get('comments')
+    if comments:
+        text_parts.append(f"留言數：{comments}")
+
+    owner = post.get('ownerUsername') or post.get('username') or post.get('owner')
+    if owner:
+        text_parts.append(f"發布者：@{owner}")
+
+    return '\n'.join(text_parts) if text_parts else str(post)
+
+
+# ---------- Facebook ----------
+
+def build_facebook_run_input(url):
+    """建立 Facebook Posts Scraper 的 Actor input"""
+    return {
+        "startUrls": [{"url": url}],
+        "maxPosts": 1,
+        "resultsLimit": 1
+    }
+
+
+def extract_facebook_post(post):
+    """提取 Facebook 貼文的主要內容"""
+    text_parts = []
+
+    if 'text' in post and post['text']:
+        text_parts.append(f"貼文內容：\n{post['text']}")
+
+    if 'url' in post:
+        text_parts.append(f"\n原始連結：{post['url']}")
+
+    # 其他可能的欄位
+    if 'likes' in post:
+        text_parts.append(f"\n按讚數：{post['likes']}")
+
+    if 'comments' in post:
+        text_parts.append(f"留言數：{post['comments']}")
+
+    if 'shares' in post:
+        text_parts.append(f"分享數：{post['shares']}")
+
+    return '\n'.join(text_parts)
+
+
+# ---------- 一般網頁 ----------
+
+# 條件式請求確認內容未變更時，抓取函數返回的標記
+NOT_MODIFIED = object()
+
+
+def _conditional_headers(validators):
+    """依快取的驗證資訊建立條件式請求 header"""
+    headers = dict(WEB_REQUEST_HEADERS)
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def _response_validators(headers):
+    """從回應 header 取出之後重新驗證用的 ETag / Last-Modified"""
+    validators = {
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified')
+    }
+    return {key: value for key, value in validators.items() if value} or None
+
+
+def scrape_web_content(url, validators=None):
+    """
+    從 URL 抓取網頁內容並提取純文字
+
+    Args:
+        validators: 快取的 ETag / Last-Modified，有提供時發送條件式請求
+
+    Returns:
+        tuple: (純文字內容, 新的 validators)
+        NOT_MODIFIED: 內容未變更（伺服器返回 304）
+    """
+    http_session = http_client.get_session()
+
+    # 以串流方式發送請求（30 秒超時），邊下載邊解析
+    with http_session.get(url, headers=_conditional_headers(validators), timeout=30, stream=True) as response:
+        if response.status_code == 304 and validators:
+            return NOT_MODIFIED
+        response.raise_for_status()
+
+        content_type = response.headers.get('Content-Type', '')
+        extractors.check_content_type(content_type)
+        reader = _page_reader(content_type)
+        for chunk in response.iter_content(chunk_size=WEB_CHUNK_SIZE):
+            if not reader.feed(chunk):
+                # 已收集足夠文字或達到位元組上限，不再下載剩餘內容
+                break
+
+        return _finish_page(url, reader, _close_reader(reader)), _response_validators(response.headers)
+
+
+async def scrape_web_content_async(session, url, validators=None):
+    """從 URL 抓取網頁內容並提取純文字（非同步版本，逐段解析以避免長時間佔用 event loop）"""
+    async with session.get(url, headers=_conditional_headers(validators)) as response:
+        if response.status == 304 and validators:
+            return NOT_MODIFIED
+        response.raise_for_status()
+
+        content_type = response.headers.get('Content-Type', '')
+        extractors.check_content_type(content_type)
+        reader = _page_reader(content_type)
+        async for chunk in response.content.iter_chunked(WEB_CHUNK_SIZE):
+            if not reader.feed(chunk):
+                break
+
+        text = await _close_reader_async(reader)
+        return _finish_page(url, reader, text), _response_validators(response.headers)
+
+
+def _page_reader(content_type):
+    """
+    建立網頁讀取器
+
+    CPU process pool 啟用且使用 readability 提取器時（需要讀完才能解析），只收集內容，
+    讀取結束後整份交給 pool 解析；否則邊下載邊解析
+    """
+    if cpu_pool.enabled() and WEB_EXTRACTOR == 'readability':
+        return extractors.BufferedPageReader(content_type, WEB_MAX_BYTES)
+    return extractors.PageReader(content_type, WEB_MAX_BYTES, MAX_CONTENT_CHARS, WEB_EXTRACTOR)
+
+
+def _close_reader(reader):
+    """結束解析並返回文字"""
+    if isinstance(reader, extractors.BufferedPageReader):
+        text, reader.charset = cpu_pool.run(
+            extractors.extract_page, reader.content_type, reader.data, MAX_CONTENT_CHARS, WEB_EXTRACTOR
+        )
+        return text
+    return reader.close()
+
+
+async def _close_reader_async(reader):
+    """_close_reader 的非同步版本（等待 process pool 時不佔用 event loop）"""
+    if isinstance(reader, extractors.BufferedPageReader):
+        text, reader.charset = await cpu_pool.run_async(
+            extractors.extract_page, reader.content_type, reader.data, MAX_CONTENT_CHARS, WEB_EXTRACTOR
+        )
+        return text
+    return reader.close()
+
+
+def _finish_page(url, reader, text):
+    """記錄讀取量"""
+    metrics.incr('scrape.web.bytes_read', reader.bytes_read)
+    if reader.truncated:
+        metrics.incr('scrape.web.stopped_early')
+        logger.info(f"網頁讀取 {reader.bytes_read} bytes 後提前停止（{reader.charset}）: {url}")
+    return text
+
+
+# ---------- Apify ----------
+
+def _connect_failed(error):
+    """
+    請求是否在連線階段就失敗（尚未送出，Apify 不會啟動執行）
+
+    讀取逾時或連線中斷時請求可能已送達，Actor 仍在 Apify 上執行，不能再啟動一次
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def run_apify_actor(actor_id, run_input):
+    """
+    執行 Apify Actor 並取得 dataset 結果
+    優先使用 run-sync-get-dataset-items（單一請求等待執行完成並直接返回結果），
+    同步端點在連線階段就失敗時，改為啟動執行後以 waitForFinish long-poll 等待。
+    讀取逾時或伺服器錯誤時 Actor 可能已經啟動，不再另外啟動新的執行（避免重複消耗額度）
+
+    Returns:
+        list: dataset 項目
+        None: Actor 執行失敗或超時
+    """
+    http_session = http_client.get_session()
+    timer = metrics.StageTimer('apify')
+
+    try:
+        with timer.stage('run_sync'):
+            response = http_session.post(
+                f"{APIFY_API_BASE}/acts/{actor_id}/run-sync-get-dataset-items",
+                params={'token': APIFY_API_KEY, 'timeout': APIFY_RUN_TIMEOUT},
+                json=run_input,
+                timeout=(http_client.HTTP_CONNECT_TIMEOUT, APIFY_RUN_TIMEOUT + 30)
+            )
+
+        if response.status_code == 408:
+            logger.error("等待 Apify Actor 執行超時")
+            return None
+
+        if response.status_code >= 500:
+            logger.error(f"Apify 同步執行返回 {response.status_code}")
+            return None
+
+        response.raise_for_status()
+        return response.json()
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        if not _connect_failed(e):
+            logger.error(f"Apify 同步執行失敗: {str(e)}")
+            return None
+        logger.warning(f"Apify 同步端點連線失敗，改用 waitForFinish 等待: {str(e)}")
+    finally:
+        logger.info(f"Apify {actor_id} 階段耗時：{timer.summary()}")
+
+    return run_apify_actor_polling(actor_id, run_input)
+
+
+def run_apify_actor_polling(actor_id, run_input):
+    """
+    啟動 Apify Actor 並以 waitForFinish long-poll 等待執行完成
+    long-poll 提早返回但尚未結束時，以指數退避等待後再查詢
+
+    Returns:
+        list: dataset 項目
+        None: Actor 執行失敗或超時
+    """
+    http_session = http_client.get_session()
+    timer = metrics.StageTimer('apify')
+    long_poll_timeout = (http_client.HTTP_CONNECT_TIMEOUT, APIFY_MAX_WAIT_PER_REQUEST + 30)
+    deadline = time.monotonic() + APIFY_RUN_TIMEOUT
+
+    try:
+        # 啟動 Actor，並在同一個請求中等待執行完成
+        with timer.stage('start'):
+            response = http_session.post(
+                f"{APIFY_API_BASE}/acts/{actor_id}/runs",
+                params={
+                    'token': APIFY_API_KEY,
+                    'timeout': APIFY_RUN_TIMEOUT,
+                    'waitForFinish': min(APIFY_RUN_TIMEOUT, APIFY_MAX_WAIT_PER_REQUEST)
+                },
+                json=run_input,
+                timeout=long_poll_timeout
+            )
+            response.raise_for_status()
+            run = response.json()['data']
+
+        backoff = 0.5
+        with timer.stage('wait'):
+            while run['status'] not in APIFY_TERMINAL_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("等待 Apify Actor 執行超時")
+                    return None
+
+                status_response = http_session.get(
+                    f"{APIFY_API_BASE}/actor-runs/{run['id']}",
+                    params={
+                        'token': APIFY_API_KEY,
+                        'waitForFinish': int(min(remaining, APIFY_MAX_WAIT_PER_REQUEST))
+                    },
+                    timeout=long_poll_timeout
+                )
+                status_response.raise_for_status()
+                run = status_response.json()['data']
+
+                if run['status'] not in APIFY_TERMINAL_STATUSES:
+                    time.sleep(min(backoff, max(deadline - time.monotonic(), 0)))
+                    backoff = min(backoff * 2, 8)
+
+        if run['status'] != 'SUCCEEDED':
+            logger.error(f"Apify Actor 執行失敗，狀態：{run['status']}")
+            return None
+
+        # 獲取結果
+        with timer.stage('fetch'):
+            results_response = http_session.get(
+                f"{APIFY_API_BASE}/datasets/{run['defaultDatasetId']}/items",
+                params={'token': APIFY_API_KEY}
+            )
+            results_response.raise_for_status()
+            return results_response.json()
+    finally:
+        logger.info(f"Apify {actor_id}（waitForFinish）階段耗時：{timer.summary()}")
+
+
+async def run_apify_actor_async(session, actor_id, run_input):
+    """執行 Apify Actor 並取得 dataset 結果（非同步版本，流程同 run_apify_actor）"""
+    import aiohttp
+
+    timer = metrics.StageTimer('apify')
+    try:
+        with timer.stage('run_sync'):
+            async with session.post(
+                f"{APIFY_API_BASE}/acts/{actor_id}/run-sync-get-dataset-items",
+                params={'token': APIFY_API_KEY, 'timeout': APIFY_RUN_TIMEOUT},
+                json=run_input,
+                # 只設定 sock_connect，ServerTimeoutError 只會在連線階段發生
+                timeout=aiohttp.ClientTimeout(
+                    total=APIFY_RUN_TIMEOUT + 30, sock_connect=http_client.HTTP_CONNECT_TIMEOUT
+                )
+            ) as response:
+                if response.status == 408:
+                    logger.error("等待 Apify Actor 執行超時")
+                    return None
+                if response.status >= 500:
+                    logger.error(f"Apify 同步執行返回 {response.status}")
+                    return None
+                response.raise_for_status()
+                return await response.json()
+    except (aiohttp.ClientConnectorError, aiohttp.ServerTimeoutError) as e:
+        logger.warning(f"Apify 同步端點連線失敗，改用 waitForFinish 等待: {str(e)}")
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+        # 請求可能已送達，Actor 仍在執行，不再另外啟動
+        logger.error(f"Apify 同步執行失敗: {str(e)}")
+        return None
+    finally:
+        logger.info(f"Apify {actor_id} 階段耗時：{timer.summary()}")
+
+    return await run_apify_actor_polling_async(session, actor_id, run_input)
+
+
+async def run_apify_actor_polling_async(session, actor_id, run_input):
+    """啟動 Apify Actor 並以 waitForFinish long-poll 等待執行完成（非同步版本）"""
+    import aiohttp
+
+    timer = metrics.StageTimer('apify')
+    long_poll_timeout = aiohttp.ClientTimeout(total=APIFY_MAX_WAIT_PER_REQUEST + 30)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + APIFY_RUN_TIMEOUT
+
+    try:
+        with timer.stage('start'):
+            async with session.post(
+                f"{APIFY_API_BASE}/acts/{actor_id}/runs",
+                params={
+                    'token': APIFY_API_KEY,
+                    'timeout': APIFY_RUN_TIMEOUT,
+                    'waitForFinish': min(APIFY_RUN_TIMEOUT, APIFY_MAX_WAIT_PER_REQUEST)
+                },
+                json=run_input,
+                timeout=long_poll_timeout
+            ) as response:
+                response.raise_for_status()
+                run = (await response.json())['data']
+
+        backoff = 0.5
+        with timer.stage('wait'):
+            while run['status'] not in APIFY_TERMINAL_STATUSES:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.error("等待 Apify Actor 執行超時")
+                    return None
+
+                async with session.get(
+                    f"{APIFY_API_BASE}/actor-runs/{run['id']}",
+                    params={
+                        'token': APIFY_API_KEY,
+                        'waitForFinish': int(min(remaining, APIFY_MAX_WAIT_PER_REQUEST))
+                    },
+                    timeout=long_poll_timeout
+                ) as status_response:
+                    status_response.raise_for_status()
+                    run = (await status_response.json())['data']
+
+                if run['status'] not in APIFY_TERMINAL_STATUSES:
+                    await asyncio.sleep(min(backoff, max(deadline - loop.time(), 0)))
+                    backoff = min(backoff * 2, 8)
+
+        if run['status'] != 'SUCCEEDED':
+            logger.error(f"Apify Actor 執行失敗，狀態：{run['status']}")
+            return None
+
+        with timer.stage('fetch'):
+            async with session.get(
+                f"{APIFY_API_BASE}/datasets/{run['defaultDatasetId']}/items",
+                params={'token': APIFY_API_KEY}
+            ) as results_response:
+                results_response.raise_for_status()
+                return await results_response.json()
+    finally:
+        logger.info(f"Apify {actor_id}（waitForFinish）階段耗時：{timer.summary()}")
+
+
+# ---------- 來源註冊表 ----------
+
+WEB_SOURCE = ScraperSource(
+    name='web',
+    kind='web',
+    source_type='網頁',
+    domains=(),
+    fetch=scrape_web_content,
+    fetch_async=scrape_web_content_async,
+    conditional_get=True,
+    detected_text="🔗 偵測到 URL，正在抓取並生成摘要...",
+    failed_text="⚠️ 無法抓取網頁內容，請檢查 URL 是否正確或稍後再試。",
+    done_text="網頁已摘要並儲存到 Notion",
+    source_text="🌐 來源：網頁",
+    error_text="抱歉，處理 URL 摘要時發生錯誤。"
+)
+
+# 依序比對，第一個符合的來源生效；都不符合時使用 WEB_SOURCE
+SOURCES = [
+    social_source(
+        'instagram', 'Instagram',
+        ['instagram.com', 'www.instagram.com', 'instagr.am'],
+        # 使用 Apify 的 Instagram Scraper（更通用穩定，注意：API 使用 ~ 而不是 /）
+        "apify~instagram-scraper",
+        build_instagram_run_input,
+        extract_instagram_post
+    ),
+    social_source(
+        'facebook', 'Facebook',
+        ['facebook.com', 'fb.com', 'm.facebook.com', 'www.facebook.com'],
+        # 使用 Apify 的 Facebook Posts Scraper
+        "apify~facebook-posts-scraper",
+        build_facebook_run_input,
+        extract_facebook_post
+    ),
+]
+
+
+def register_source(source):
+    """註冊新的爬取來源（排在既有來源之後）"""
+    if any(existing.name == source.name for existing in SOURCES + [WEB_SOURCE]):
+        raise ValueError(f"來源名稱重複：{source.name}")
+    SOURCES.append(source)
+
+
+def all_sources():
+    """所有已註冊的來源（包含一般網頁）"""
+    return SOURCES + [WEB_SOURCE]
+
+
+def find_source(url):
+    """依 URL 找出對應的爬取來源"""
+    for source in SOURCES:
+        if source.matches(url):
+            return source
+    return WEB_SOURCE
+
+
+# ---------- 快取與爬取引擎 ----------
+
+url_cache = cache.TTLCache(
+    'url',
+    max_entries=URL_CACHE_MAX_ENTRIES,
+    default_ttl=URL_CACHE_TTL['web'],
+    path=URL_CACHE_PATH or None
+)
+
+
+def cache_key(source, url):
+    """快取鍵：來源名稱 + 正規化 URL 的 SHA-256"""
+    digest = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+    return f"{source.name}:{digest}"
+
+
+def cache_ttl(source):
+    """來源的快取有效秒數"""
+    if source.cache_ttl is not None:
+        return source.cache_ttl
+    return URL_CACHE_TTL.get(source.kind, url_cache.default_ttl)
+
+
+def _lookup(source, key):
+    """
+    查詢快取
+
+    Returns:
+        tuple: (未過期的內容或 None, 快取項目或 None)
+    """
+    if cache_ttl(source) <= 0:
+        return None, None
+    entry = url_cache.get_entry(key)
+    hit = entry is not None and entry.fresh
+    url_cache.record(hit)
+    metrics.incr(f"scrape.{source.name}.cache_{'hit' if hit else 'miss'}")
+    return (entry.value if hit else None), entry
+
+
+def _store(source, key, content, validators=None):
+    if content and cache_ttl(source) > 0:
+        url_cache.set(key, content, ttl=cache_ttl(source), meta=validators)
+
+
+def _revalidated(source, key, entry):
+    """條件式請求返回 304：延長快取期限並沿用快取內容"""
+    metrics.incr(f"scrape.{source.name}.revalidated")
+    url_cache.touch(key, ttl=cache_ttl(source))
+    return entry.value
+
+
+def _finish(source, content, start):
+    """記錄指標並限制內容長度"""
+    metrics.observe(f"scrape.{source.name}", time.perf_counter() - start)
+    metrics.incr(f"scrape.{source.name}.{'success' if content else 'failure'}")
+    return truncate_content(content) if content else None
+
+
+def _extract_first(source, results):
+    if results is None:
+        return None
+    if len(results) == 0:
+        logger.error(f"Apify 未返回 {source.name} 結果")
+        return None
+    return source.extract(results[0])
+
+
+def scrape(source, url):
+    """
+    使用指定來源抓取 URL 內容（優先使用快取）
+
+    Returns:
+        str: 提取後的文字內容
+        None: 抓取失敗
+    """
+    start = time.perf_counter()
+    key = cache_key(source, url)
+    content, entry = _lookup(source, key)
+    if content:
+        return _finish(source, content, start)
+
+    validators = None
+    try:
+        if source.actor_id:
+            content = _extract_first(source, run_apify_actor(source.actor_id, source.build_input(url)))
+        elif source.conditional_get:
+            result = source.fetch(url, validators=entry.meta if entry else None)
+            if result is NOT_MODIFIED:
+                return _finish(source, _revalidated(source, key, entry), start)
+            content, validators = result
+        else:
+            content = source.fetch(url)
+    except extractors.UnsupportedContentError as e:
+        logger.warning(f"略過 {url}: {str(e)}")
+    except requests.exceptions.Timeout:
+        logger.error(f"抓取 URL 超時: {url}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"抓取 {source.name} 內容時發生請求錯誤: {str(e)}")
+    except Exception as e:
+        logger.error(f"解析 {source.name} 內容時發生錯誤: {str(e)}")
+
+    _store(source, key, content, validators)
+    return _finish(source, content, start)
+
+
+async def scrape_async(session, source, url):
+    """使用指定來源抓取 URL 內容（非同步版本，快取讀寫交給 thread 避免阻塞 event loop）"""
+    import aiohttp
+
+    start = time.perf_counter()
+    key = cache_key(source, url)
+    content, entry = await asyncio.to_thread(_lookup, source, key)
+    if content:
+        return _finish(source, content, start)
+
+    validators = None
+    try:
+        if source.actor_id:
+            results = await run_apify_actor_async(session, source.actor_id, source.build_input(url))
+            content = _extract_first(source, results)
+        elif source.conditional_get:
+            result = await source.fetch_async(session, url, validators=entry.meta if entry else None)
+            if result is NOT_MODIFIED:
+                content = await asyncio.to_thread(_revalidated, source, key, entry)
+                return _finish(source, content, start)
+            content, validators = result
+        else:
+            content = await source.fetch_async(session, url)
+    except extractors.UnsupportedContentError as e:
+        logger.warning(f"略過 {url}: {str(e)}")
+    except asyncio.TimeoutError:
+        logger.error(f"抓取 URL 超時: {url}")
+    except aiohttp.ClientError as e:
+        logger.error(f"抓取 {source.name} 內容時發生請求錯誤: {str(e)}")
+    except Exception as e:
+        logger.error(f"解析 {source.name} 內容時發生錯誤: {str(e)}")
+
+    await asyncio.to_thread(_store, source, key, content, validators)
+    return _finish(source, content, start)
@@ -0,0 +1,213 @@
+"""
+語音轉文字後端模組
+所有語音轉錄經由同一個後端介面，由 TRANSCRIPTION_BACKEND 選擇：
+- openai（預設）：OpenAI whisper-1 API，依錄音分鐘數計費
+- local：faster-whisper（CTranslate2）在本機 CPU 以 int8 量化執行，不需網路、沒有逐分鐘費用。
+  模型在啟動時於背景載入並以一段靜音暖機，第一則語音不必等待載入；
+  同一個模型以 num_workers 個 CTranslate2 replica 同時處理多個請求，
+  由同樣大小的 thread pool 排程，總 thread 數（workers × LOCAL_WHISPER_CPU_THREADS）不超過 CPU 核心數
+
+local 後端需要安裝 faster-whisper（uv sync --extra local-whisper）
+"""
+
+import asyncio
+import io
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import audio
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_BACKEND = os.getenv('TRANSCRIPTION_BACKEND', 'openai').lower()
+TRANSCRIPTION_LANGUAGE = os.getenv('TRANSCRIPTION_LANGUAGE', 'zh')
+
+OPENAI_TRANSCRIPTION_MODEL = 'whisper-1'
+OPENAI_COST_PER_MINUTE = 0.006  # whisper-1 每分鐘的費用（美元）
+
+# local 後端設定
+LOCAL_WHISPER_MODEL = os.getenv('LOCAL_WHISPER_MODEL', 'small')  # 模型大小或 CTranslate2 模型路徑
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv('LOCAL_WHISPER_COMPUTE_TYPE', 'int8')
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv('LOCAL_WHISPER_CPU_THREADS', min(4, os.cpu_count() or 1)))
+# 同時轉錄的數量，0 表示依 CPU 核心數自動決定
+LOCAL_WHISPER_WORKERS = int(os.getenv('LOCAL_WHISPER_WORKERS', 0))
+LOCAL_WHISPER_BEAM_SIZE = int(os.getenv('LOCAL_WHISPER_BEAM_SIZE', 5))
+LOCAL_WHISPER_MODEL_DIR = os.getenv('LOCAL_WHISPER_MODEL_DIR') or None  # 模型下載與快取目錄
+
+
+def default_local_workers(cpu_threads=LOCAL_WHISPER_CPU_THREADS):
+    """依 CPU 核心數決定 local 後端的 worker 數量"""
+    return max(1, (os.cpu_count() or 1) // max(1, cpu_threads))
+
+
+class TranscriptionBackend(ABC):
+    """語音轉文字後端的共用介面（子類別必須實作 transcribe）"""
+
+    name = 'base'
+    max_bytes = None  # 單次轉錄的大小上限，None 表示沒有上限
+
+    @abstractmethod
+    def transcribe(self, data, language=TRANSCRIPTION_LANGUAGE):
+        """
+        將語音內容轉為文字
+
+        Args:
+            data: 語音檔 bytes（m4a、mp3、ogg、wav 等）
+
+        Returns:
+            str: 轉錄的文字
+        """
+
+    async def transcribe_async(self, data, language=TRANSCRIPTION_LANGUAGE):
+        """transcribe 的非同步版本，預設在 thread 中執行"""
+        return await asyncio.to_thread(self.transcribe, data, language)
+
+    def start(self):
+        """啟動時的準備工作（例如載入模型）；選用的 hook，預設不需要，子類別需要時才覆寫"""
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class OpenAITranscriber(TranscriptionBackend):
+    """OpenAI whisper-1 API"""
+
+    name = 'openai'
+    max_bytes = audio.AUDIO_MAX_BYTES
+
+    def __init__(self, client, async_client=None, model=OPENAI_TRANSCRIPTION_MODEL):
+        self.client = client
+        # asyncio 模式的 client 在 event loop 中建立後才設定
+        self.async_client = async_client
+        self.model = model
+
+    def transcribe(self, data, language=TRANSCRIPTION_LANGUAGE):
+        with metrics.timer('transcription.openai'):
+            transcription = self.client.audio.transcriptions.create(
+                model=self.model,
+                file=audio.audio_file(data),
+                language=language
+            )
+        return transcription.text
+
+    async def transcribe_async(self, data, language=TRANSCRIPTION_LANGUAGE):
+        if self.async_client is None:
+            return await super().transcribe_async(data, language)
+
+        with metrics.timer('transcription.openai'):
+            transcription = await self.async_client.audio.transcriptions.create(
+                model=self.model,
+                file=audio.audio_file(data),
+                language=language
+            )
+        return transcription.text
+
+
+class LocalWhisperTranscriber(TranscriptionBackend):
+    """faster-whisper（CTranslate2）本機 CPU 轉錄"""
+
+    name = 'local'
+
+    def __init__(self, model_name=LOCAL_WHISPER_MODEL, compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                 cpu_threads=LOCAL_WHISPER_CPU_THREADS, workers=LOCAL_WHISPER_WORKERS,
+                 beam_size=LOCAL_WHISPER_BEAM_SIZE, download_root=LOCAL_WHISPER_MODEL_DIR):
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.cpu_threads = max(1, cpu_threads)
+        self.workers = workers or default_local_workers(self.cpu_threads)
+        self.beam_size = beam_size
+        self.download_root = download_root
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='local-whisper')
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # 載入模型可能需要數十秒，與統計用的鎖分開
+        self._model = None
+        self._stats = {'completed': 0, 'failed': 0, 'audio_seconds': 0.0, 'load_seconds': None}
+
+    def start(self):
+        """在背景載入模型並暖機"""
+        thread = threading.Thread(target=self._warm_up, name='local-whisper-load')
+        thread.daemon = True
+        thread.start()
+
+    def _warm_up(self):
+        try:
+            model = self._get_model()
+            import numpy
+
+            # 以一秒靜音執行一次推論，讓各 replica 完成初始化
+            segments, _ = model.transcribe(numpy.zeros(16000, dtype=numpy.float32), beam_size=1)
+            list(segments)
+        except Exception as e:
+            logger.error(f"載入本機 Whisper 模型時發生錯誤: {str(e)}")
+
+    def _get_model(self):
+        with self._load_lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+
+                start = time.perf_counter()
+                self._model = WhisperModel(
+                    self.model_name,
+                    device='cpu',
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads,
+                    num_workers=self.workers,
+                    download_root=self.download_root
+                )
+                self._stats['load_seconds'] = round(time.perf_counter() - start, 1)
+                logger.info(
+                    f"已載入本機 Whisper 模型 {self.model_name}（{self.compute_type}，"
+                    f"{self.workers} workers × {self.cpu_threads} threads，{self._stats['load_seconds']} 秒）"
+                )
+            return self._model
+
+    def _run(self, data, language):
+        model = self._get_model()
+        start = time.perf_counter()
+        try:
+            # faster-whisper 以 PyAV 直接解碼記憶體中的內容，不寫入臨時檔案
+            segments, info = model.transcribe(io.BytesIO(data), language=language, beam_size=self.beam_size)
+            text = ''.join(segment.text for segment in segments).strip()
+        except Exception:
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+        finally:
+            metrics.observe('transcription.local', time.perf_counter() - start)
+        with self._lock:
+            self._stats['completed'] += 1
+            self._stats['audio_seconds'] += info.duration
+        return text
+
+    def transcribe(self, data, language=TRANSCRIPTION_LANGUAGE):
+        return self._executor.submit(self._run, data, language).result()
+
+    async def transcribe_async(self, data, language=TRANSCRIPTION_LANGUAGE):
+        return await asyncio.wrap_future(self._executor.submit(self._run, data, language))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'model': self.model_name,
+                'compute_type': self.compute_type,
+                'workers': self.workers,
+                'cpu_threads': self.cpu_threads,
+                'loaded': self._model is not None,
+                **self._stats,
+                'audio_seconds': round(self._stats['audio_seconds'], 1)
+            }
+
+
+def create_backend(name=TRANSCRIPTION_BACKEND, openai_client=None):
+    """依名稱建立轉錄後端"""
+    if name == 'openai':
+        return OpenAITranscriber(openai_client)
+    if name == 'local':
+        return LocalWhisperTranscriber()
+    raise ValueError(f"未知的 TRANSCRIPTION_BACKEND：{name}（可用：openai、local）")
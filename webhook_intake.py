@@ -0,0 +1,167 @@
+"""
+Webhook 接收模組
+WEBHOOK_INTAKE=queue 時，webhook 只驗證簽章、把原始 body 寫入持久化工作佇列（SQLite）並放進記憶體佇列
+就返回 200，事件的解析、分派與回覆由背景 thread 處理，LINE 的 webhook 不再等待對外的 reply 請求。
+LINE 收到 200 後不會重送，因此 body 在返回前先寫入 job store：程序終止、重啟或部署時尚未處理的 webhook
+會在啟動後由 replay 重新處理（reply token 已過期，回覆改用 push）；
+佇列已滿時改在 request thread 中直接處理（返回前處理完畢，不需要寫入 job store）。
+
+另外提供 webhook body 的取樣與遮蔽紀錄：只記錄事件類型、訊息類型與文字長度，
+使用者 ID 以雜湊值表示，不記錄訊息內容與 reply token。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_INTAKE = os.getenv('WEBHOOK_INTAKE', 'sync').lower()  # sync 或 queue
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 4))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+# 記錄 webhook 摘要的比例（0-1），0 表示不記錄
+WEBHOOK_LOG_SAMPLE_RATE = float(os.getenv('WEBHOOK_LOG_SAMPLE_RATE', 0.01))
+
+# job store 中的工作類型名稱
+JOB_TYPE = 'webhook'
+
+
+def _hash_id(value):
+    return hashlib.sha256(value.encode()).hexdigest()[:10] if value else None
+
+
+def summarize_body(body):
+    """
+    webhook body 的遮蔽摘要（不含訊息內容、reply token 與原始使用者 ID）
+
+    Returns:
+        dict: 事件數量與各事件的類型、訊息類型、文字長度、使用者 ID 雜湊值、是否為重送
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return {'invalid_json': True, 'bytes': len(body)}
+
+    events = []
+    for event in payload.get('events', []):
+        message = event.get('message') or {}
+        source = event.get('source') or {}
+        summary = {
+            'type': event.get('type'),
+            'message': message.get('type'),
+            'user': _hash_id(source.get('userId')),
+            'redelivery': (event.get('deliveryContext') or {}).get('isRedelivery', False)
+        }
+        if 'text' in message:
+            summary['text_length'] = len(message['text'])
+        events.append(summary)
+    return {'bytes': len(body), 'events': events}
+
+
+def log_body(body, sample_rate=WEBHOOK_LOG_SAMPLE_RATE):
+    """依取樣比例記錄 webhook 的遮蔽摘要（沒有抽中時不解析 body）"""
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return
+    logger.info(f"Webhook 摘要: {json.dumps(summarize_body(body), ensure_ascii=False)}")
+
+
+def replay(handler, job_store, job_id, body, signature):
+    """
+    認領並處理 job store 中的 webhook（背景 thread 與重啟後的恢復共用）
+
+    Returns:
+        bool: 是否處理成功；已被其他 worker 認領時返回 True
+    """
+    if job_store is not None and not job_store.claim(job_id):
+        return True
+    try:
+        with metrics.timer('webhook.dispatch'):
+            handler.handle(body, signature)
+    except Exception as e:
+        logger.error(f"處理 webhook 事件時發生錯誤: {str(e)}")
+        if job_store is not None:
+            job_store.fail(job_id, str(e))
+        return False
+    if job_store is not None:
+        job_store.complete(job_id)
+    return True
+
+
+class WebhookIntake:
+    """webhook 事件佇列，背景 thread 以 handler.handle 解析並分派事件"""
+
+    def __init__(self, handler, job_store=None, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+        """
+        Args:
+            job_store: 持久化工作佇列，排入前先寫入 body；None 表示只保存在記憶體（程序終止時遺失）
+        """
+        self.handler = handler
+        self.job_store = job_store
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {'accepted': 0, 'handled_inline': 0, 'resumed': 0, 'completed': 0, 'failed': 0}
+
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'webhook-{index}')
+            thread.daemon = True
+            thread.start()
+
+    def verify(self, body, signature):
+        """驗證 X-Line-Signature"""
+        return self.handler.parser.signature_validator.validate(body, signature)
+
+    def submit(self, body, signature):
+        """
+        寫入 job store 後排入已驗證簽章的 webhook body（在返回 200 之前呼叫）
+
+        Returns:
+            bool: 是否已排入佇列；佇列已滿時在呼叫端直接處理並返回 False
+        """
+        job_id = self.job_store.add(JOB_TYPE, (body, signature)) if self.job_store is not None else None
+        try:
+            self._queue.put_nowait((job_id, body, signature, time.perf_counter()))
+        except queue.Full:
+            if job_id is not None:
+                self.job_store.discard(job_id)
+            with self._lock:
+                self._stats['handled_inline'] += 1
+            metrics.incr('webhook.queue_full')
+            self.handler.handle(body, signature)
+            return False
+        with self._lock:
+            self._stats['accepted'] += 1
+        return True
+
+    def resume(self, job_id, body, signature):
+        """
+        重新排入程序重啟前已接收但尚未處理的 webhook
+
+        Returns:
+            bool: 是否已排入佇列；佇列已滿時返回 False（由呼叫端釋放，下一次恢復時再取回）
+        """
+        try:
+            self._queue.put_nowait((job_id, body, signature, time.perf_counter()))
+        except queue.Full:
+            return False
+        with self._lock:
+            self._stats['resumed'] += 1
+        return True
+
+    def _worker(self):
+        while True:
+            job_id, body, signature, enqueued_at = self._queue.get()
+            metrics.observe('webhook.queue_wait', time.perf_counter() - enqueued_at)
+            ok = replay(self.handler, self.job_store if job_id is not None else None, job_id, body, signature)
+            with self._lock:
+                self._stats['completed' if ok else 'failed'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self._queue.qsize(), **self._stats}